@@ -5,7 +5,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.config import settings
 from app.core.security import decode_access_token # TokenPayload is defined in security.py
 from app.crud import crud_user
-from app.db.models import User # Import your User model
+from app.db.models import GlobalList, User # Import your User model
 from app.db.session import get_db # Your async db session getter
 
 reusable_oauth2 = OAuth2PasswordBearer(
@@ -59,3 +59,15 @@ async def get_global_list_owner_check(
     if not glist:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Global list not found or not owned by user")
     return glist
+
+# Same ownership check without eager-loading items, for endpoints that page or bulk-write items
+async def get_global_list_owner_check_without_items(
+    global_list_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+) -> GlobalList:
+    from app.crud import crud_global_list # Local import
+    glist = await crud_global_list.get_by_id_and_owner(db, id=global_list_id, user_id=current_user.id, with_items=False)
+    if not glist:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Global list not found or not owned by user")
+    return glist
@@ -46,6 +46,21 @@ async def read_blocks_for_sequence(
     blocks = await crud_block.get_multi_by_sequence(db, sequence_id=parent_sequence.id, skip=skip, limit=limit)
     return blocks
 
+@router.post("/in_sequence/{sequence_id}/batch", response_model=List[block_schema.BlockRead])
+async def batch_update_blocks_for_sequence(
+    batch_in: block_schema.BlockBatchRequest,
+    parent_sequence: models.Sequence = Depends(get_parent_sequence_for_block), # Single ownership check; also loads the blocks
+    db: AsyncSession = Depends(get_db),
+):
+    # Creates, updates, deletes and reorders are applied in one transaction: all or nothing
+    try:
+        blocks = await crud_block.apply_batch(
+            db, sequence_id=parent_sequence.id, existing_blocks=list(parent_sequence.blocks), batch=batch_in
+        )
+    except ValueError as ve:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(ve))
+    return blocks
+
 @router.get("/{block_id}", response_model=block_schema.BlockRead)
 async def read_block(
     block_id: int,
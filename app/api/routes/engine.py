@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Dict, Any
+from typing import Dict, Any, List
+import logging
 
 from app.api import deps
 from app.db import models
@@ -10,6 +12,8 @@ from app.services import execution_engine # For preview
 
 router = APIRouter()
 
+logger = logging.getLogger(__name__)
+
 class PreviewPromptRequest(models.BaseModel): # Pydantic model for request body
     sequence_id: int
     block_id: int
@@ -46,5 +50,37 @@ async def preview_block_prompt(
         logger.error(f"Error generating prompt preview for block {request_data.block_id}: {e}", exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to generate prompt preview.")
 
+class BatchPreviewPromptRequest(BaseModel):
+    sequence_id: int
+    block_ids: List[int] | None = None # None previews every block in the sequence
+    input_overrides: Dict[str, Any] | None = None
+    include_context: bool = False
+
+@router.post("/preview_prompts", response_model=Dict[str, Any])
+async def preview_sequence_prompts(
+    request_data: BatchPreviewPromptRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(deps.get_current_active_user)
+):
+    # Verify user owns the sequence
+    sequence = await crud_sequence.get_by_id_and_owner(db, id=request_data.sequence_id, user_id=current_user.id)
+    if not sequence:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Sequence not found or not owned by user")
+
+    try:
+        return await execution_engine.preview_prompts_for_sequence(
+            db=db,
+            sequence_id=request_data.sequence_id,
+            user_id=current_user.id,
+            block_ids=request_data.block_ids,
+            input_overrides=request_data.input_overrides,
+            include_context=request_data.include_context,
+        )
+    except ValueError as ve:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(ve))
+    except Exception as e:
+        logger.error(f"Error generating batch prompt preview for sequence {request_data.sequence_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to generate prompt previews.")
+
 # Note: The main "run_sequence" endpoint is now in runs.py as it creates a Run resource.
 # This engine.py is more for utility/preview functions related to execution.
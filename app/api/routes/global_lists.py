@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
@@ -7,6 +7,7 @@ from app.db import models
 from app.schemas import global_list as gl_schema
 from app.crud import crud_global_list
 from app.db.session import get_db
+from app.services import list_import
 
 router = APIRouter()
 
@@ -78,6 +79,45 @@ async def read_global_list_items(
 ):
     return parent_global_list.items # Assumes items are eager loaded by the dependency
 
+@router.get("/{global_list_id}/items/page", response_model=gl_schema.GlobalListItemPage)
+async def read_global_list_items_page(
+    parent_global_list: models.GlobalList = Depends(deps.get_global_list_owner_check_without_items),
+    db: AsyncSession = Depends(get_db),
+    cursor: str | None = None, # Opaque cursor from a previous page's next_cursor
+    limit: int = Query(default=500, ge=1, le=5000),
+):
+    try:
+        items, next_cursor = await crud_global_list.get_items_page(
+            db, global_list_id=parent_global_list.id, cursor=cursor, limit=limit
+        )
+    except ValueError as ve: # Malformed cursor
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(ve))
+    return {"items": items, "next_cursor": next_cursor}
+
+@router.post("/{global_list_id}/items/import", response_model=gl_schema.GlobalListImportResult)
+async def import_global_list_items(
+    request: Request, # Raw body is streamed and parsed incrementally, never buffered whole
+    parent_global_list: models.GlobalList = Depends(deps.get_global_list_owner_check_without_items),
+    db: AsyncSession = Depends(get_db),
+    format: list_import.ListImportFormat | None = None, # Inferred from Content-Type if omitted
+    mode: list_import.ListImportMode = list_import.ListImportMode.APPEND,
+    csv_column: str | None = None, # Header name or 0-based index; first column by default
+    csv_has_header: bool = False,
+):
+    fmt = format or list_import.format_from_content_type(request.headers.get("content-type"))
+    try:
+        return await list_import.import_list_items(
+            db,
+            global_list_id=parent_global_list.id,
+            chunks=request.stream(),
+            fmt=fmt,
+            mode=mode,
+            csv_column=csv_column,
+            csv_has_header=csv_has_header,
+        )
+    except list_import.ListImportError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
 @router.put("/{global_list_id}/items/{item_id}", response_model=gl_schema.GlobalListItemRead)
 async def update_global_list_item(
     item_id: int,
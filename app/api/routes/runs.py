@@ -1,17 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Dict, Any
 from sqlalchemy import select
 from sqlalchemy.orm import joinedload
-from datetime import datetime, timezone
 import logging
 
 from app.api import deps
 from app.db import models
 from app.schemas import run as run_schema
-from app.crud import crud_run, crud_sequence
+from app.crud import crud_materialized_run, crud_run, crud_run_queue, crud_sequence
+from app.core.config import settings
 from app.db.session import get_db
 from app.services import execution_engine # For starting a run
+from app.services import run_archive, run_control, run_diff, run_estimate, run_response
+from app.services.variable_catalog import etag_matches
+from app.services.sequence_plan import get_sequence_plan
 
 router = APIRouter()
 
@@ -28,19 +32,42 @@ async def create_run_for_sequence(
     if not sequence:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Sequence not found or not owned by user")
 
+    # Deadline admission: reject (or sample down) runs estimated to finish too late
+    sample_rate = None
+    if run_in.deadline is not None:
+        available = run_estimate.seconds_until(run_in.deadline)
+        if available <= 0:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Deadline is in the past.")
+        plan = await get_sequence_plan(db, sequence.id)
+        list_lengths = await run_estimate.get_input_list_lengths(db, plan, current_user.id, run_in.input_overrides_json)
+        estimate = run_estimate.estimate_seconds(plan, list_lengths)
+        if estimate is None: # Can't be checked against the deadline: refuse rather than admit it unchecked
+            unknown = ", ".join(f"block {block.id} ('{block.name}')" for block in run_estimate.unestimated_blocks(plan, list_lengths))
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Run duration can't be estimated up front (map-reduce blocks or lists of unknown length: {unknown}); submit it without a deadline.",
+            )
+        if estimate > available:
+            if run_in.deadline_policy == "sample":
+                sample_rate = run_estimate.sample_rate_for_deadline(plan, list_lengths, available)
+            if sample_rate is None:
+                calls = run_estimate.estimate_llm_calls(plan, list_lengths)
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail=f"Run is estimated to take {estimate:.0f}s ({calls} LLM calls) but the deadline is in {available:.0f}s.",
+                )
+
     # Create the initial Run DB object
     created_run_db_obj = await crud_run.create_with_sequence_and_user(
-        db=db, obj_in=run_in, user_id=current_user.id
+        db=db, obj_in=run_in, user_id=current_user.id, sample_rate=sample_rate
     )
     
-    # TODO: Background Task for actual execution
-    # For now, let's call it directly, but this will block.
-    # In production, use FastAPI's BackgroundTasks or a task queue like Celery.
-    # from fastapi import BackgroundTasks
-    # background_tasks.add_task(execution_engine.execute_sequence, ...)
-    
-    # For simplicity in this example, we'll execute synchronously and update the run object.
-    # This is NOT ideal for long-running tasks.
+    if settings.RUN_EXECUTION_MODE == "queue":
+        # A worker (python -m app.worker) picks the run up; clients poll GET /runs/{id}
+        await crud_run_queue.enqueue(db, run_id=created_run_db_obj.id, priority=run_in.priority, deadline=run_in.deadline)
+        return await crud_run.get_by_id_and_user(db, id=created_run_db_obj.id, user_id=current_user.id)
+
+    # Inline mode: execute synchronously in this request and return the finished run.
     try:
         updated_run_obj = await execution_engine.execute_sequence(
             db=db,
@@ -48,6 +75,7 @@ async def create_run_for_sequence(
             sequence_id=sequence.id,
             user_id=current_user.id,
             input_overrides=run_in.input_overrides_json,
+            interactive=True, # The caller waits for the result
             # llm_model can be passed from request or sequence settings
         )
         # The execute_sequence should return the Run object with eager-loaded block_runs
@@ -56,13 +84,7 @@ async def create_run_for_sequence(
         # If synchronous execution fails catastrophically before run status is updated
         logger.error(f"Immediate catastrophic failure during synchronous execution of run {created_run_db_obj.id}: {e}", exc_info=True)
         # Mark run as failed if it wasn't already
-        run_to_fail = await crud_run.get(db, id=created_run_db_obj.id)
-        if run_to_fail and run_to_fail.status != models.RunStatusEnum.FAILED:
-            run_to_fail.status = models.RunStatusEnum.FAILED
-            run_to_fail.completed_at = datetime.now(timezone.utc)
-            run_to_fail.results_summary_json = {"error": "Execution failed catastrophically", "details": str(e)}
-            db.add(run_to_fail)
-            await db.commit()
+        await crud_run.mark_failed(db, id=created_run_db_obj.id, error="Execution failed catastrophically", details=str(e))
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to execute sequence: {e}")
 
 
@@ -84,16 +106,105 @@ async def read_runs_for_sequence(
     )
     return runs
 
+@router.get("/in_sequence/{sequence_id}/page", response_model=run_schema.RunPage)
+async def read_runs_page_for_sequence(
+    sequence_id: int,
+    db: AsyncSession = Depends(get_db),
+    cursor: str | None = None, # Opaque cursor from a previous page's next_cursor
+    limit: int = Query(default=20, ge=1, le=200),
+    current_user: models.User = Depends(deps.get_current_active_user)
+):
+    # Verify user owns the sequence
+    sequence = await crud_sequence.get_by_id_and_owner(db, id=sequence_id, user_id=current_user.id)
+    if not sequence:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Sequence not found or not owned by user")
+
+    try:
+        runs, next_cursor = await crud_run.get_page_by_sequence_and_user(
+            db, sequence_id=sequence_id, user_id=current_user.id, cursor=cursor, limit=limit
+        )
+    except ValueError as ve: # Malformed cursor
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(ve))
+    return {"items": runs, "next_cursor": next_cursor}
+
 @router.get("/{run_id}", response_model=run_schema.RunRead)
 async def read_run_details(
+    run_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(deps.get_current_active_user),
+    if_none_match: str | None = Header(default=None),
+):
+    # Finished runs are served from their materialized response: no block run loading, validation or encoding
+    cached = await crud_materialized_run.get_for_user(db, run_id=run_id, user_id=current_user.id)
+    if cached is None:
+        run = await crud_run.get_by_id_and_user(db, id=run_id, user_id=current_user.id)
+        if not run:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Run not found or not owned by user")
+        if run.archived_at is not None: # Cold storage: the archive file is only read when the client's copy is stale
+            cache_headers = {"ETag": run.archive_etag, "Cache-Control": "private, no-cache"}
+            if etag_matches(if_none_match, run.archive_etag):
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers)
+            try:
+                body = await run_archive.read_run(run)
+            except run_archive.RunArchiveError as e:
+                logger.error(f"Archived run {run_id} is unreadable: {e}")
+                raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Archived run is temporarily unavailable.")
+            return Response(content=body, media_type="application/json", headers=cache_headers)
+        if run.status not in run_response.TERMINAL_STATUSES:
+            return run # Still changing: not cacheable
+        cached = await run_response.materialize(db, run) # Finished before materialization existed, or outside the engine
+
+    cache_headers = {"ETag": cached.etag, "Cache-Control": "private, no-cache"} # Clients must revalidate, but may reuse on 304
+    if etag_matches(if_none_match, cached.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers)
+    return Response(content=cached.body, media_type="application/json", headers=cache_headers)
+
+@router.get("/{run_id}/diff/{other_run_id}")
+async def diff_runs(
+    run_id: int,
+    other_run_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(deps.get_current_active_user),
+):
+    """
+    What changed from run `run_id` to run `other_run_id`, as NDJSON (see services/run_diff): block runs
+    aligned by block, list items and matrix cells by index, with only changed outputs and their text diffs.
+    """
+    outputs = []
+    for id in (run_id, other_run_id):
+        run = await crud_run.get_by_id_and_user(db, id=id, user_id=current_user.id)
+        if not run:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Run {id} not found or not owned by user")
+        try:
+            outputs.append(await run_diff.block_outputs(run))
+        except run_archive.RunArchiveError as e:
+            logger.error(f"Archived run {id} is unreadable: {e}")
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Archived run is temporarily unavailable.")
+    # A sync generator: Starlette iterates it in a worker thread, so diffing large matrices doesn't block the loop
+    return StreamingResponse(run_diff.diff_runs(run_id, other_run_id, *outputs), media_type="application/x-ndjson")
+
+@router.post("/{run_id}/cancel", response_model=run_schema.RunRead, status_code=status.HTTP_202_ACCEPTED)
+async def cancel_run(
     run_id: int,
     db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(deps.get_current_active_user)
 ):
+    """
+    Cancels a pending or running run. Pending runs are cancelled immediately. Running runs stop
+    starting LLM calls and abort the ones in flight; completed block results are kept and the
+    run and its unfinished block run are marked cancelled once the engine has stopped.
+    """
     run = await crud_run.get_by_id_and_user(db, id=run_id, user_id=current_user.id)
     if not run:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Run not found or not owned by user")
-    return run
+    if run.status not in (models.RunStatusEnum.PENDING, models.RunStatusEnum.RUNNING):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Run is already {run.status.value}.")
+
+    # Signal a local engine first so in-flight LLM calls stop before we wait on the DB write
+    if not run_control.request_cancel(run_id):
+        logger.info(f"Run {run_id} is not executing in this process; its worker will see the cancel request on its next poll.")
+    await crud_run.request_cancel(db, db_obj=run)
+    return await crud_run.get_by_id_and_user(db, id=run_id, user_id=current_user.id) # Reload with block runs
 
 # Optional: Endpoint to get details of a specific BlockRun
 @router.get("/block_run/{block_run_id}", response_model=run_schema.BlockRunReadWithDetails) # Assuming this schema exists
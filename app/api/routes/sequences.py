@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
@@ -7,6 +8,7 @@ from app.db import models # Import your models module
 from app.schemas import sequence as sequence_schema # Alias to avoid conflict
 from app.crud import crud_sequence
 from app.db.session import get_db
+from app.services import sequence_plan, sequence_transfer, variable_catalog
 
 router = APIRouter()
 
@@ -60,6 +62,8 @@ async def update_sequence(
     #     if existing_sequence.scalars().first():
     #         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Sequence name already exists for this user.")
 
+    if "llm_config_json" in sequence_in.model_fields_set:
+        await crud_sequence.bump_version(db, sequence_id=current_sequence.id) # Plans carry the LLM defaults
     updated_sequence = await crud_sequence.update(db, db_obj=current_sequence, obj_in=sequence_in)
     return await crud_sequence.get_by_id_and_owner(db, id=updated_sequence.id, user_id=current_sequence.user_id)
 
@@ -70,4 +74,34 @@ async def delete_sequence(
     current_sequence: models.Sequence = Depends(deps.get_sequence_owner_check) # Ensures ownership
 ):
     await crud_sequence.remove(db, id=current_sequence.id)
+    sequence_plan.evict_sequence(current_sequence.id)
+    variable_catalog.evict_sequence(current_sequence.id)
     return # No content response
+
+
+@router.get("/{sequence_id}/export")
+async def export_sequence(
+    include_runs: bool = False, # Also export finished runs with their block runs
+    current_sequence: models.Sequence = Depends(deps.get_sequence_owner_check),
+):
+    # NDJSON streamed record by record: a large sequence (or its run history) is never held in memory
+    return StreamingResponse(
+        sequence_transfer.export_sequence(current_sequence, current_sequence.user_id, include_runs=include_runs),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="sequence-{current_sequence.id}.ndjson"'},
+    )
+
+@router.post("/import", response_model=sequence_schema.SequenceImportResult, status_code=status.HTTP_201_CREATED)
+async def import_sequence(
+    request: Request, # Raw NDJSON body from /export, parsed incrementally
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(deps.get_current_active_user),
+    name: str | None = None, # Name for the new sequence; the exported name by default
+    global_lists: sequence_transfer.GlobalListImportMode = sequence_transfer.GlobalListImportMode.SKIP,
+):
+    try:
+        return await sequence_transfer.import_sequence(
+            db, user_id=current_user.id, chunks=request.stream(), name=name, global_lists=global_lists
+        )
+    except sequence_transfer.SequenceTransferError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
@@ -1,13 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Dict, Any
+from typing import List
 
 from app.api import deps
 from app.db import models
 from app.schemas import variable as variable_schema
 from app.schemas.variable import AvailableVariable # Specific schema for available vars
-from app.crud import crud_variable, crud_sequence, crud_block, crud_global_list
+from app.crud import crud_variable, crud_sequence
 from app.db.session import get_db
+from app.services import variable_catalog
 
 router = APIRouter()
 
@@ -99,65 +100,22 @@ async def delete_variable(
 
 @router.get("/available_for_sequence/{sequence_id}", response_model=List[AvailableVariable])
 async def list_available_variables_for_sequence(
-    parent_sequence: models.Sequence = Depends(get_parent_sequence_for_variable_ops), # Validates sequence ownership
+    sequence_id: int,
+    response: Response,
     db: AsyncSession = Depends(get_db),
-    current_user: models.User = Depends(deps.get_current_active_user) # For global lists
+    current_user: models.User = Depends(deps.get_current_active_user), # For global lists
+    if_none_match: str | None = Header(default=None),
 ):
-    available_vars: List[AvailableVariable] = []
-
-    # 1. User-defined Global and Input variables for this sequence
-    seq_vars = await crud_variable.get_multi_by_sequence(db, sequence_id=parent_sequence.id)
-    for var in seq_vars:
-        available_vars.append(AvailableVariable(
-            name=var.name,
-            type=var.type.value, # 'global' or 'input'
-            source=f"Sequence Defined ({var.type.value.capitalize()})",
-            description=var.description
-        ))
-
-    # 2. User's Global Lists
-    user_global_lists = await crud_global_list.get_multi_by_owner(db, user_id=current_user.id)
-    for glist in user_global_lists:
-        available_vars.append(AvailableVariable(
-            name=glist.name,
-            type="global_list",
-            source="User Global List",
-            description=glist.description
-        ))
-
-    # 3. Outputs from Blocks within this sequence
-    # These are conceptual variables derived from block configurations.
-    # The actual values are only available after a run.
-    sequence_blocks = await crud_block.get_multi_by_sequence(db, sequence_id=parent_sequence.id)
-    for block in sequence_blocks:
-        config = block.config_json
-        if block.type == models.BlockTypeEnum.STANDARD:
-            var_name = config.get("output_variable_name", f"block_{block.id}_output")
-            available_vars.append(AvailableVariable(
-                name=var_name, type="block_output", source=f"Block: {block.name}", description=f"Output of '{block.name}'"
-            ))
-        elif block.type == models.BlockTypeEnum.DISCRETIZATION:
-            output_names = config.get("output_names", [])
-            for name in output_names:
-                available_vars.append(AvailableVariable(
-                    name=name, type="block_output", source=f"Block: {block.name} (Discretized)", description=f"Discretized output '{name}' from '{block.name}'"
-                ))
-        elif block.type == models.BlockTypeEnum.SINGLE_LIST:
-            var_name = config.get("output_list_variable_name") or f"output_list_{block.id}"
-            available_vars.append(AvailableVariable(
-                name=var_name, type="list_output", source=f"Block: {block.name}", description=f"List output of '{block.name}'"
-            ))
-        elif block.type == models.BlockTypeEnum.MULTI_LIST:
-            var_name = config.get("output_matrix_variable_name") or f"output_matrix_{block.id}"
-            available_vars.append(AvailableVariable(
-                name=var_name, type="matrix_output", source=f"Block: {block.name}", description=f"Matrix output of '{block.name}'"
-            ))
-            
-    # Remove duplicates by name, prioritizing more specific types if any (though types here are distinct)
-    # A simple way: convert to dict by name, then back to list
-    final_vars_dict: Dict[str, AvailableVariable] = {}
-    for avar in available_vars:
-        if avar.name not in final_vars_dict: # Keep first encountered (could add priority logic)
-            final_vars_dict[avar.name] = avar
-            
-    return list(final_vars_dict.values())
+    # Version lookup doubles as the ownership check; blocks and variables aren't loaded for it
+    sequence_version = await crud_sequence.get_version_for_owner(db, id=sequence_id, user_id=current_user.id)
+    if sequence_version is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Parent sequence not found or not owned by user")
+
+    etag = variable_catalog.catalog_etag(sequence_id, sequence_version, current_user.id, current_user.global_lists_version)
+    cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache"} # Clients must revalidate, but may reuse on 304
+    if variable_catalog.etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers)
+
+    catalog = await variable_catalog.get_catalog(db, sequence_id=sequence_id, user_id=current_user.id, etag=etag)
+    response.headers.update(cache_headers)
+    return catalog
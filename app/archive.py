@@ -0,0 +1,30 @@
+# Run history archival: moves finished runs past the retention settings to compressed files in
+# RUN_ARCHIVE_DIR (see services/run_archive), e.g. nightly from cron:
+#
+#   python -m app.archive [--older-than-days D] [--keep-last N] [--batch-size B]
+#
+# Archived runs stay readable through GET /runs/{id}. Run one pass at a time; every pass writes a new file.
+import argparse
+import asyncio
+import logging
+
+from app.core.config import settings
+from app.services import run_archive
+
+logger = logging.getLogger("app.archive")
+
+
+async def main(older_than_days: float, keep_last: int, batch_size: int) -> None:
+    totals = await run_archive.archive_runs(older_than_days=older_than_days, keep_last=keep_last, batch_size=batch_size)
+    logger.info(f"Archived {totals['runs']} run(s), {totals['bytes']} compressed bytes.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move finished runs to compressed cold storage")
+    parser.add_argument("--older-than-days", type=float, default=settings.RUN_ARCHIVE_AFTER_DAYS, help="Archive runs finished this long ago (0 = off)")
+    parser.add_argument("--keep-last", type=int, default=settings.RUN_ARCHIVE_KEEP_LAST, help="Archive runs beyond the N most recent per sequence (0 = off)")
+    parser.add_argument("--batch-size", type=int, default=settings.RUN_ARCHIVE_BATCH_SIZE, help="Runs written and committed together")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(args.older_than_days, args.keep_last, args.batch_size))
@@ -1,7 +1,8 @@
 import os
+import json
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
-from typing import List
+from typing import Dict, List
 
 load_dotenv()
 
@@ -14,10 +15,119 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 60 * 24 * 7)) # 7 days
     
     CLAUDE_API_KEY: str | None = os.getenv("CLAUDE_API_KEY")
+    CLAUDE_API_URL: str = os.getenv("CLAUDE_API_URL", "https://api.anthropic.com/v1/messages") # Point at a mock server for benchmarks
+
+    # USD per million tokens, by model. LLM_PRICING_JSON (same shape) overrides/extends these defaults.
+    DEFAULT_LLM_PRICING: Dict[str, Dict[str, float]] = {
+        "claude-3-opus-20240229": {"input_per_mtok": 15.0, "output_per_mtok": 75.0},
+        "claude-3-sonnet-20240229": {"input_per_mtok": 3.0, "output_per_mtok": 15.0},
+        "claude-3-haiku-20240307": {"input_per_mtok": 0.25, "output_per_mtok": 1.25},
+        "claude-3-5-sonnet-20240620": {"input_per_mtok": 3.0, "output_per_mtok": 15.0},
+        "claude-3-5-sonnet-20241022": {"input_per_mtok": 3.0, "output_per_mtok": 15.0},
+        "claude-3-5-haiku-20241022": {"input_per_mtok": 0.8, "output_per_mtok": 4.0},
+    }
+    LLM_PRICING_JSON: str = os.getenv("LLM_PRICING_JSON", "")
+    # Context window (prompt + response tokens) by model; LLM_CONTEXT_WINDOWS_JSON overrides/extends these
+    DEFAULT_LLM_CONTEXT_WINDOWS: Dict[str, int] = {
+        "claude-3-opus-20240229": 200000,
+        "claude-3-sonnet-20240229": 200000,
+        "claude-3-haiku-20240307": 200000,
+        "claude-3-5-sonnet-20240620": 200000,
+        "claude-3-5-sonnet-20241022": 200000,
+        "claude-3-5-haiku-20241022": 200000,
+    }
+    LLM_CONTEXT_WINDOWS_JSON: str = os.getenv("LLM_CONTEXT_WINDOWS_JSON", "")
+    DEFAULT_LLM_CONTEXT_WINDOW: int = int(os.getenv("DEFAULT_LLM_CONTEXT_WINDOW", 200000)) # Models missing from the table
+    # Offline prompt sizing (services/token_estimate.py): estimates are scaled by the safety factor; a call is
+    # refused before it is sent if fewer than LLM_MIN_OUTPUT_TOKENS would remain for the response
+    TOKEN_ESTIMATE_SAFETY_FACTOR: float = float(os.getenv("TOKEN_ESTIMATE_SAFETY_FACTOR", 1.1))
+    LLM_MIN_OUTPUT_TOKENS: int = int(os.getenv("LLM_MIN_OUTPUT_TOKENS", 256))
+    # Applied to runs that don't set their own budget; unset means unlimited
+    DEFAULT_RUN_TOKEN_BUDGET: int | None = int(os.getenv("DEFAULT_RUN_TOKEN_BUDGET")) if os.getenv("DEFAULT_RUN_TOKEN_BUDGET") else None
+    DEFAULT_RUN_COST_BUDGET: float | None = float(os.getenv("DEFAULT_RUN_COST_BUDGET")) if os.getenv("DEFAULT_RUN_COST_BUDGET") else None
+
+    # Rows per multi-row INSERT when bulk-importing global list items
+    GLOBAL_LIST_IMPORT_BATCH_SIZE: int = int(os.getenv("GLOBAL_LIST_IMPORT_BATCH_SIZE", 1000))
+    # Compiled sequence plans kept in-process (one entry per sequence version)
+    SEQUENCE_PLAN_CACHE_SIZE: int = int(os.getenv("SEQUENCE_PLAN_CACHE_SIZE", 256))
+    # Built variable catalogs kept in-process (one entry per sequence/global-lists version pair)
+    VARIABLE_CATALOG_CACHE_SIZE: int = int(os.getenv("VARIABLE_CATALOG_CACHE_SIZE", 512))
+
+    # LLM scheduling: global and per-user concurrent calls (per-user 0 = no cap), concurrent items per list/matrix block,
+    # and weight multipliers for runs a request is waiting on and for runs expected to need few calls
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", 16))
+    LLM_PER_USER_MAX_CONCURRENCY: int = int(os.getenv("LLM_PER_USER_MAX_CONCURRENCY", 8))
+    RUN_ITEM_CONCURRENCY: int = int(os.getenv("RUN_ITEM_CONCURRENCY", 8))
+    LLM_INTERACTIVE_WEIGHT: float = float(os.getenv("LLM_INTERACTIVE_WEIGHT", 4))
+    LLM_SHORT_RUN_WEIGHT: float = float(os.getenv("LLM_SHORT_RUN_WEIGHT", 2))
+    LLM_SHORT_RUN_MAX_CALLS: int = int(os.getenv("LLM_SHORT_RUN_MAX_CALLS", 10))
+    LLM_TOKENS_PER_MINUTE: int = int(os.getenv("LLM_TOKENS_PER_MINUTE", 0)) # Estimated prompt + max_tokens admitted per minute (0 = unlimited)
+    LLM_PRIORITY_DOUBLING: float = float(os.getenv("LLM_PRIORITY_DOUBLING", 5)) # Run priority points that double its LLM share
+    LLM_ESTIMATED_CALL_SECONDS: float = float(os.getenv("LLM_ESTIMATED_CALL_SECONDS", 8)) # Used to check runs against their deadline
+
+    # Consecutive list blocks where each iterates the previous one's output run together, item i of a block
+    # starting as soon as item i of the previous one is done (see list_pipeline)
+    RUN_PIPELINE_LIST_BLOCKS: bool = os.getenv("RUN_PIPELINE_LIST_BLOCKS", "true").lower() in ("1", "true", "yes")
+
+    # LLM model selection: used for blocks whose config and sequence don't choose. A call fails over to the next
+    # model of its fallback chain when the API reports overload (429/503/529) or it runs longer than
+    # LLM_FAILOVER_AFTER_SECONDS (0 = never on time; the last model of a chain is always waited for)
+    DEFAULT_LLM_MODEL: str = os.getenv("DEFAULT_LLM_MODEL", "claude-3-opus-20240229")
+    DEFAULT_LLM_MAX_TOKENS: int = int(os.getenv("DEFAULT_LLM_MAX_TOKENS", 2048))
+    LLM_FALLBACK_MODELS: List[str] = [m.strip() for m in os.getenv("LLM_FALLBACK_MODELS", "").split(",") if m.strip()]
+    LLM_FAILOVER_AFTER_SECONDS: float = float(os.getenv("LLM_FAILOVER_AFTER_SECONDS", 60))
+
+    # Provider prompt caching for list/matrix blocks: the prompt text before the first {{item}} is marked
+    # cacheable when it is at least this many (estimated) tokens; shorter prefixes can't be cached by the API
+    LLM_PROMPT_CACHING: bool = os.getenv("LLM_PROMPT_CACHING", "true").lower() in ("1", "true", "yes")
+    LLM_PROMPT_CACHE_MIN_TOKENS: int = int(os.getenv("LLM_PROMPT_CACHE_MIN_TOKENS", 1024))
+
+    # Item packing (SINGLE_LIST blocks with `pack_items`): estimated input tokens per packed request, max_tokens
+    # requested for its response, and the output tokens assumed per item when deciding how many items fit
+    LLM_PACK_MAX_INPUT_TOKENS: int = int(os.getenv("LLM_PACK_MAX_INPUT_TOKENS", 8000))
+    LLM_PACK_MAX_TOKENS: int = int(os.getenv("LLM_PACK_MAX_TOKENS", 4096))
+    LLM_PACK_OUTPUT_TOKENS_PER_ITEM: int = int(os.getenv("LLM_PACK_OUTPUT_TOKENS_PER_ITEM", 150))
+
+    # "inline": POST /runs/ executes the run in the API process and returns it finished.
+    # "queue": POST /runs/ enqueues it and returns at once; `python -m app.worker` processes execute queued runs.
+    RUN_EXECUTION_MODE: str = os.getenv("RUN_EXECUTION_MODE", "inline")
+    RUN_QUEUE_LEASE_SECONDS: float = float(os.getenv("RUN_QUEUE_LEASE_SECONDS", 60))
+    RUN_QUEUE_HEARTBEAT_SECONDS: float = float(os.getenv("RUN_QUEUE_HEARTBEAT_SECONDS", 15))
+    RUN_QUEUE_POLL_SECONDS: float = float(os.getenv("RUN_QUEUE_POLL_SECONDS", 1))
+    RUN_QUEUE_MAX_ATTEMPTS: int = int(os.getenv("RUN_QUEUE_MAX_ATTEMPTS", 3))
+    WORKER_CONCURRENCY: int = int(os.getenv("WORKER_CONCURRENCY", 4)) # Runs executed at once per worker process
+
+    # How often an executing run checks the DB for a cancel request made through another worker (0 disables)
+    RUN_CANCEL_POLL_SECONDS: float = float(os.getenv("RUN_CANCEL_POLL_SECONDS", 2))
+
+    # Run history archival (`python -m app.archive`): finished runs older than RUN_ARCHIVE_AFTER_DAYS, or beyond
+    # the RUN_ARCHIVE_KEEP_LAST most recent of their sequence, move to compressed files in RUN_ARCHIVE_DIR (0 disables each)
+    RUN_ARCHIVE_DIR: str = os.getenv("RUN_ARCHIVE_DIR", "./run_archive")
+    RUN_ARCHIVE_AFTER_DAYS: float = float(os.getenv("RUN_ARCHIVE_AFTER_DAYS", 0))
+    RUN_ARCHIVE_KEEP_LAST: int = int(os.getenv("RUN_ARCHIVE_KEEP_LAST", 0))
+    RUN_ARCHIVE_BATCH_SIZE: int = int(os.getenv("RUN_ARCHIVE_BATCH_SIZE", 100)) # Runs written and committed together
+
+    # Execution tracing: "none" or "jsonl" (one finished span per line in TRACE_JSONL_PATH)
+    TRACE_EXPORTER: str = os.getenv("TRACE_EXPORTER", "none")
+    TRACE_JSONL_PATH: str = os.getenv("TRACE_JSONL_PATH", "./traces.jsonl")
     
     # CORS Origins: space-separated string in .env, converted to list here
     BACKEND_CORS_ORIGINS_STR: str = os.getenv("BACKEND_CORS_ORIGINS", "http://localhost:3000 http://127.0.0.1:3000")
     
+    @property
+    def LLM_PRICING(self) -> Dict[str, Dict[str, float]]:
+        pricing = dict(self.DEFAULT_LLM_PRICING)
+        if self.LLM_PRICING_JSON:
+            pricing.update(json.loads(self.LLM_PRICING_JSON))
+        return pricing
+
+    @property
+    def LLM_CONTEXT_WINDOWS(self) -> Dict[str, int]:
+        windows = dict(self.DEFAULT_LLM_CONTEXT_WINDOWS)
+        if self.LLM_CONTEXT_WINDOWS_JSON:
+            windows.update(json.loads(self.LLM_CONTEXT_WINDOWS_JSON))
+        return windows
+
     @property
     def BACKEND_CORS_ORIGINS(self) -> List[str]:
         return [origin.strip() for origin in self.BACKEND_CORS_ORIGINS_STR.split(' ') if origin.strip()]
@@ -0,0 +1,80 @@
+# Prometheus metrics, exposed at /metrics (see app/main.py).
+# Metric objects live here so every layer (LLM interface, prompt rendering, engine, DB engine
+# events, caches) records into one registry. With several worker processes, point
+# PROMETHEUS_MULTIPROC_DIR at a shared directory so prometheus_client aggregates them.
+import time
+from contextvars import ContextVar
+
+from fastapi import Request
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# LLM latencies run from sub-second to minutes for long generations
+LLM_LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 90, 120, 180, 300)
+
+LLM_CALL_LATENCY = Histogram(
+    "mpsg_llm_call_duration_seconds", "Latency of successful LLM API calls.",
+    ["model", "block_type"], buckets=LLM_LATENCY_BUCKETS,
+)
+LLM_CALLS_IN_FLIGHT = Gauge("mpsg_llm_calls_in_flight", "LLM API requests currently awaiting a response.")
+LLM_CALLS_QUEUED = Gauge("mpsg_llm_calls_queued", "LLM calls waiting for a concurrency slot.")
+LLM_RETRIES = Counter(
+    "mpsg_llm_retries_total", "LLM calls retried (model = the retry's model), by reason (overloaded/slow/pack_parse).", ["model", "reason"],
+)
+LLM_ERRORS = Counter("mpsg_llm_errors_total", "LLM calls that failed, by error kind.", ["model", "error"])
+LLM_FAILOVERS = Counter(
+    "mpsg_llm_failovers_total", "LLM calls moved to a fallback model, by reason (overloaded/slow).", ["from_model", "to_model", "reason"],
+)
+LLM_TOKENS = Counter("mpsg_llm_tokens_total", "Tokens consumed by LLM calls.", ["model", "direction"])
+
+TEMPLATE_RENDER_SECONDS = Histogram(
+    "mpsg_template_render_duration_seconds", "Time spent rendering prompt templates.",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+)
+
+DB_QUERY_SECONDS = Histogram(
+    "mpsg_db_query_duration_seconds", "Database statement latency by API route (count = queries per route).",
+    ["route"], buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+ACTIVE_RUNS = Gauge("mpsg_active_runs", "Sequence runs currently executing.")
+
+CACHE_LOOKUPS = Counter("mpsg_cache_lookups_total", "In-process cache lookups; hit ratio = hit / (hit + miss).", ["cache", "result"])
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_LOOKUPS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+# --- Per-route DB query attribution ---
+# The route template (e.g. /api/v1/runs/{run_id}) is stored in a context variable by a router-level
+# dependency, so statements executed while serving the request are labelled with it.
+# Work outside a request (e.g. background execution) is labelled "background".
+
+current_route: ContextVar[str] = ContextVar("current_route", default="background")
+
+async def track_route(request: Request) -> None:
+    route = request.scope.get("route")
+    current_route.set(getattr(route, "path", None) or "unmatched")
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Attaches query timing to a (sync) SQLAlchemy engine; for async engines pass `engine.sync_engine`."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_times", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start_times = conn.info.get("query_start_times")
+        if start_times:
+            DB_QUERY_SECONDS.labels(route=current_route.get()).observe(time.perf_counter() - start_times.pop())
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):
+        # Keep the start-time stack balanced when a statement fails
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_start_times"):
+            conn.info["query_start_times"].pop()
@@ -0,0 +1,40 @@
+# JSON encoding for API responses.
+# orjson (optional dependency) encodes several times faster than the stdlib encoder and natively
+# handles datetimes and enums; without it everything falls back to the stdlib / pydantic encoders.
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError: # pragma: no cover - optional dependency
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def loads(content: str | bytes) -> Any:
+    """Parses JSON; raises ValueError (or a subclass) for malformed input."""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def model_bytes(model: BaseModel) -> bytes:
+    """Encodes a validated schema instance straight to JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(model.model_dump(), option=orjson.OPT_NON_STR_KEYS)
+    return model.model_dump_json().encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """Default response class: JSONResponse rendered with orjson when it is installed."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
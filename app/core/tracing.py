@@ -0,0 +1,167 @@
+# Lightweight span-based tracing for sequence execution.
+# Spans nest run -> block -> item/cell -> LLM call through a context variable, so nesting follows
+# the awaiting coroutine (and is inherited by tasks it spawns). Finished spans are handed to the
+# configured exporter; trace/span IDs are also stamped onto every log record (see install_log_context).
+import abc
+import atexit
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+import json
+import logging
+import queue
+import secrets
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    start_time: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    duration_ms: Optional[float] = None
+    status: str = "ok" # "ok" or "error"
+    error: Optional[str] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    _start: float = field(default_factory=time.perf_counter, repr=False)
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time.isoformat(),
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class SpanExporter(abc.ABC):
+    """
+    Receives every finished span. Subclass and pass to set_exporter() to ship spans elsewhere.
+    export() is called on the event loop for every span: it must not block.
+    """
+    @abc.abstractmethod
+    def export(self, span: Span) -> None:
+        ...
+
+
+class JsonLinesFileExporter(SpanExporter):
+    """
+    Appends one JSON object per finished span to a local file. export() only enqueues the span; a
+    background thread encodes and writes whatever has accumulated in one batch through a file
+    handle kept open, so the event loop never waits on disk I/O.
+    """
+    _STOP = object()
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: "queue.SimpleQueue[Any]" = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._write_loop, name="span-exporter", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def export(self, span: Span) -> None:
+        self._queue.put(span.to_dict())
+
+    def close(self) -> None:
+        """Writes the spans still queued and stops the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join()
+
+    def _write_loop(self) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                batch = [self._queue.get()] # Blocks until there is something to write
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stopping = any(record is self._STOP for record in batch)
+                lines = [json.dumps(record, default=str) + "\n" for record in batch if record is not self._STOP]
+                try:
+                    f.writelines(lines)
+                    f.flush()
+                except OSError as e: # Tracing must never break execution; drop the batch
+                    logger.warning(f"Writing {len(lines)} span(s) to {self.path} failed: {e}")
+                if stopping:
+                    return
+
+
+def _exporter_from_settings() -> Optional[SpanExporter]:
+    if settings.TRACE_EXPORTER == "jsonl":
+        return JsonLinesFileExporter(settings.TRACE_JSONL_PATH)
+    if settings.TRACE_EXPORTER not in ("", "none"):
+        logger.warning(f"Unknown TRACE_EXPORTER '{settings.TRACE_EXPORTER}'; tracing export disabled.")
+    return None
+
+
+_exporter: Optional[SpanExporter] = _exporter_from_settings()
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def set_exporter(exporter: Optional[SpanExporter]) -> None:
+    global _exporter
+    _exporter = exporter
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Opens a child of the current span (or a new trace at the top level) for the duration of the block.
+    An exception escaping the block marks the span as failed and is re-raised.
+    """
+    parent = current_span.get()
+    new_span = Span(
+        name=name,
+        trace_id=parent.trace_id if parent else secrets.token_hex(16),
+        span_id=secrets.token_hex(8),
+        parent_id=parent.span_id if parent else None,
+        attributes=attributes,
+    )
+    token = current_span.set(new_span)
+    try:
+        yield new_span
+    except BaseException as e:
+        new_span.status = "error"
+        new_span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        new_span.duration_ms = round((time.perf_counter() - new_span._start) * 1000, 3)
+        current_span.reset(token)
+        if _exporter is not None:
+            try:
+                _exporter.export(new_span)
+            except Exception as e: # Tracing must never break execution
+                logger.warning(f"Span export failed: {e}")
+
+
+def install_log_context() -> None:
+    """Adds `trace_id` and `span_id` attributes ("-" outside a span) to every log record."""
+    base_factory = logging.getLogRecordFactory()
+
+    def record_factory(*args, **kwargs):
+        record = base_factory(*args, **kwargs)
+        active = current_span.get()
+        record.trace_id = active.trace_id if active else "-"
+        record.span_id = active.span_id if active else "-"
+        return record
+
+    logging.setLogRecordFactory(record_factory)
@@ -1,4 +1,6 @@
-from typing import Any, Dict, Generic, List, Optional, Type, TypeVar, Union
+import base64
+import json
+from typing import Any, Dict, Generic, List, Optional, Tuple, Type, TypeVar, Union
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
@@ -10,6 +12,34 @@ ModelType = TypeVar("ModelType", bound=Base)
 CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
 UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
 
+
+# --- Keyset pagination cursors ---
+# Cursors are opaque to clients: a urlsafe-base64 JSON list holding the sort key of the
+# last row of the previous page. Keyset queries then seek past that key instead of
+# using OFFSET, so every page costs the same regardless of depth.
+
+def encode_cursor(*key: Any) -> str:
+    raw = json.dumps(list(key), separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str, *types: Union[type, Tuple[type, ...]]) -> List[Any]:
+    """
+    The sort key of a cursor, one element per entry of `types`, each checked against it
+    (bools aren't ints here). Raises ValueError for anything malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError) as e: # binascii.Error and JSONDecodeError are ValueErrors
+        raise ValueError("Invalid pagination cursor.") from e
+    if not isinstance(key, list) or len(key) != len(types):
+        raise ValueError("Invalid pagination cursor.")
+    for value, expected in zip(key, types):
+        if isinstance(value, bool) or not isinstance(value, expected):
+            raise ValueError("Invalid pagination cursor.")
+    return key
+
+
 class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
     def __init__(self, model: Type[ModelType]):
         self.model = model
@@ -23,6 +53,19 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
     ) -> List[ModelType]:
         result = await db.execute(select(self.model).offset(skip).limit(limit))
         return result.scalars().all()
+
+    async def get_multi_keyset(
+        self, db: AsyncSession, *, cursor: Optional[str] = None, limit: int = 100
+    ) -> Tuple[List[ModelType], Optional[str]]:
+        """Keyset-paginated listing ordered by id. Returns (rows, next_cursor)."""
+        query = select(self.model).order_by(self.model.id.asc())
+        if cursor:
+            (last_id,) = decode_cursor(cursor, int)
+            query = query.filter(self.model.id > last_id)
+        result = await db.execute(query.limit(limit + 1)) # Fetch one extra row to detect a next page
+        rows = result.scalars().all()
+        next_cursor = encode_cursor(rows[limit - 1].id) if len(rows) > limit else None
+        return rows[:limit], next_cursor
     
     async def count(self, db: AsyncSession) -> int:
         result = await db.execute(select(func.count()).select_from(self.model))
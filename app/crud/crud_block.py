@@ -1,16 +1,38 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Union
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy import and_
 
 from app.crud.base import CRUDBase
+from app.crud.crud_sequence import sequence as crud_sequence
 from app.models.block import Block
-from app.schemas.block import BlockCreate, BlockUpdate
+from app.schemas.block import BlockCreate, BlockUpdate, BlockBatchRequest
 
 class CRUDBlock(CRUDBase[Block, BlockCreate, BlockUpdate]):
+    # Every write bumps the parent sequence's version in the same transaction so cached plans are invalidated
+
+    async def create(self, db: AsyncSession, *, obj_in: BlockCreate) -> Block:
+        await crud_sequence.bump_version(db, sequence_id=obj_in.sequence_id)
+        return await super().create(db, obj_in=obj_in)
+
+    async def update(
+        self, db: AsyncSession, *, db_obj: Block, obj_in: Union[BlockUpdate, Dict[str, Any]]
+    ) -> Block:
+        await crud_sequence.bump_version(db, sequence_id=db_obj.sequence_id)
+        return await super().update(db, db_obj=db_obj, obj_in=obj_in)
+
+    async def remove(self, db: AsyncSession, *, id: int) -> Optional[Block]:
+        db_obj = await self.get(db, id=id)
+        if db_obj:
+            await crud_sequence.bump_version(db, sequence_id=db_obj.sequence_id)
+            await db.delete(db_obj)
+            await db.commit()
+        return db_obj
+
     async def create_with_sequence( # Renamed for clarity
         self, db: AsyncSession, *, obj_in: BlockCreate # sequence_id is in BlockCreate
     ) -> Block:
+        await crud_sequence.bump_version(db, sequence_id=obj_in.sequence_id)
         # Pydantic V2
         obj_in_data = obj_in.model_dump()
         # Pydantic V1
@@ -41,4 +63,66 @@ class CRUDBlock(CRUDBase[Block, BlockCreate, BlockUpdate]):
         )
         return result.scalars().first()
 
+    async def apply_batch(
+        self, db: AsyncSession, *, sequence_id: int, existing_blocks: List[Block], batch: BlockBatchRequest
+    ) -> List[Block]:
+        """
+        Applies creates, updates, deletes and a reorder to one sequence's blocks in a single transaction.
+        `existing_blocks` are the sequence's current blocks (already loaded by the ownership check).
+        Raises ValueError (nothing is written) if the batch references blocks outside the sequence
+        or `order` is not a permutation of the resulting blocks.
+        """
+        blocks_by_id = {b.id: b for b in existing_blocks}
+
+        unknown_ids = {u.id for u in batch.updates} | set(batch.deletes)
+        unknown_ids -= blocks_by_id.keys()
+        if unknown_ids:
+            raise ValueError(f"Blocks not found in sequence {sequence_id}: {sorted(unknown_ids)}")
+        deleted_ids = set(batch.deletes)
+        if any(u.id in deleted_ids for u in batch.updates):
+            raise ValueError("A block cannot be both updated and deleted in the same batch.")
+        client_refs = [c.client_ref for c in batch.creates if c.client_ref is not None]
+        if len(client_refs) != len(set(client_refs)):
+            raise ValueError("Duplicate client_ref in creates.")
+
+        if batch.order is not None:
+            expected = {("id", bid) for bid in blocks_by_id if bid not in deleted_ids}
+            expected |= {("ref", ref) for ref in client_refs}
+            given = [("id", key) if isinstance(key, int) else ("ref", key) for key in batch.order]
+            if len(given) != len(expected) or set(given) != expected:
+                raise ValueError("'order' must list every remaining block id and created client_ref exactly once.")
+            if len(client_refs) != len(batch.creates):
+                raise ValueError("Every created block needs a client_ref when 'order' is given.")
+
+        try:
+            for block_id in deleted_ids:
+                await db.delete(blocks_by_id.pop(block_id))
+
+            for update in batch.updates:
+                # Pydantic V2
+                update_data = update.model_dump(exclude_unset=True, exclude={"id"})
+                db_obj = blocks_by_id[update.id]
+                for field, value in update_data.items():
+                    setattr(db_obj, field, value)
+
+            created_by_ref = {}
+            for create in batch.creates:
+                db_obj = self.model(**create.model_dump(exclude={"client_ref"}), sequence_id=sequence_id)
+                db.add(db_obj)
+                if create.client_ref is not None:
+                    created_by_ref[create.client_ref] = db_obj
+
+            if batch.order is not None:
+                for position, key in enumerate(batch.order):
+                    db_obj = blocks_by_id[key] if isinstance(key, int) else created_by_ref[key]
+                    db_obj.order = position
+
+            await crud_sequence.bump_version(db, sequence_id=sequence_id)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+
+        return await self.get_multi_by_sequence(db, sequence_id=sequence_id)
+
 block = CRUDBlock(Block)
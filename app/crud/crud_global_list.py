@@ -1,10 +1,11 @@
-from typing import List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
-from sqlalchemy import and_
+from sqlalchemy import and_, or_, delete, insert, func
 
-from app.crud.base import CRUDBase
+from app.crud.base import CRUDBase, encode_cursor, decode_cursor
+from app.crud.crud_user import user as crud_user
 from app.models.global_list import GlobalList, GlobalListItem
 from app.schemas.global_list import GlobalListCreate, GlobalListUpdate, GlobalListItemCreate
 
@@ -17,11 +18,36 @@ class CRUDGlobalList(CRUDBase[GlobalList, GlobalListCreate, GlobalListUpdate]):
         # Pydantic V1
         # obj_in_data = obj_in.dict()
         db_obj = self.model(**obj_in_data, user_id=user_id)
+        await crud_user.bump_global_lists_version(db, user_id=user_id)
         db.add(db_obj)
         await db.commit()
         await db.refresh(db_obj)
         return db_obj
 
+    # List-level writes bump the owner's global_lists_version (catalog cache key); item writes don't
+    async def update(
+        self, db: AsyncSession, *, db_obj: GlobalList, obj_in: Union[GlobalListUpdate, Dict[str, Any]]
+    ) -> GlobalList:
+        await crud_user.bump_global_lists_version(db, user_id=db_obj.user_id)
+        return await super().update(db, db_obj=db_obj, obj_in=obj_in)
+
+    async def remove(self, db: AsyncSession, *, id: int) -> Optional[GlobalList]:
+        db_obj = await self.get(db, id=id)
+        if db_obj:
+            await crud_user.bump_global_lists_version(db, user_id=db_obj.user_id)
+            await db.delete(db_obj)
+            await db.commit()
+        return db_obj
+
+    async def get_names_by_owner(self, db: AsyncSession, *, user_id: int) -> List[Tuple[str, Optional[str]]]:
+        """(name, description) of every list the user owns, without touching items."""
+        result = await db.execute(
+            select(GlobalList.name, GlobalList.description)
+            .filter(GlobalList.user_id == user_id)
+            .order_by(GlobalList.id)
+        )
+        return [tuple(row) for row in result.all()]
+
     async def get_multi_by_owner(
         self, db: AsyncSession, *, user_id: int, skip: int = 0, limit: int = 100
     ) -> List[GlobalList]:
@@ -35,14 +61,61 @@ class CRUDGlobalList(CRUDBase[GlobalList, GlobalListCreate, GlobalListUpdate]):
         return result.scalars().all()
 
     async def get_by_id_and_owner(
-        self, db: AsyncSession, *, id: int, user_id: int
+        self, db: AsyncSession, *, id: int, user_id: int, with_items: bool = True
     ) -> Optional[GlobalList]:
+        query = select(self.model).filter(and_(GlobalList.id == id, GlobalList.user_id == user_id))
+        if with_items:
+            query = query.options(selectinload(GlobalList.items)) # Eager load items
+        result = await db.execute(query)
+        return result.scalars().first()
+
+    async def get_by_names(self, db: AsyncSession, *, user_id: int, names: Iterable[str]) -> List[GlobalList]:
+        """The user's lists with the given names, without items. Unknown names are simply absent."""
+        names = set(names)
+        if not names:
+            return []
         result = await db.execute(
-            select(self.model)
-            .filter(and_(GlobalList.id == id, GlobalList.user_id == user_id))
-            .options(selectinload(GlobalList.items)) # Eager load items
+            select(GlobalList).filter(and_(GlobalList.user_id == user_id, GlobalList.name.in_(names))).order_by(GlobalList.id)
         )
-        return result.scalars().first()
+        return result.scalars().all()
+
+    async def get_values_by_names(
+        self, db: AsyncSession, *, user_id: int, names: Iterable[str]
+    ) -> Dict[str, List[str]]:
+        """
+        Item values of the user's lists with the given names, in one query: {list_name: [values in order]}.
+        Lists without items map to []. Unknown names are simply absent.
+        """
+        names = set(names)
+        if not names:
+            return {}
+        result = await db.execute(
+            select(GlobalList.name, GlobalListItem.value)
+            .outerjoin(GlobalListItem, GlobalListItem.global_list_id == GlobalList.id)
+            .filter(and_(GlobalList.user_id == user_id, GlobalList.name.in_(names)))
+            .order_by(GlobalList.id, GlobalListItem.order, GlobalListItem.id)
+        )
+        values_by_name: Dict[str, List[str]] = {}
+        for list_name, value in result.all():
+            items = values_by_name.setdefault(list_name, [])
+            if value is not None: # Outer join row for an empty list
+                items.append(value)
+        return values_by_name
+
+    async def count_items_by_names(
+        self, db: AsyncSession, *, user_id: int, names: Iterable[str]
+    ) -> Dict[str, int]:
+        """Item counts of the user's lists with the given names, in one query. Unknown names are absent."""
+        names = set(names)
+        if not names:
+            return {}
+        result = await db.execute(
+            select(GlobalList.name, func.count(GlobalListItem.id))
+            .outerjoin(GlobalListItem, GlobalListItem.global_list_id == GlobalList.id)
+            .filter(and_(GlobalList.user_id == user_id, GlobalList.name.in_(names)))
+            .group_by(GlobalList.id, GlobalList.name)
+        )
+        return {list_name: count for list_name, count in result.all()}
 
     # --- Global List Item CRUD ---
     async def add_item_to_list(
@@ -58,6 +131,56 @@ class CRUDGlobalList(CRUDBase[GlobalList, GlobalListCreate, GlobalListUpdate]):
         await db.refresh(db_item)
         return db_item
 
+    async def bulk_insert_items(
+        self, db: AsyncSession, *, global_list_id: int, values: List[str], start_order: int
+    ) -> None:
+        """Inserts values as one multi-row statement with consecutive `order`s. Does not commit."""
+        if not values:
+            return
+        await db.execute(
+            insert(GlobalListItem),
+            [
+                {"global_list_id": global_list_id, "value": value, "order": start_order + i}
+                for i, value in enumerate(values)
+            ],
+        )
+
+    async def remove_all_items(self, db: AsyncSession, *, global_list_id: int) -> None:
+        # Does not commit; used by replace-mode imports inside their transaction
+        await db.execute(delete(GlobalListItem).where(GlobalListItem.global_list_id == global_list_id))
+
+    async def get_max_item_order(self, db: AsyncSession, *, global_list_id: int) -> Optional[int]:
+        result = await db.execute(
+            select(func.max(GlobalListItem.order)).filter(GlobalListItem.global_list_id == global_list_id)
+        )
+        return result.scalar_one_or_none()
+
+    async def count_items(self, db: AsyncSession, *, global_list_id: int) -> int:
+        result = await db.execute(
+            select(func.count()).select_from(GlobalListItem).filter(GlobalListItem.global_list_id == global_list_id)
+        )
+        return result.scalar_one()
+
+    async def get_items_page(
+        self, db: AsyncSession, *, global_list_id: int, cursor: Optional[str] = None, limit: int = 500
+    ) -> Tuple[List[GlobalListItem], Optional[str]]:
+        """Keyset-paginated items of a list, ordered by (order, id). Returns (items, next_cursor)."""
+        query = (
+            select(GlobalListItem)
+            .filter(GlobalListItem.global_list_id == global_list_id)
+            .order_by(GlobalListItem.order.asc(), GlobalListItem.id.asc())
+        )
+        if cursor:
+            last_order, last_id = decode_cursor(cursor, int, int)
+            query = query.filter(or_(
+                GlobalListItem.order > last_order,
+                and_(GlobalListItem.order == last_order, GlobalListItem.id > last_id),
+            ))
+        result = await db.execute(query.limit(limit + 1))
+        items = result.scalars().all()
+        next_cursor = encode_cursor(items[limit - 1].order, items[limit - 1].id) if len(items) > limit else None
+        return items[:limit], next_cursor
+
     async def get_item(self, db: AsyncSession, item_id: int) -> Optional[GlobalListItem]:
         result = await db.execute(select(GlobalListItem).filter(GlobalListItem.id == item_id))
         return result.scalars().first()
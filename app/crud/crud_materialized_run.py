@@ -0,0 +1,37 @@
+from typing import Optional
+from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import and_, delete
+
+from app.crud.base import CRUDBase
+from app.models.run import MaterializedRun, Run
+
+class CRUDMaterializedRun(CRUDBase[MaterializedRun, BaseModel, BaseModel]):
+    """Pre-serialized responses for finished runs. A run's row never changes; it is only replaced if the run re-executes."""
+
+    async def get_for_user(self, db: AsyncSession, *, run_id: int, user_id: int) -> Optional[MaterializedRun]:
+        result = await db.execute(
+            select(MaterializedRun)
+            .join(Run, Run.id == MaterializedRun.run_id) # Ownership check
+            .filter(and_(MaterializedRun.run_id == run_id, Run.user_id == user_id))
+        )
+        return result.scalars().first()
+
+    async def store(self, db: AsyncSession, *, run_id: int, etag: str, body: bytes) -> MaterializedRun:
+        db_obj = MaterializedRun(run_id=run_id, etag=etag, body=body)
+        db.add(db_obj)
+        try:
+            await db.commit()
+        except IntegrityError: # Another request materialized the same run first; its body is identical
+            await db.rollback()
+            result = await db.execute(select(MaterializedRun).filter(MaterializedRun.run_id == run_id))
+            return result.scalars().one()
+        return db_obj
+
+    async def remove_for_run(self, db: AsyncSession, *, run_id: int) -> None:
+        """Drops the cached response (the caller commits), e.g. when a queued run is executed again."""
+        await db.execute(delete(MaterializedRun).where(MaterializedRun.run_id == run_id))
+
+materialized_run = CRUDMaterializedRun(MaterializedRun)
@@ -1,22 +1,23 @@
-from typing import List, Optional
+from typing import List, Optional, Sequence, Tuple
+from datetime import datetime, timezone
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload, joinedload
-from sqlalchemy import and_
+from sqlalchemy import and_, or_, delete, func, update
 
-from app.crud.base import CRUDBase
-from app.models.run import Run, BlockRun
+from app.crud.base import CRUDBase, encode_cursor, decode_cursor
+from app.models.run import Run, BlockRun, MaterializedRun, RunStatusEnum
 from app.schemas.run import RunCreate, RunUpdate, BlockRunCreate # BlockRunUpdate not strictly needed if only created
 
 class CRUDRun(CRUDBase[Run, RunCreate, RunUpdate]):
     async def create_with_sequence_and_user(
-        self, db: AsyncSession, *, obj_in: RunCreate, user_id: int # sequence_id is in RunCreate
+        self, db: AsyncSession, *, obj_in: RunCreate, user_id: int, sample_rate: Optional[float] = None # sequence_id is in RunCreate
     ) -> Run:
         # Pydantic V2
         obj_in_data = obj_in.model_dump()
         # Pydantic V1
         # obj_in_data = obj_in.dict()
-        db_obj = self.model(**obj_in_data, user_id=user_id, status="pending") # Default status
+        db_obj = self.model(**obj_in_data, user_id=user_id, status="pending", sample_rate=sample_rate) # Default status
         db.add(db_obj)
         await db.commit()
         await db.refresh(db_obj)
@@ -35,6 +36,39 @@ class CRUDRun(CRUDBase[Run, RunCreate, RunUpdate]):
         )
         return result.scalars().all()
 
+    async def get_page_by_sequence_and_user(
+        self, db: AsyncSession, *, sequence_id: int, user_id: int, cursor: Optional[str] = None, limit: int = 20
+    ) -> Tuple[List[Run], Optional[str]]:
+        """
+        Keyset-paginated run history, most recent first, ordered by (started_at DESC NULLS LAST, id DESC).
+        Returns (runs, next_cursor); next_cursor is None on the last page.
+        """
+        query = (
+            select(self.model)
+            .filter(and_(Run.sequence_id == sequence_id, Run.user_id == user_id))
+            .options(selectinload(Run.block_runs).options(joinedload(BlockRun.block)))
+            .order_by(Run.started_at.desc().nullslast(), Run.id.desc())
+        )
+        if cursor:
+            last_started_at, last_id = decode_cursor(cursor, (str, type(None)), int)
+            if last_started_at is None:
+                # Already inside the trailing block of never-started runs
+                query = query.filter(and_(Run.started_at.is_(None), Run.id < last_id))
+            else:
+                last_started_at = datetime.fromisoformat(last_started_at)
+                query = query.filter(or_(
+                    Run.started_at < last_started_at,
+                    and_(Run.started_at == last_started_at, Run.id < last_id),
+                    Run.started_at.is_(None),
+                ))
+        result = await db.execute(query.limit(limit + 1)) # One extra row tells us whether there is a next page
+        runs = result.scalars().all()
+        next_cursor = None
+        if len(runs) > limit:
+            last = runs[limit - 1]
+            next_cursor = encode_cursor(last.started_at.isoformat() if last.started_at else None, last.id)
+        return runs[:limit], next_cursor
+
     async def get_by_id_and_user(
         self, db: AsyncSession, *, id: int, user_id: int
     ) -> Optional[Run]:
@@ -45,6 +79,87 @@ class CRUDRun(CRUDBase[Run, RunCreate, RunUpdate]):
         )
         return result.scalars().first()
 
+    async def request_cancel(self, db: AsyncSession, *, db_obj: Run) -> Run:
+        """
+        Records a cancel request. A run that hasn't started yet is cancelled outright;
+        an executing run is stopped by its engine, which sets the final status.
+        """
+        now = datetime.now(timezone.utc)
+        db_obj.cancel_requested_at = db_obj.cancel_requested_at or now
+        if db_obj.status == RunStatusEnum.PENDING:
+            db_obj.status = RunStatusEnum.CANCELLED
+            db_obj.completed_at = now
+        db.add(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
+        return db_obj
+
+    async def mark_failed(self, db: AsyncSession, *, id: int, error: str, details: Optional[str] = None) -> Optional[Run]:
+        """Marks a run FAILED after an error outside the engine's own handling (no-op if already failed)."""
+        db_obj = await self.get(db, id=id)
+        if db_obj and db_obj.status != RunStatusEnum.FAILED:
+            db_obj.status = RunStatusEnum.FAILED
+            db_obj.completed_at = datetime.now(timezone.utc)
+            db_obj.results_summary_json = {"error": error, "details": details}
+            db.add(db_obj)
+            await db.commit()
+        return db_obj
+
+    async def is_cancel_requested(self, db: AsyncSession, *, id: int) -> bool:
+        result = await db.execute(select(Run.cancel_requested_at).filter(Run.id == id))
+        return result.scalar_one_or_none() is not None
+
+    async def get_ids_to_archive(
+        self, db: AsyncSession, *, statuses: Sequence[RunStatusEnum], completed_before: Optional[datetime] = None,
+        keep_last: int = 0, limit: int = 100
+    ) -> List[int]:
+        """
+        Runs not archived yet, in one of `statuses`, that finished before `completed_before` or aren't among
+        the `keep_last` most recent runs of their sequence. Either criterion is off when unset/0.
+        """
+        criteria = []
+        if completed_before is not None:
+            criteria.append(Run.completed_at < completed_before)
+        if keep_last > 0:
+            recency = func.row_number().over(
+                partition_by=Run.sequence_id, order_by=(Run.started_at.desc().nullslast(), Run.id.desc())
+            ).label("recency")
+            ranked = select(Run.id, recency).subquery()
+            criteria.append(Run.id.in_(select(ranked.c.id).filter(ranked.c.recency > keep_last)))
+        if not criteria:
+            return []
+        result = await db.execute(
+            select(Run.id)
+            .filter(Run.archived_at.is_(None), Run.status.in_(statuses), or_(*criteria))
+            .order_by(Run.id)
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+
+    async def get_many_with_block_runs(self, db: AsyncSession, *, ids: Sequence[int]) -> List[Run]:
+        result = await db.execute(
+            select(Run)
+            .filter(Run.id.in_(ids))
+            .options(selectinload(Run.block_runs).options(joinedload(BlockRun.block)))
+            .order_by(Run.id)
+        )
+        return result.scalars().all()
+
+    async def mark_archived(
+        self, db: AsyncSession, *, run_id: int, archived_at: datetime, path: str, offset: int, length: int, etag: str
+    ) -> None:
+        """Turns a run into its archive stub: drops its block runs, cached response and results summary (the caller commits)."""
+        await db.execute(delete(BlockRun).where(BlockRun.run_id == run_id))
+        await db.execute(delete(MaterializedRun).where(MaterializedRun.run_id == run_id))
+        await db.execute(
+            update(Run)
+            .where(and_(Run.id == run_id, Run.archived_at.is_(None)))
+            .values(
+                archived_at=archived_at, archive_path=path, archive_offset=offset, archive_length=length,
+                archive_etag=etag, results_summary_json=None,
+            )
+        )
+
     # --- BlockRun specific methods ---
     async def create_block_run(self, db: AsyncSession, *, obj_in: BlockRunCreate) -> BlockRun:
         # Pydantic V2
@@ -0,0 +1,96 @@
+from typing import Optional
+from datetime import datetime, timedelta, timezone
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import and_, delete, or_, update
+
+from app.crud.base import CRUDBase
+from app.models.run import QueuedRun
+
+class CRUDRunQueue(CRUDBase[QueuedRun, BaseModel, BaseModel]):
+    """
+    Durable run queue. Workers claim a row by taking its lease; while executing they renew it
+    (heartbeat). A row whose lease has expired belongs to a dead worker and is claimable again.
+    Timestamps come from the workers' clocks, so leases should be much longer than expected skew.
+    """
+
+    def _claimable(self, now: datetime):
+        return or_(QueuedRun.lease_expires_at.is_(None), QueuedRun.lease_expires_at < now)
+
+    async def enqueue(
+        self, db: AsyncSession, *, run_id: int, priority: int = 0, deadline: Optional[datetime] = None
+    ) -> QueuedRun:
+        db_obj = QueuedRun(run_id=run_id, enqueued_at=datetime.now(timezone.utc), attempts=0, priority=priority, deadline=deadline)
+        db.add(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
+        return db_obj
+
+    async def claim(self, db: AsyncSession, *, worker_id: str, lease_seconds: float) -> Optional[QueuedRun]:
+        """
+        Atomically leases the next claimable run to `worker_id` and commits, or returns None.
+        Postgres: SELECT ... FOR UPDATE SKIP LOCKED, so concurrent workers never contend for a row.
+        SQLite (no row locks): compare-and-set UPDATE on the lease; writers are serialized, so
+        exactly one worker's update matches, and a loser simply tries the next candidate.
+        """
+        now = datetime.now(timezone.utc)
+        order = (QueuedRun.priority.desc(), QueuedRun.deadline.asc().nullslast(), QueuedRun.enqueued_at.asc(), QueuedRun.id.asc())
+        lease = dict(lease_owner=worker_id, lease_expires_at=now + timedelta(seconds=lease_seconds), heartbeat_at=now)
+
+        if db.get_bind().dialect.name == "postgresql":
+            result = await db.execute(
+                select(QueuedRun).filter(self._claimable(now)).order_by(*order).limit(1).with_for_update(skip_locked=True)
+            )
+            entry = result.scalars().first()
+            if entry is None:
+                await db.rollback()
+                return None
+            for key, value in lease.items():
+                setattr(entry, key, value)
+            entry.attempts += 1
+            await db.commit()
+            return entry
+
+        for _ in range(5): # Only lost races retry; each retry sees the winner's lease
+            result = await db.execute(select(QueuedRun.id).filter(self._claimable(now)).order_by(*order).limit(1))
+            entry_id = result.scalar_one_or_none()
+            if entry_id is None:
+                await db.rollback()
+                return None
+            claimed = await db.execute(
+                update(QueuedRun)
+                .where(and_(QueuedRun.id == entry_id, self._claimable(now)))
+                .values(**lease, attempts=QueuedRun.attempts + 1)
+            )
+            await db.commit()
+            if claimed.rowcount == 1:
+                return await self.get(db, id=entry_id)
+        return None
+
+    async def renew_lease(self, db: AsyncSession, *, id: int, worker_id: str, lease_seconds: float) -> bool:
+        """Heartbeat. False means the lease was lost (expired and taken by another worker, or the row is gone)."""
+        now = datetime.now(timezone.utc)
+        result = await db.execute(
+            update(QueuedRun)
+            .where(and_(QueuedRun.id == id, QueuedRun.lease_owner == worker_id))
+            .values(lease_expires_at=now + timedelta(seconds=lease_seconds), heartbeat_at=now)
+        )
+        await db.commit()
+        return result.rowcount == 1
+
+    async def complete(self, db: AsyncSession, *, id: int, worker_id: str) -> None:
+        """Removes a finished run from the queue (only if this worker still holds it)."""
+        await db.execute(delete(QueuedRun).where(and_(QueuedRun.id == id, QueuedRun.lease_owner == worker_id)))
+        await db.commit()
+
+    async def release(self, db: AsyncSession, *, id: int, worker_id: str) -> None:
+        """Gives an unstarted run back to the queue without counting the attempt (worker stopping right after claiming it)."""
+        await db.execute(
+            update(QueuedRun)
+            .where(and_(QueuedRun.id == id, QueuedRun.lease_owner == worker_id))
+            .values(lease_owner=None, lease_expires_at=None, attempts=QueuedRun.attempts - 1)
+        )
+        await db.commit()
+
+run_queue = CRUDRunQueue(QueuedRun)
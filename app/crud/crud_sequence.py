@@ -2,9 +2,10 @@ from typing import List, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
+from sqlalchemy import update
 
 from app.crud.base import CRUDBase
-from app.models.sequence import Sequence
+from app.models.sequence import Sequence, new_version_stamp
 from app.schemas.sequence import SequenceCreate, SequenceUpdate
 
 class CRUDSequence(CRUDBase[Sequence, SequenceCreate, SequenceUpdate]):
@@ -43,4 +44,30 @@ class CRUDSequence(CRUDBase[Sequence, SequenceCreate, SequenceUpdate]):
         )
         return result.scalars().first()
 
+    async def get_version(self, db: AsyncSession, *, id: int) -> Optional[str]:
+        """Current plan version stamp of a sequence (single-column query), or None if it doesn't exist."""
+        result = await db.execute(select(Sequence.version).filter(Sequence.id == id))
+        return result.scalar_one_or_none()
+
+    async def get_version_for_owner(self, db: AsyncSession, *, id: int, user_id: int) -> Optional[str]:
+        """Version stamp of a sequence the user owns (doubles as a lightweight ownership check), else None."""
+        result = await db.execute(select(Sequence.version).filter(Sequence.id == id, Sequence.user_id == user_id))
+        return result.scalar_one_or_none()
+
+    async def get_llm_config(self, db: AsyncSession, *, id: int) -> Optional[dict]:
+        result = await db.execute(select(Sequence.llm_config_json).filter(Sequence.id == id))
+        return result.scalar_one_or_none()
+
+    async def bump_version(self, db: AsyncSession, *, sequence_id: int) -> None:
+        """
+        Invalidates cached plans for the sequence. Does not commit: call it inside the
+        transaction that mutates the sequence's blocks or variables.
+        """
+        await db.execute(
+            update(Sequence)
+            .where(Sequence.id == sequence_id)
+            .values(version=new_version_stamp())
+            .execution_options(synchronize_session=False)
+        )
+
 sequence = CRUDSequence(Sequence)
@@ -1,6 +1,7 @@
 from typing import Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy import update
 
 from app.crud.base import CRUDBase
 from app.models.user import User
@@ -48,4 +49,13 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
             return None
         return user
 
+    async def bump_global_lists_version(self, db: AsyncSession, *, user_id: int) -> None:
+        """Invalidates cached variable catalogs that include the user's global lists. Does not commit."""
+        await db.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(global_lists_version=User.global_lists_version + 1)
+            .execution_options(synchronize_session=False)
+        )
+
 user = CRUDUser(User)
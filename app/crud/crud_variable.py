@@ -1,16 +1,38 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Union
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy import and_
 
 from app.crud.base import CRUDBase
+from app.crud.crud_sequence import sequence as crud_sequence
 from app.models.variable import Variable
 from app.schemas.variable import VariableCreate, VariableUpdate
 
 class CRUDVariable(CRUDBase[Variable, VariableCreate, VariableUpdate]):
+    # Every write bumps the parent sequence's version in the same transaction so cached plans are invalidated
+
+    async def create(self, db: AsyncSession, *, obj_in: VariableCreate) -> Variable:
+        await crud_sequence.bump_version(db, sequence_id=obj_in.sequence_id)
+        return await super().create(db, obj_in=obj_in)
+
+    async def update(
+        self, db: AsyncSession, *, db_obj: Variable, obj_in: Union[VariableUpdate, Dict[str, Any]]
+    ) -> Variable:
+        await crud_sequence.bump_version(db, sequence_id=db_obj.sequence_id)
+        return await super().update(db, db_obj=db_obj, obj_in=obj_in)
+
+    async def remove(self, db: AsyncSession, *, id: int) -> Optional[Variable]:
+        db_obj = await self.get(db, id=id)
+        if db_obj:
+            await crud_sequence.bump_version(db, sequence_id=db_obj.sequence_id)
+            await db.delete(db_obj)
+            await db.commit()
+        return db_obj
+
     async def create_with_sequence( # Renamed for clarity
         self, db: AsyncSession, *, obj_in: VariableCreate # sequence_id is in VariableCreate
     ) -> Variable:
+        await crud_sequence.bump_version(db, sequence_id=obj_in.sequence_id)
         # Pydantic V2
         obj_in_data = obj_in.model_dump()
         # Pydantic V1
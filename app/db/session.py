@@ -1,6 +1,7 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.core.metrics import instrument_engine
 
 # Ensure the DATABASE_URL is suitable for asyncpg or aiosqlite
 engine = create_async_engine(
@@ -8,6 +9,7 @@ engine = create_async_engine(
     pool_pre_ping=True,
     # echo=True, # Uncomment for debugging SQL queries
 )
+instrument_engine(engine.sync_engine) # Query latency/count metrics per route
 
 AsyncSessionLocal = sessionmaker(
     autocommit=False,
@@ -1,9 +1,12 @@
-from fastapi import FastAPI
+from fastapi import APIRouter, Depends, FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.routing import APIRoute
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 import logging
 
 from app.core.config import settings
+from app.core import metrics, tracing
+from app.core.serialization import FastJSONResponse
 from app.api.routes import (
     auth, sequences, blocks, variables, runs, engine, global_lists
 )
@@ -11,7 +14,11 @@ from app.api.routes import (
 # from app.db import models # This line can help if Alembic has issues finding models
 
 # Setup logging
-logging.basicConfig(level=logging.INFO) # Adjust level as needed (DEBUG, INFO, WARNING, ERROR)
+tracing.install_log_context() # Stamps trace_id/span_id on every record
+logging.basicConfig(
+    level=logging.INFO, # Adjust level as needed (DEBUG, INFO, WARNING, ERROR)
+    format="%(levelname)s:%(name)s:[trace=%(trace_id)s span=%(span_id)s] %(message)s",
+)
 logger = logging.getLogger(__name__)
 
 
@@ -29,6 +36,7 @@ app = FastAPI(
     title=settings.PROJECT_NAME,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     version="0.1.0", # Add a version
+    default_response_class=FastJSONResponse, # orjson-backed when installed
     # route_class=KebabCaseAPIRoute # Uncomment to use custom operation_ids
 )
 
@@ -40,13 +48,17 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_credentials=True,
         allow_methods=["*"], # Allows all methods
         allow_headers=["*"], # Allows all headers
+        expose_headers=["ETag"], # Lets the frontend read ETags for conditional requests
     )
 else:
     logger.warning("CORS origins not configured. API might not be accessible from frontend.")
 
 
 # API Routers
-api_router_v1 = APIRoute(prefix=settings.API_V1_STR) # Use APIRoute for prefixing
+api_router_v1 = APIRouter(
+    prefix=settings.API_V1_STR,
+    dependencies=[Depends(metrics.track_route)], # Labels DB query metrics with the matched route
+)
 
 api_router_v1.include_router(auth.router, prefix="/auth", tags=["Authentication"])
 api_router_v1.include_router(sequences.router, prefix="/sequences", tags=["Sequences"])
@@ -64,6 +76,11 @@ def healthcheck():
     """Basic health check endpoint."""
     return {"status": "ok", "project_name": settings.PROJECT_NAME}
 
+@app.get("/metrics", tags=["Health"], include_in_schema=False)
+def prometheus_metrics():
+    """Prometheus scrape endpoint."""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 # Optional: Add startup event for DB connection test or other init tasks
 # @app.on_event("startup")
 # async def startup_event():
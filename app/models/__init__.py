@@ -7,7 +7,7 @@ from .user import User
 from .sequence import Sequence
 from .block import Block, BlockTypeEnum
 from .variable import Variable, VariableTypeEnum
-from .run import Run, BlockRun, RunStatusEnum
+from .run import Run, BlockRun, RunStatusEnum, QueuedRun, MaterializedRun
 from .global_list import GlobalList, GlobalListItem
 
 # You can also define __all__ if you want to control what `from app.models import *` imports
@@ -21,6 +21,8 @@ __all__ = [
     "Run",
     "BlockRun",
     "RunStatusEnum",
+    "QueuedRun",
+    "MaterializedRun",
     "GlobalList",
     "GlobalListItem",
     "Base" # from app.db.base
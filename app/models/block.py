@@ -9,6 +9,7 @@ class BlockTypeEnum(str, enum.Enum):
     DISCRETIZATION = "discretization"
     SINGLE_LIST = "single_list"
     MULTI_LIST = "multi_list"
+    MAP_REDUCE = "map_reduce"
 
 class Block(Base):
     # 'id' is inherited from Base
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, UniqueConstraint
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 
@@ -19,3 +19,5 @@ class GlobalListItem(Base):
     global_list_id = Column(Integer, ForeignKey("globallists.id"), nullable=False)
 
     global_list = relationship("GlobalList", back_populates="items")
+    # Supports keyset pagination of items: (order, id) within a list
+    __table_args__ = (Index('ix_globallistitems_list_order_id', 'global_list_id', 'order', 'id'),)
@@ -1,5 +1,5 @@
 import enum
-from sqlalchemy import Column, Integer, ForeignKey, JSON, DateTime, Text, Enum as SQLAlchemyEnum, Float
+from sqlalchemy import Column, Integer, String, ForeignKey, JSON, DateTime, Text, Enum as SQLAlchemyEnum, Float, Index, LargeBinary, BigInteger
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.base import Base
@@ -21,10 +21,30 @@ class Run(Base):
     completed_at = Column(DateTime(timezone=True), nullable=True)
     input_overrides_json = Column(JSON, nullable=True) # Store any runtime inputs used for this run
     results_summary_json = Column(JSON, nullable=True) # Optional: store final outputs or overall summary
+    token_budget = Column(Integer, nullable=True) # Stop starting LLM calls once this many tokens are used
+    cost_budget = Column(Float, nullable=True) # Same, in USD
+    token_usage_json = Column(JSON, nullable=True) # Run-wide totals, e.g. {'input_tokens': X, 'output_tokens': Y, 'calls': N}
+    cost = Column(Float, nullable=True) # Total cost of the run
+    cancel_requested_at = Column(DateTime(timezone=True), nullable=True) # Set by POST /runs/{id}/cancel; polled by the executing worker
+    priority = Column(Integer, nullable=False, default=0, server_default="0") # Higher runs sooner and gets a larger LLM share
+    deadline = Column(DateTime(timezone=True), nullable=True) # Run is stopped (FAILED) if still executing at this time
+    deadline_policy = Column(String, nullable=False, default="reject", server_default="reject") # "reject" or "sample" when the estimate misses the deadline
+    sample_rate = Column(Float, nullable=True) # Fraction of list items (matrix rows) executed; null = all
+    # Set when the run was moved to cold storage (services/run_archive): its RunRead body is the compressed frame
+    # at archive_offset/archive_length of archive_path, and its block runs and results summary are gone from the DB
+    archived_at = Column(DateTime(timezone=True), nullable=True)
+    archive_path = Column(String, nullable=True) # File name within RUN_ARCHIVE_DIR
+    archive_offset = Column(BigInteger, nullable=True)
+    archive_length = Column(Integer, nullable=True)
+    archive_etag = Column(String, nullable=True) # Strong ETag of the archived body
 
     sequence = relationship("Sequence", back_populates="runs")
     owner = relationship("User") # Relationship to User
     block_runs = relationship("BlockRun", back_populates="run", cascade="all, delete-orphan", order_by="BlockRun.started_at")
+    queue_entry = relationship("QueuedRun", back_populates="run", uselist=False, cascade="all, delete-orphan")
+    materialized = relationship("MaterializedRun", back_populates="run", uselist=False, cascade="all, delete-orphan") # Cached response dies with the run
+    # Supports keyset pagination of run history: (started_at, id) within a sequence/user
+    __table_args__ = (Index('ix_runs_sequence_user_started_id', 'sequence_id', 'user_id', 'started_at', 'id'),)
 
 class BlockRun(Base):
     # 'id' is inherited from Base
@@ -46,8 +66,30 @@ class BlockRun(Base):
     started_at = Column(DateTime(timezone=True), server_default=func.now())
     completed_at = Column(DateTime(timezone=True), nullable=True)
     
-    token_usage_json = Column(JSON, nullable=True) # e.g., {'prompt_tokens': X, 'completion_tokens': Y}
+    token_usage_json = Column(JSON, nullable=True) # e.g., {'input_tokens': X, 'output_tokens': Y, 'calls': N, 'items': [...]}
     cost = Column(Float, nullable=True) # Cost of this specific block run
 
     run = relationship("Run", back_populates="block_runs")
     block = relationship("Block") # Relationship to the Block model (can be null if block deleted)
+
+class QueuedRun(Base): # Durable run queue consumed by app.worker; a row exists while its run awaits or holds a worker
+    run_id = Column(Integer, ForeignKey("runs.id", ondelete="CASCADE"), nullable=False, unique=True)
+    enqueued_at = Column(DateTime(timezone=True), nullable=False)
+    attempts = Column(Integer, nullable=False, default=0) # Claims so far; a run whose workers keep dying is failed after RUN_QUEUE_MAX_ATTEMPTS
+    lease_owner = Column(String, nullable=True) # Worker id holding the run, null while waiting
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True) # Claimable again once this passes (worker died)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    priority = Column(Integer, nullable=False, default=0) # Copied from the run so claims don't need a join
+    deadline = Column(DateTime(timezone=True), nullable=True)
+
+    run = relationship("Run", back_populates="queue_entry")
+    # Claim order: priority (high first), then earliest deadline, then first come, first served
+    __table_args__ = (Index('ix_queued_runs_claim_order', 'priority', 'deadline', 'enqueued_at', 'id'),)
+
+class MaterializedRun(Base): # Pre-serialized RunRead body of a run in a terminal status, written once when it finishes
+    run_id = Column(Integer, ForeignKey("runs.id", ondelete="CASCADE"), nullable=False, unique=True)
+    etag = Column(String, nullable=False) # Strong ETag: digest of body
+    body = Column(LargeBinary, nullable=False) # UTF-8 JSON, served as-is by GET /runs/{id}
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    run = relationship("Run", back_populates="materialized")
@@ -1,8 +1,12 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime
+import uuid
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, JSON
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.base import Base
 
+def new_version_stamp() -> str:
+    return uuid.uuid4().hex
+
 class Sequence(Base):
     # 'id' is inherited from Base
     name = Column(String, index=True, nullable=False)
@@ -10,6 +14,11 @@ class Sequence(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False) # Ensure tablename 'users'
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
+    # Random stamp rewritten on every block/variable mutation; keys cached execution plans (see services/sequence_plan.py).
+    # Globally unique rather than a counter: a deleted sequence's id can be reused, and must not find its cached plan
+    version = Column(String(32), nullable=False, default=new_version_stamp)
+    # Sequence-wide LLM defaults, overridable per block: {"model": ..., "max_tokens": ..., "fallback_models": [...]}
+    llm_config_json = Column(JSON, nullable=True)
 
     owner = relationship("User", back_populates="sequences")
     blocks = relationship("Block", back_populates="sequence", cascade="all, delete-orphan", order_by="Block.order")
@@ -7,6 +7,8 @@ class User(Base):
     email = Column(String, unique=True, index=True, nullable=False)
     hashed_password = Column(String, nullable=False)
     is_active = Column(Boolean, default=True)
+    # Bumped when any of the user's global lists is created, renamed or deleted; part of the variable catalog ETag
+    global_lists_version = Column(Integer, nullable=False, default=0, server_default="0")
 
     sequences = relationship("Sequence", back_populates="owner", cascade="all, delete-orphan")
     global_lists = relationship("GlobalList", back_populates="owner", cascade="all, delete-orphan")
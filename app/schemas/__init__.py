@@ -1,25 +1,27 @@
 from .token import Token, TokenPayload
 from .user import UserCreate, UserRead, UserUpdate, UserInDBBase
-from .sequence import SequenceCreate, SequenceRead, SequenceUpdate
+from .sequence import SequenceCreate, SequenceRead, SequenceUpdate, SequenceImportResult
 from .block import (
     BlockCreate, BlockRead, BlockUpdate,
     BlockConfigBase, BlockConfigStandard, BlockConfigDiscretization,
-    BlockConfigSingleList, BlockConfigMultiList
+    BlockConfigSingleList, BlockConfigMultiList, BlockConfigMapReduce,
+    BlockBatchCreate, BlockBatchUpdate, BlockBatchRequest
 )
 from .variable import VariableCreate, VariableRead, VariableUpdate, AvailableVariable
-from .run import RunCreate, RunRead, RunUpdate, BlockRunCreate, BlockRunRead, BlockRunReadWithDetails
-from .global_list import GlobalListCreate, GlobalListRead, GlobalListUpdate, GlobalListItemCreate, GlobalListItemRead
+from .run import RunCreate, RunRead, RunUpdate, RunPage, BlockRunCreate, BlockRunRead, BlockRunReadWithDetails
+from .global_list import GlobalListCreate, GlobalListRead, GlobalListUpdate, GlobalListItemCreate, GlobalListItemRead, GlobalListItemPage, GlobalListImportResult
 from .msg import Msg
 
 __all__ = [
     "Token", "TokenPayload",
     "UserCreate", "UserRead", "UserUpdate", "UserInDBBase",
-    "SequenceCreate", "SequenceRead", "SequenceUpdate",
+    "SequenceCreate", "SequenceRead", "SequenceUpdate", "SequenceImportResult",
     "BlockCreate", "BlockRead", "BlockUpdate",
     "BlockConfigBase", "BlockConfigStandard", "BlockConfigDiscretization",
-    "BlockConfigSingleList", "BlockConfigMultiList",
+    "BlockConfigSingleList", "BlockConfigMultiList", "BlockConfigMapReduce",
+    "BlockBatchCreate", "BlockBatchUpdate", "BlockBatchRequest",
     "VariableCreate", "VariableRead", "VariableUpdate", "AvailableVariable",
-    "RunCreate", "RunRead", "RunUpdate", "BlockRunCreate", "BlockRunRead", "BlockRunReadWithDetails",
-    "GlobalListCreate", "GlobalListRead", "GlobalListUpdate", "GlobalListItemCreate", "GlobalListItemRead",
+    "RunCreate", "RunRead", "RunUpdate", "RunPage", "BlockRunCreate", "BlockRunRead", "BlockRunReadWithDetails",
+    "GlobalListCreate", "GlobalListRead", "GlobalListUpdate", "GlobalListItemCreate", "GlobalListItemRead", "GlobalListItemPage", "GlobalListImportResult",
     "Msg",
 ]
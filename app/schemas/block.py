@@ -6,7 +6,15 @@ from app.models.block import BlockTypeEnum # Import Enum from models
 # --- Block Config Schemas ---
 # These define the expected structure of `config_json` for each block type
 
-class BlockConfigBase(BaseModel):
+class LLMSettings(BaseModel):
+    # Unset fields fall back to the sequence's llm_config_json, then to the server defaults
+    model: Optional[str] = Field(default=None, description="Model for this block's LLM calls.")
+    max_tokens: Optional[int] = Field(default=None, ge=1, le=64000, description="Response token limit per call.")
+    fallback_models: Optional[List[str]] = Field(
+        default=None, description="Tried in order when the model is overloaded or slower than LLM_FAILOVER_AFTER_SECONDS.",
+    )
+
+class BlockConfigBase(LLMSettings):
     prompt: Optional[str] = None # Common to most blocks
 
 class BlockConfigStandard(BlockConfigBase):
@@ -20,6 +28,8 @@ class BlockConfigSingleList(BlockConfigBase):
     prompt: str = Field(..., description="Prompt template to be applied to each item in the input list. Use '{{item}}' for the current list item.")
     input_list_variable_name: str = Field(..., description="Name of the global list or variable (which should be a list) to iterate over.")
     output_list_variable_name: Optional[str] = Field(default=None, description="Name for the new list variable containing results. Auto-generated if None.")
+    pack_items: bool = Field(default=False, description="Send several items per LLM call (numbered, JSON array response). For short items with short outputs.")
+    pack_max_items: int = Field(default=20, ge=2, le=100, description="Most items per packed call; fewer when the items or outputs don't fit the token budget.")
 
 class BlockConfigMultiListInput(BaseModel):
     name: str = Field(..., description="Name of the global list or variable (which should be a list).")
@@ -31,6 +41,15 @@ class BlockConfigMultiList(BlockConfigBase):
     input_lists_config: List[BlockConfigMultiListInput] = Field(..., min_length=1, description="Configuration for input lists, including names and priorities.")
     output_matrix_variable_name: Optional[str] = Field(default=None, description="Name for the new matrix (list of lists) variable. Auto-generated if None.")
 
+class BlockConfigMapReduce(BlockConfigBase):
+    prompt: str = Field(..., description="Map prompt applied to each chunk. Use '{{chunk}}', '{{chunk_index}}' and '{{chunk_count}}'.")
+    reduce_prompt: str = Field(..., description="Combines a group of map or earlier reduce results, given as the list '{{partials}}' ('{{reduce_level}}' counts from 1).")
+    input_variable_name: str = Field(..., description="Name of the variable holding the long text (a list is joined line by line).")
+    output_variable_name: Optional[str] = Field(default=None, description="Name of the variable to store the final reduced output. Auto-generated if None.")
+    chunk_tokens: int = Field(default=2000, ge=100, le=100000, description="Largest chunk, in estimated tokens (overlap included).")
+    chunk_overlap_tokens: int = Field(default=200, ge=0, description="Trailing text of each chunk repeated at the start of the next; at most half of chunk_tokens.")
+    reduce_fan_in: int = Field(default=8, ge=2, le=50, description="Most results combined per reduce call; fewer when they don't fit the context window.")
+
 
 # --- Main Block Schemas ---
 class BlockBase(BaseModel):
@@ -38,7 +57,7 @@ class BlockBase(BaseModel):
     type: BlockTypeEnum
     order: int = Field(default=0, ge=0)
     # config_json will hold one of the BlockConfig... models as a dict
-    config_json: Union[BlockConfigStandard, BlockConfigDiscretization, BlockConfigSingleList, BlockConfigMultiList, Dict[str, Any]]
+    config_json: Union[BlockConfigStandard, BlockConfigDiscretization, BlockConfigSingleList, BlockConfigMultiList, BlockConfigMapReduce, Dict[str, Any]]
 
     @field_validator('config_json', mode='before')
     @classmethod
@@ -56,6 +75,8 @@ class BlockBase(BaseModel):
             return BlockConfigSingleList(**v if isinstance(v, dict) else {}).model_dump()
         elif block_type == BlockTypeEnum.MULTI_LIST:
             return BlockConfigMultiList(**v if isinstance(v, dict) else {}).model_dump()
+        elif block_type == BlockTypeEnum.MAP_REDUCE:
+            return BlockConfigMapReduce(**v if isinstance(v, dict) else {}).model_dump()
         return v if isinstance(v, dict) else {}
 
 
@@ -66,7 +87,7 @@ class BlockUpdate(BaseModel): # For PATCH, all fields are optional
     name: Optional[str] = Field(default=None, min_length=1)
     # type: Optional[BlockTypeEnum] = None # Type change might be complex, usually not allowed or handled carefully
     order: Optional[int] = Field(default=None, ge=0)
-    config_json: Optional[Union[BlockConfigStandard, BlockConfigDiscretization, BlockConfigSingleList, BlockConfigMultiList, Dict[str, Any]]] = None
+    config_json: Optional[Union[BlockConfigStandard, BlockConfigDiscretization, BlockConfigSingleList, BlockConfigMultiList, BlockConfigMapReduce, Dict[str, Any]]] = None
 
     @field_validator('config_json', mode='before')
     @classmethod
@@ -86,3 +107,22 @@ class BlockRead(BlockBase):
     updated_at: Optional[datetime] = None
     class Config:
         from_attributes = True
+
+
+# --- Batch Schemas ---
+# Applied atomically to one sequence by POST /blocks/in_sequence/{sequence_id}/batch
+
+class BlockBatchCreate(BlockBase):
+    client_ref: Optional[str] = Field(default=None, description="Caller-chosen reference so new blocks can be placed via `order`.")
+
+class BlockBatchUpdate(BlockUpdate):
+    id: int
+
+class BlockBatchRequest(BaseModel):
+    creates: List[BlockBatchCreate] = []
+    updates: List[BlockBatchUpdate] = []
+    deletes: List[int] = []
+    order: Optional[List[Union[int, str]]] = Field(
+        default=None,
+        description="Final block order: every remaining block id and created client_ref exactly once. Orders are reassigned 0..N-1.",
+    )
@@ -15,6 +15,17 @@ class GlobalListItemRead(GlobalListItemBase):
     class Config:
         from_attributes = True
 
+class GlobalListItemPage(BaseModel): # Keyset-paginated list items
+    items: List[GlobalListItemRead] = []
+    next_cursor: Optional[str] = Field(default=None, description="Opaque cursor for the next page; null on the last page.")
+
+class GlobalListImportResult(BaseModel): # Result of a bulk item import
+    global_list_id: int
+    mode: str
+    format: str
+    imported_count: int
+    total_count: int
+
 # --- Global List Schemas ---
 class GlobalListBase(BaseModel):
     name: str = Field(..., min_length=1)
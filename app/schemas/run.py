@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
 from datetime import datetime
 from app.models.run import RunStatusEnum
 from .block import BlockRead # For block snapshot
@@ -7,6 +7,14 @@ from .block import BlockRead # For block snapshot
 class RunBase(BaseModel):
     sequence_id: int
     input_overrides_json: Optional[Dict[str, Any]] = Field(default=None, description="Runtime input values overriding sequence defaults.")
+    token_budget: Optional[int] = Field(default=None, ge=1, description="Stop starting new LLM calls once the run has used this many tokens.")
+    cost_budget: Optional[float] = Field(default=None, gt=0, description="Stop starting new LLM calls once the run has cost this much (USD).")
+    priority: int = Field(default=0, ge=-10, le=10, description="Higher priority runs are dequeued first and get a larger share of LLM capacity.")
+    deadline: Optional[datetime] = Field(default=None, description="The run is stopped if it is still executing at this time.")
+    deadline_policy: Literal["reject", "sample"] = Field(
+        default="reject",
+        description="If the run is estimated to miss its deadline: reject it, or run an evenly spaced sample of list items (matrix rows) that fits. Runs whose duration can't be estimated (map-reduce blocks) are rejected.",
+    )
 
 class RunCreate(RunBase):
     pass # Status will be set by backend
@@ -26,7 +34,7 @@ class BlockRunBase(BaseModel):
     list_outputs_json: Optional[Dict[str, Any]] = None # e.g. {"values": [...]}
     matrix_outputs_json: Optional[Dict[str, Any]] = None # e.g. {"values": [[...],[...]]}
     error_message: Optional[str] = None
-    token_usage_json: Optional[Dict[str, int]] = None # e.g. {"prompt_tokens": X, "completion_tokens": Y}
+    token_usage_json: Optional[Dict[str, Any]] = None # e.g. {"input_tokens": X, "output_tokens": Y, "calls": N, "items": [...]}
     cost: Optional[float] = None
 
 class BlockRunCreate(BlockRunBase):
@@ -54,6 +62,15 @@ class RunRead(RunBase):
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
     results_summary_json: Optional[Dict[str, Any]] = None
+    token_usage_json: Optional[Dict[str, Any]] = None
+    cost: Optional[float] = None
+    cancel_requested_at: Optional[datetime] = None
+    sample_rate: Optional[float] = None # Set when deadline_policy "sample" had to thin the lists
+    archived_at: Optional[datetime] = None # Archived runs list without block runs; GET /runs/{id} returns them in full
     block_runs: List[BlockRunRead] = [] # Include block runs when reading a run
     class Config:
         from_attributes = True
+
+class RunPage(BaseModel): # Keyset-paginated run history
+    items: List[RunRead] = []
+    next_cursor: Optional[str] = Field(default=None, description="Opaque cursor for the next page; null on the last page.")
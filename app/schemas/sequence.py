@@ -1,12 +1,13 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
-from .block import BlockRead # Import related schemas
+from .block import BlockRead, LLMSettings # Import related schemas
 from .variable import VariableRead
 
 class SequenceBase(BaseModel):
     name: str
     description: Optional[str] = None
+    llm_config_json: Optional[LLMSettings] = None # Defaults for blocks that don't set their own
 
 class SequenceCreate(SequenceBase):
     pass
@@ -24,3 +25,9 @@ class SequenceRead(SequenceBase):
     variables: List[VariableRead] = []
     class Config:
         from_attributes = True
+
+class SequenceImportResult(BaseModel):
+    sequence_id: int
+    name: str
+    counts: Dict[str, int] # Records imported by type: variables, blocks, global_lists, global_list_items, runs, block_runs
+    skipped_block_runs: int = 0 # Block runs of blocks that were deleted before the export
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, Any, List, Literal
+from typing import Optional, Any, Dict, List, Literal
 from app.models.variable import VariableTypeEnum
 
 class VariableBase(BaseModel):
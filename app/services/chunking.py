@@ -0,0 +1,91 @@
+# Token-bounded text chunking for MAP_REDUCE blocks.
+# Text is split into sentences (paragraph breaks always end one) that are packed into chunks of at
+# most `chunk_tokens` estimated tokens. Each chunk after the first starts with the trailing sentences
+# of the previous one, up to `overlap_tokens`, so statements that straddle a boundary are seen whole.
+# A sentence longer than a chunk is split on whitespace. Reduce steps combine results in groups
+# bounded by the block's fan-in and by the tokens left in the context window.
+import json
+import re
+from typing import Any, List
+
+from app.services.token_estimate import estimate_tokens
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n\s*\n\s*")
+_PARTIAL_OVERHEAD_TOKENS = 4 # Separator or list syntax around each result in a reduce prompt
+
+
+def source_text(value: Any) -> str:
+    """The text a MAP_REDUCE block chunks: strings as-is, lists one item per line, anything else as JSON."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, list):
+        return "\n".join(item if isinstance(item, str) else json.dumps(item, ensure_ascii=False, default=str) for item in value)
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def _split_long(sentence: str, chunk_tokens: int) -> List[str]:
+    pieces: List[str] = []
+    current: List[str] = []
+    used = 0
+    for word in sentence.split():
+        cost = estimate_tokens(word)
+        if current and used + cost > chunk_tokens:
+            pieces.append(" ".join(current))
+            current, used = [], 0
+        current.append(word)
+        used += cost
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def split_into_chunks(text: str, chunk_tokens: int, overlap_tokens: int = 0) -> List[str]:
+    """Chunks of at most ~chunk_tokens (overlap included); [] for blank text."""
+    overlap_tokens = min(overlap_tokens, chunk_tokens // 2) # Every chunk must make progress
+    sentences: List[str] = []
+    for sentence in _SENTENCE_END.split(text):
+        sentence = sentence.strip()
+        if sentence:
+            sentences.extend(_split_long(sentence, chunk_tokens) if estimate_tokens(sentence) > chunk_tokens else [sentence])
+
+    chunks: List[str] = []
+    current: List[str] = []
+    costs: List[int] = []
+    fresh = False # Whether `current` holds anything beyond the overlap carried over
+    for sentence in sentences:
+        cost = estimate_tokens(sentence)
+        if fresh and sum(costs) + cost > chunk_tokens:
+            chunks.append(" ".join(current))
+            # Carry the tail of this chunk over as the start of the next
+            carried = 0
+            keep = 0
+            while keep < len(current) and carried + costs[-1 - keep] <= overlap_tokens:
+                carried += costs[-1 - keep]
+                keep += 1
+            current, costs = (current[-keep:], costs[-keep:]) if keep else ([], [])
+            while current and sum(costs) + cost > chunk_tokens: # Overlap must leave room for new text
+                current.pop(0)
+                costs.pop(0)
+        current.append(sentence)
+        costs.append(cost)
+        fresh = True
+    if fresh:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def group_partials(partials: List[str], fan_in: int, budget_tokens: int) -> List[List[int]]:
+    """Greedy, order-preserving groups of at most fan_in results whose combined size fits budget_tokens."""
+    groups: List[List[int]] = []
+    current: List[int] = []
+    used = 0
+    for position, text in enumerate(partials):
+        cost = estimate_tokens(text) + _PARTIAL_OVERHEAD_TOKENS
+        if current and (len(current) >= fan_in or used + cost > budget_tokens):
+            groups.append(current)
+            current, used = [], 0
+        current.append(position)
+        used += cost
+    if current:
+        groups.append(current)
+    return groups
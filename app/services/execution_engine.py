@@ -1,31 +1,54 @@
 # This is the most complex service. It orchestrates the entire sequence execution.
 # A full, robust implementation is very long. This is a well-structured and functional version.
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload, joinedload
 from app.db import models
-from app.crud import crud_block, crud_variable, crud_run, crud_global_list
-from app.services.llm_interface import call_claude_api
-from app.services.prompt_utils import render_prompt, discretize_output
+from app.crud import crud_run, crud_global_list
+from app.crud.crud_materialized_run import materialized_run as crud_materialized_run
+from app.core.config import settings
+from app.core import metrics, tracing
+from app.services.llm_interface import LLMOverloadedError, LLMResponse, call_claude_api
+from app.services.llm_scheduler import llm_scheduler, run_weight
+from app.services.usage import BudgetExceededError, RunUsageTracker, TokenUsage
+from app.services.run_control import RunCancelledError, RunControl, track_run
+from app.services.prompt_utils import render_prompt, discretize_output, static_prefix
+from app.services.sequence_plan import SequencePlan, PlanBlock, LOOP_VARIABLES, get_sequence_plan
+from app.services.run_estimate import block_input_lists, estimate_llm_calls, sample_indices
+from app.services import chunking, item_packing, run_response
+from app.services.list_pipeline import StreamingList, UpstreamItemError, next_stage
+from app.services.token_estimate import PromptTooLargeError, context_window, estimate_tokens, fit_max_tokens
+from app.schemas.block import BlockConfigMapReduce
 from app.schemas.run import BlockRunCreate
+import asyncio
 import json
+import time
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 import logging
-from typing import Dict, Any, Tuple, List
+from typing import Dict, Any, Tuple, List, Iterable, Callable, Awaitable
 
 logger = logging.getLogger(__name__)
 
-async def _gather_sequence_context(db: AsyncSession, sequence_id: int, user_id: int, input_overrides: Dict[str, Any] = None) -> Dict[str, Any]:
+async def _gather_sequence_context(
+    db: AsyncSession,
+    plan: SequencePlan,
+    user_id: int,
+    input_overrides: Dict[str, Any] = None,
+    blocks: Iterable[PlanBlock] = None,
+) -> Dict[str, Any]:
     """
-    Gathers all available variables for a sequence execution:
-    1. User-defined Global Variables for the sequence.
-    2. User-defined Global Lists (their items).
+    Gathers the variables the given blocks (default: the whole plan) actually reference:
+    1. User-defined Global Variables for the sequence (already part of the plan, no query).
+    2. User-defined Global Lists (their items), only those referenced, in one query.
     3. Input Variables (runtime overrides take precedence over defaults if any).
     """
     context = {}
 
-    # 1. Fetch user-defined Global Variables for the sequence
-    seq_variables = await crud_variable.get_multi_by_sequence(db, sequence_id=sequence_id)
+    referenced_names = set()
+    for block in plan.blocks if blocks is None else blocks:
+        referenced_names |= block.referenced_variables
+
+    # 1. Referenced user-defined Global/Input Variables for the sequence
+    seq_variables = [var for var in plan.variables if var.name in referenced_names]
     for var in seq_variables:
         if var.type == models.VariableTypeEnum.GLOBAL and var.value_json and "value" in var.value_json:
             context[var.name] = var.value_json["value"]
@@ -35,14 +58,9 @@ async def _gather_sequence_context(db: AsyncSession, sequence_id: int, user_id:
             else: # Input variable with no default
                 context[var.name] = None # Or raise error if required and not in overrides
 
-    # 2. Fetch user-defined Global Lists
-    global_lists = await crud_global_list.get_multi_by_owner(db, user_id=user_id) # Assuming global lists are user-wide
-    # If global lists can be sequence-specific, adjust query:
-    # global_lists = await db.execute(select(models.GlobalList).filter(models.GlobalList.sequence_id == sequence_id).options(selectinload(models.GlobalList.items)))
-    # global_lists = global_lists.scalars().all()
-
-    for glist in global_lists:
-        context[glist.name] = [item.value for item in glist.items]
+    # 2. Fetch referenced user-defined Global Lists (user-wide), values only
+    list_names = referenced_names - LOOP_VARIABLES
+    context.update(await crud_global_list.get_values_by_names(db, user_id=user_id, names=list_names))
 
     # 3. Apply input_overrides (runtime inputs for INPUT type variables)
     if input_overrides:
@@ -56,78 +74,490 @@ async def _gather_sequence_context(db: AsyncSession, sequence_id: int, user_id:
         if var.type == models.VariableTypeEnum.INPUT and var.name not in context:
             context[var.name] = None # Explicitly set to None if no default and no override
 
-    logger.debug(f"Initial context for sequence {sequence_id}: { {k: (str(v)[:50] + '...' if isinstance(v, str) and len(v) > 50 else v) for k,v in context.items()} }")
+    logger.debug(f"Initial context for sequence {plan.sequence_id}: { {k: (str(v)[:50] + '...' if isinstance(v, str) and len(v) > 50 else v) for k,v in context.items()} }")
     return context
 
+def _simulated_block_outputs(block: PlanBlock) -> Dict[str, Any]:
+    """Placeholder values for a block's outputs, used to build preview context without calling the LLM."""
+    simulated: Dict[str, Any] = {}
+    for name, kind in block.output_variables:
+        if kind == "list_output":
+            simulated[name] = [f"[Sample item from list output of {block.name}]"]
+        elif kind == "matrix_output":
+            simulated[name] = [[f"[Sample item from matrix output of {block.name}]"]]
+        elif block.type == models.BlockTypeEnum.DISCRETIZATION:
+            simulated[name] = f"[Discretized output '{name}' from {block.name}]"
+        else:
+            simulated[name] = f"[Output from {block.name} (ID: {block.id})]"
+    return simulated
+
+def _map_reduce_setting(config: Dict[str, Any], name: str) -> Any:
+    """A MAP_REDUCE config value, or its schema default when unset (configs saved through BlockUpdate aren't re-validated)."""
+    value = config.get(name)
+    return value if value is not None else BlockConfigMapReduce.model_fields[name].default
+
+
+def _set_output_stand_ins(
+    block: PlanBlock, lists: List[Any], max_tokens: int,
+    context: Dict[str, Any], output_bounds: Dict[str, int], item_bounds: Dict[str, int],
+) -> None:
+    """Empty stand-ins shaped like the block's real outputs, with their size bounds, for the blocks after it."""
+    lengths = [len(values) if isinstance(values, list) else 1 for values in lists]
+    rows = lengths[0] if lengths else 1 # An incomplete list config (a plan error) still gets one item
+    columns = lengths[1] if len(lengths) > 1 else 1
+    for name, kind in block.output_variables:
+        if kind == "list_output":
+            context[name] = [""] * rows
+            output_bounds[name] = rows * max_tokens
+            item_bounds[name] = max_tokens
+        elif kind == "matrix_output":
+            context[name] = [[""] * columns for _ in range(rows)]
+            output_bounds[name] = rows * columns * max_tokens
+            item_bounds[name] = columns * max_tokens
+        else:
+            context[name] = ""
+            output_bounds[name] = max_tokens
+
+
+def _preflight_prompt_sizes(
+    blocks: Iterable[PlanBlock], plan: SequencePlan, context: Dict[str, Any], default_model: str | None
+) -> Dict[str, Any]:
+    """
+    Sizes every block's prompt offline, before any LLM call. Outputs of earlier blocks aren't known yet:
+    they count as empty for the lower bound (errors: the prompt can't fit whatever they turn out to be)
+    and at their max_tokens for the upper bound (warnings: it may not fit). List blocks are sized with
+    their longest item, map-reduce blocks with an empty chunk (lower) and a full one (upper). Blocks that
+    failed plan validation aren't sized (plan.errors already covers them) but still get stand-in outputs.
+    """
+    context = dict(context)
+    output_bounds: Dict[str, int] = {} # Block-produced variable -> upper bound of its size in tokens
+    item_bounds: Dict[str, int] = {} # Block-produced list/matrix -> upper bound of one item (or row)
+    sizes, errors, warnings = [], [], []
+    for block in blocks:
+        llm = _llm_selection(block, plan, default_model)
+        label = f"Block {block.id} ('{block.name}')"
+        window = context_window(llm.model)
+        probe = dict(context)
+        inputs = block_input_lists(block)
+        lists = [context.get(name) for name in inputs]
+        if block.id in plan.invalid_blocks:
+            _set_output_stand_ins(block, lists, llm.max_tokens, context, output_bounds, item_bounds)
+            continue
+        for n, values in enumerate(lists, start=1):
+            longest = max(values, key=lambda value: len(str(value)), default="") if isinstance(values, list) else ""
+            if block.type == models.BlockTypeEnum.SINGLE_LIST:
+                probe.update(item=longest, item_index=0)
+            else:
+                probe.update({f"item{n}": longest, f"item{n}_index": 0})
+        chunk_bound = 0
+        if block.type == models.BlockTypeEnum.MAP_REDUCE:
+            probe.update(chunk="", chunk_index=0, chunk_count=1)
+            inputs = [block.config_json.get("input_variable_name")] # Only ever rendered a chunk at a time
+            chunk_bound = _map_reduce_setting(block.config_json, "chunk_tokens")
+        try:
+            prompt_tokens = estimate_tokens(render_prompt(block.config_json.get("prompt") or "", probe))
+        except Exception: # Render problems are reported by validation and by the block itself
+            prompt_tokens = None
+        if prompt_tokens is not None:
+            # Iterated lists aren't rendered whole: they contribute one item
+            upper = prompt_tokens + chunk_bound + sum(output_bounds.get(name, 0) for name in block.referenced_variables - set(inputs))
+            upper += sum(item_bounds.get(name, 0) for name in inputs if name)
+            size = {
+                "block_id": block.id, "model": llm.model, "context_window": window,
+                "prompt_tokens": prompt_tokens, "prompt_tokens_upper": upper, "max_tokens": llm.max_tokens,
+            }
+            if fit_max_tokens(prompt_tokens, llm.model, llm.max_tokens) is None:
+                errors.append(f"{label}: prompt is ~{prompt_tokens} tokens; {llm.model} has a {window}-token context window.")
+            elif fit_max_tokens(upper, llm.model, llm.max_tokens) is None:
+                warnings.append(f"{label}: prompt may reach ~{upper} tokens with earlier blocks' outputs; {llm.model} has a {window}-token context window.")
+            if block.type == models.BlockTypeEnum.MAP_REDUCE:
+                try:
+                    reduce_tokens = estimate_tokens(render_prompt(
+                        block.config_json.get("reduce_prompt") or "", {**probe, "partials": [], "reduce_level": 1}
+                    ))
+                except Exception:
+                    reduce_tokens = None
+                if reduce_tokens is not None:
+                    size["reduce_prompt_tokens"] = reduce_tokens
+                    # Reduce groups shrink to fit the window, but each must hold at least two results
+                    if fit_max_tokens(reduce_tokens, llm.model, llm.max_tokens) is None:
+                        errors.append(f"{label}: reduce prompt is ~{reduce_tokens} tokens; {llm.model} has a {window}-token context window.")
+                    elif fit_max_tokens(reduce_tokens + 2 * llm.max_tokens, llm.model, llm.max_tokens) is None:
+                        warnings.append(f"{label}: reduce prompt may not fit two results in {llm.model}'s {window}-token context window.")
+            sizes.append(size)
+
+        _set_output_stand_ins(block, lists, llm.max_tokens, context, output_bounds, item_bounds)
+    return {"sizes": sizes, "errors": errors, "warnings": warnings}
+
+
+@dataclass
+class BlockExecutionResult:
+    """Everything one block execution produces, mapped 1:1 onto its BlockRun row."""
+    output_data: Dict[str, Any] = field(default_factory=dict) # Variables made available to later blocks
+    rendered_prompt: str = ""
+    llm_output: str = ""
+    named_outputs: Dict[str, Any] | None = None
+    list_outputs: Dict[str, Any] | None = None
+    matrix_outputs: Dict[str, Any] | None = None
+    error_message: str | None = None
+    usage: TokenUsage = field(default_factory=TokenUsage) # Roll-up of every LLM call made by the block
+    item_usage: List[Any] | None = None # Per item (list blocks) or per cell (matrix blocks)
+    pack_usage: List[Any] | None = None # Per packed call of a packed list block; its items' item_usage points here
+    reduce_usage: List[List[Any]] | None = None # Per reduce call of a map-reduce block, by level (item_usage is per chunk)
+    block_type: str = "unknown"
+    cancelled: bool = False # Stopped by a run cancellation (error_message says so too)
+
+    def token_usage_json(self) -> Dict[str, Any]:
+        usage_json = self.usage.to_dict()
+        if self.item_usage is not None:
+            usage_json["items"] = self.item_usage
+        if self.pack_usage is not None:
+            usage_json["packs"] = self.pack_usage
+        if self.reduce_usage is not None:
+            usage_json["reduce"] = self.reduce_usage
+        return usage_json
+
+
+@dataclass(frozen=True)
+class LLMSelection:
+    """Models a block's calls go to (primary first, then fallbacks) and their response token limit."""
+    models: Tuple[str, ...]
+    max_tokens: int
+
+    @property
+    def model(self) -> str:
+        return self.models[0]
+
+
+def _llm_selection(block: PlanBlock, plan: SequencePlan, default_model: str | None) -> LLMSelection:
+    """Block config overrides the sequence's llm_config_json, which overrides the run default and server settings."""
+    block_config, sequence_config = block.config_json, plan.llm_config
+
+    def setting(name: str) -> Any:
+        value = block_config.get(name)
+        return value if value is not None else sequence_config.get(name)
+
+    model = setting("model") or default_model or settings.DEFAULT_LLM_MODEL
+    fallbacks = setting("fallback_models")
+    if fallbacks is None:
+        fallbacks = settings.LLM_FALLBACK_MODELS
+    chain = tuple(dict.fromkeys([model, *fallbacks])) # Ordered, without repeats
+    return LLMSelection(models=chain, max_tokens=setting("max_tokens") or settings.DEFAULT_LLM_MAX_TOKENS)
+
+
+async def _scheduled_llm_call(
+    prompt: str, llm: LLMSelection, run_control: RunControl, block_type: str, llm_span: tracing.Span, max_tokens: int,
+    cache_prefix_chars: int = 0,
+) -> LLMResponse:
+    """
+    Waits for a fair-share slot from the LLM scheduler, then calls the API. If a model is overloaded,
+    or slower than LLM_FAILOVER_AFTER_SECONDS, the call moves to the next model of the chain (same slot).
+    """
+    # Sized offline: a prompt that can't fit the context window fails here instead of at the API
+    prompt_tokens = estimate_tokens(prompt)
+    fitted = {model: fit_max_tokens(prompt_tokens, model, max_tokens) for model in llm.models}
+    if fitted[llm.model] is None:
+        raise PromptTooLargeError(
+            f"Prompt is ~{prompt_tokens} tokens; {llm.model} has a {context_window(llm.model)}-token context window."
+        )
+    llm_span.set(estimated_prompt_tokens=prompt_tokens)
+    queued_at = time.perf_counter()
+    async with llm_scheduler.slot(
+        user_id=run_control.user_id, run_id=run_control.run_id, weight=run_control.scheduling_weight,
+        tokens=prompt_tokens + fitted[llm.model],
+    ) as grant:
+        llm_span.set(queue_wait_ms=round((time.perf_counter() - queued_at) * 1000, 3))
+        models_that_fit = [model for model in llm.models if fitted[model] is not None]
+        for attempt, model in enumerate(models_that_fit):
+            call = call_claude_api(
+                prompt, model=model, max_tokens=fitted[model], block_type=block_type, cache_prefix_chars=cache_prefix_chars
+            )
+            try:
+                if attempt == len(models_that_fit) - 1:
+                    response = await call # Nothing left to fail over to: wait as long as the API takes
+                elif settings.LLM_FAILOVER_AFTER_SECONDS > 0:
+                    response = await asyncio.wait_for(call, settings.LLM_FAILOVER_AFTER_SECONDS)
+                else:
+                    response = await call
+                grant.record_usage(
+                    response.input_tokens + response.output_tokens
+                    + response.cache_creation_input_tokens + response.cache_read_input_tokens
+                )
+                return response
+            except (LLMOverloadedError, asyncio.TimeoutError) as e:
+                if attempt == len(models_that_fit) - 1:
+                    raise
+                reason = "overloaded" if isinstance(e, LLMOverloadedError) else "slow"
+                next_model = models_that_fit[attempt + 1]
+                logger.warning(f"LLM call to {model} {reason}; failing over to {next_model}.")
+                metrics.LLM_FAILOVERS.labels(from_model=model, to_model=next_model, reason=reason).inc()
+                metrics.LLM_RETRIES.labels(model=next_model, reason=reason).inc()
+                llm_span.set(failovers=attempt + 1, failover_reason=reason)
+
+
+async def _call_llm(
+    prompt: str, llm: LLMSelection, usage_tracker: RunUsageTracker, run_control: RunControl, result: BlockExecutionResult,
+    max_tokens: int | None = None, cache_prefix_chars: int = 0,
+) -> Tuple[str, TokenUsage]:
+    """Budget-checked, cancellable LLM call; records usage on the run tracker and the block result."""
+    run_control.raise_if_cancelled()
+    usage_tracker.check_budget()
+    with tracing.span("llm_call", model=llm.model, prompt_chars=len(prompt)) as llm_span:
+        response = await run_control.run_cancellable(_scheduled_llm_call(
+            prompt, llm, run_control, result.block_type, llm_span, max_tokens or llm.max_tokens, cache_prefix_chars
+        ))
+        usage = usage_tracker.record(response)
+        llm_span.set(
+            served_model=response.model,
+            input_tokens=usage.input_tokens, output_tokens=usage.output_tokens, cost=usage.cost, stop_reason=response.stop_reason,
+            cache_write_tokens=usage.cache_write_tokens, cache_read_tokens=usage.cache_read_tokens,
+        )
+    result.usage.add(usage)
+    return response.text, usage
+
+
+class _ItemsFailed(Exception):
+    """An item of a list/matrix block failed; carries the results of the items that did finish."""
+    def __init__(self, cause: BaseException, results: List[Any]):
+        super().__init__(str(cause))
+        self.cause = cause
+        self.results = results
+
+
+async def _map_items(count: int, run_item: Callable[[int], Awaitable[Any]], warm_first: bool = False) -> List[Any]:
+    """
+    Runs run_item(0..count-1) with up to RUN_ITEM_CONCURRENCY items in flight; results keep index order.
+    After the first failure no further item starts and items already running are allowed to finish,
+    then _ItemsFailed is raised with the finished results (None where an item didn't finish).
+    With warm_first, item 0 runs alone first so it writes the prompt cache the others then read.
+    """
+    results: List[Any] = [None] * count
+    next_index = 0
+    failure: BaseException | None = None
+    if warm_first and count > 1:
+        try:
+            results[0] = await run_item(0)
+        except Exception as e:
+            raise _ItemsFailed(e, results)
+        next_index = 1
+
+    async def worker() -> None:
+        nonlocal next_index, failure
+        while failure is None and next_index < count:
+            index = next_index
+            next_index += 1
+            try:
+                results[index] = await run_item(index)
+            except Exception as e:
+                failure = failure or e
+
+    await asyncio.gather(*(worker() for _ in range(min(count - next_index, max(1, settings.RUN_ITEM_CONCURRENCY)))))
+    if failure is not None:
+        raise _ItemsFailed(failure, results)
+    return results
+
+
+def _cache_prefix(prompt_template: str, current_context: Dict[str, Any], loop_variables: Iterable[str], calls: int) -> str:
+    """
+    Prompt text shared by every item of a list/matrix block, to be marked for provider prompt caching;
+    empty when caching is off, there's nothing to share it with, or it is too short to be cached.
+    """
+    if not settings.LLM_PROMPT_CACHING or calls < 2:
+        return ""
+    try:
+        prefix = static_prefix(prompt_template, current_context, loop_variables)
+    except Exception: # Render errors are reported by the items themselves
+        return ""
+    return prefix if estimate_tokens(prefix) >= settings.LLM_PROMPT_CACHE_MIN_TOKENS else ""
+
+
+def _prefix_chars(prompt: str, cache_prefix: str) -> int:
+    return len(cache_prefix) if cache_prefix and prompt.startswith(cache_prefix) else 0
+
+
+async def _map_packed_items(
+    instructions: str,
+    texts: List[str],
+    indices: List[int],
+    max_items: int,
+    run_item: Callable[[int], Awaitable[str]],
+    llm: LLMSelection,
+    usage_tracker: RunUsageTracker,
+    run_control: RunControl,
+    result: BlockExecutionResult,
+) -> List[Any]:
+    """
+    Like _map_items for a packed list block: items go out in packs, one LLM call each, then any item
+    the packed responses didn't answer usably is re-run on its own with run_item.
+    """
+    packs = item_packing.plan_packs(texts, instructions, max_items)
+    result.pack_usage = [None] * len(packs)
+    results: List[Any] = [None] * len(texts)
+    # Header and instructions are identical for every pack
+    cache_packs = (
+        settings.LLM_PROMPT_CACHING and len(packs) > 1
+        and estimate_tokens(instructions) >= settings.LLM_PROMPT_CACHE_MIN_TOKENS
+    )
+
+    async def run_pack(pack_no: int) -> None:
+        pack = packs[pack_no]
+        if len(pack) == 1: # Doesn't fit with others: the packed format would only add overhead
+            results[pack[0]] = await run_item(pack[0])
+            return
+        with tracing.span("pack", items=len(pack)) as pack_span:
+            prompt = item_packing.render_packed_prompt(instructions, [(indices[p], texts[p]) for p in pack])
+            text, usage = await _call_llm(
+                prompt, llm, usage_tracker, run_control, result, settings.LLM_PACK_MAX_TOKENS,
+                item_packing.shared_prefix_chars(prompt) if cache_packs else 0,
+            )
+            outputs = item_packing.parse_packed_response(text, len(pack))
+            parsed = sum(output is not None for output in outputs)
+            pack_span.set(parsed=parsed)
+        result.pack_usage[pack_no] = {"item_indices": [indices[p] for p in pack], "parsed": parsed, **usage.to_dict()}
+        for position, output in zip(pack, outputs):
+            if output is not None:
+                results[position] = output
+                result.item_usage[position] = {"pack": pack_no}
+
+    try:
+        await _map_items(len(packs), run_pack, warm_first=cache_packs)
+    except _ItemsFailed as e:
+        raise _ItemsFailed(e.cause, results) from None
+
+    retry = [position for position, output in enumerate(results) if output is None]
+    if retry:
+        logger.info(f"Re-running {len(retry)} of {len(texts)} packed items individually.")
+        metrics.LLM_RETRIES.labels(model=llm.model, reason="pack_parse").inc(len(retry))
+
+        async def run_retry(n: int) -> None:
+            results[retry[n]] = await run_item(retry[n])
+
+        try:
+            await _map_items(len(retry), run_retry)
+        except _ItemsFailed as e:
+            raise _ItemsFailed(e.cause, results) from None
+    return results
+
+
 async def _execute_single_block_logic(
     db: AsyncSession, # Pass db session for potential internal db calls if needed (e.g. fetching list items dynamically)
-    block: models.Block,
+    block: PlanBlock,
     current_context: Dict[str, Any],
-    llm_model: str
-) -> Tuple[Dict[str, Any], str, str, Dict[str, Any] | None, Dict[str, Any] | None, Dict[str, Any] | None, str | None]:
+    llm: LLMSelection,
+    usage_tracker: RunUsageTracker,
+    run_control: RunControl,
+    output_stream: StreamingList | None = None,
+) -> BlockExecutionResult:
     """
-    Core logic for executing one block.
-    Returns: (
-        output_data_for_context,
-        rendered_prompt_text,
-        llm_raw_output_text,
-        named_outputs_json_for_db,
-        list_outputs_json_for_db,
-        matrix_outputs_json_for_db,
-        error_message_str
-    )
+    Core logic for executing one block. Never raises for block-level failures: they are
+    reported through `error_message`, with any partial list/matrix results preserved.
+    A list block given `output_stream` publishes each item's output to it as soon as it is done.
     """
+    with tracing.span("block", block_id=block.id, block_name=block.name, block_type=block.type.value) as block_span:
+        result = await _run_block(db, block, current_context, llm, usage_tracker, run_control, output_stream)
+        block_span.set(llm_calls=result.usage.calls, total_tokens=result.usage.total_tokens, cost=result.usage.cost)
+        if result.error_message:
+            block_span.status = "cancelled" if result.cancelled else "error"
+            block_span.error = result.error_message
+    return result
+
+
+async def _run_block(
+    db: AsyncSession,
+    block: PlanBlock,
+    current_context: Dict[str, Any],
+    llm: LLMSelection,
+    usage_tracker: RunUsageTracker,
+    run_control: RunControl,
+    output_stream: StreamingList | None = None,
+) -> BlockExecutionResult:
     block_config = block.config_json
     prompt_template = block_config.get("prompt", "")
-    
-    output_data: Dict[str, Any] = {}
-    rendered_prompt = ""
-    llm_output = ""
-    named_outputs_db = None
-    list_outputs_db = None
-    matrix_outputs_db = None
-    error_message = None
+    result = BlockExecutionResult(block_type=block.type.value)
 
     try:
         if block.type == models.BlockTypeEnum.STANDARD:
-            rendered_prompt = render_prompt(prompt_template, current_context)
-            llm_output = await call_claude_api(rendered_prompt, model=llm_model)
+            with tracing.span("render_prompt"):
+                result.rendered_prompt = render_prompt(prompt_template, current_context)
+            result.llm_output, _ = await _call_llm(result.rendered_prompt, llm, usage_tracker, run_control, result)
             output_var_name = block_config.get("output_variable_name", f"block_{block.id}_output")
-            output_data[output_var_name] = llm_output
+            result.output_data[output_var_name] = result.llm_output
 
         elif block.type == models.BlockTypeEnum.DISCRETIZATION:
-            rendered_prompt = render_prompt(prompt_template, current_context)
-            llm_output = await call_claude_api(rendered_prompt, model=llm_model)
+            with tracing.span("render_prompt"):
+                result.rendered_prompt = render_prompt(prompt_template, current_context)
+            result.llm_output, _ = await _call_llm(result.rendered_prompt, llm, usage_tracker, run_control, result)
             output_names = block_config.get("output_names", [])
             if not output_names: raise ValueError("Discretization block missing 'output_names' in config.")
-            named_outputs = discretize_output(llm_output, output_names)
-            output_data.update(named_outputs)
-            named_outputs_db = named_outputs
+            named_outputs = discretize_output(result.llm_output, output_names)
+            result.output_data.update(named_outputs)
+            result.named_outputs = named_outputs
 
         elif block.type == models.BlockTypeEnum.SINGLE_LIST:
             input_list_name = block_config.get("input_list_variable_name")
             if not input_list_name: raise ValueError("Single List block missing 'input_list_variable_name'.")
             
             input_list = current_context.get(input_list_name)
-            if not isinstance(input_list, list):
+            streaming = isinstance(input_list, StreamingList) # Still being produced by the upstream block of a pipeline
+            if not streaming and not isinstance(input_list, list):
                 raise ValueError(f"Variable '{input_list_name}' for Single List block is not a list or not found in context. Found: {type(input_list)}")
 
             output_list_var_name = block_config.get("output_list_variable_name") or f"output_list_{block.id}"
             
-            item_results = []
+            # All items, or an evenly spaced sample when the run was degraded to meet its deadline
+            indices = sample_indices(len(input_list), run_control.sample_rate)
+            sampled = len(indices) < len(input_list)
+            result.item_usage = [None] * len(indices)
             # For logging, we might only store the template or a sample rendered prompt
-            rendered_prompt = f"Executing Single List Block. Template: {prompt_template[:100]}... on list '{input_list_name}' ({len(input_list)} items)."
-            
-            for item_idx, item_value in enumerate(input_list):
-                item_context = {**current_context, "item": item_value, "item_index": item_idx} # Provide item and its index
-                item_prompt = render_prompt(prompt_template, item_context)
-                # Consider logging each item_prompt if verbosity is high
-                item_llm_output = await call_claude_api(item_prompt, model=llm_model)
-                item_results.append(item_llm_output)
+            result.rendered_prompt = f"Executing Single List Block. Template: {prompt_template[:100]}... on list '{input_list_name}' ({len(input_list)} items{f', {len(indices)} sampled' if sampled else ''})."
+            cache_prefix = _cache_prefix(prompt_template, current_context, ("item", "item_index"), len(indices))
+
+            async def run_item(position: int) -> str:
+                item_idx = indices[position]
+                try:
+                    with tracing.span("item", item_index=item_idx):
+                        item = await run_control.run_cancellable(input_list.get(item_idx)) if streaming else input_list[item_idx]
+                        item_context = {**current_context, "item": item, "item_index": item_idx} # Provide item and its index
+                        with tracing.span("render_prompt"):
+                            item_prompt = render_prompt(prompt_template, item_context)
+                        # Consider logging each item_prompt if verbosity is high
+                        item_llm_output, item_usage = await _call_llm(
+                            item_prompt, llm, usage_tracker, run_control, result, cache_prefix_chars=_prefix_chars(item_prompt, cache_prefix)
+                        )
+                except Exception as e:
+                    if output_stream is not None: # This block will fail: the downstream block mustn't start more paid items
+                        output_stream.close(f"Upstream block {block.id} ('{block.name}') stopped: {e}")
+                    raise
+                result.item_usage[position] = item_usage.to_dict()
+                if output_stream is not None:
+                    output_stream.set(position, item_llm_output)
+                return item_llm_output
+
+            sample_info = {"sample_indices": indices} if sampled else {}
+            instructions = None
+            if block_config.get("pack_items"):
+                instructions = item_packing.packed_instructions(prompt_template, current_context)
+                if instructions is None:
+                    logger.warning(f"Block {block.id} can't pack items: its prompt reads inside or branches on the item. Running per item.")
+            try:
+                if instructions is not None:
+                    texts = [item_packing.item_text(input_list[item_idx]) for item_idx in indices]
+                    item_results = await _map_packed_items(
+                        instructions, texts, indices, block_config.get("pack_max_items") or 20, run_item,
+                        llm, usage_tracker, run_control, result,
+                    )
+                else:
+                    item_results = await _map_items(len(indices), run_item, warm_first=bool(cache_prefix))
+            except _ItemsFailed as e:
+                if isinstance(e.cause, (BudgetExceededError, RunCancelledError, UpstreamItemError)):
+                    # Keep what was already paid for (unfinished items are null)
+                    result.list_outputs = {"values": e.results, "partial": True, **sample_info}
+                    result.llm_output = json.dumps(e.results)
+                raise e.cause from None
             
-            output_data[output_list_var_name] = item_results
-            llm_output = json.dumps(item_results) # Store all results as JSON string for raw output
-            list_outputs_db = {"values": item_results}
+            result.output_data[output_list_var_name] = item_results
+            result.llm_output = json.dumps(item_results) # Store all results as JSON string for raw output
+            result.list_outputs = {"values": item_results, **sample_info}
 
 
         elif block.type == models.BlockTypeEnum.MULTI_LIST:
@@ -149,38 +579,188 @@ async def _execute_single_block_logic(
             if not isinstance(primary_list, list): raise ValueError(f"Primary list '{list1_name}' is not a list or not found.")
             if not isinstance(secondary_list, list): raise ValueError(f"Secondary list '{list2_name}' is not a list or not found.")
 
-            matrix_results = []
-            rendered_prompt = f"Executing Multi List Block. Template: {prompt_template[:100]}... on lists '{list1_name}' & '{list2_name}'."
+            # All primary rows, or an evenly spaced sample of them when degraded to meet a deadline
+            rows = sample_indices(len(primary_list), run_control.sample_rate)
+            sample_info = {"sample_row_indices": rows} if len(rows) < len(primary_list) else {}
+            columns = len(secondary_list)
+            result.item_usage = [[None] * columns for _ in rows]
+            result.rendered_prompt = f"Executing Multi List Block. Template: {prompt_template[:100]}... on lists '{list1_name}' & '{list2_name}'."
+            cache_prefix = _cache_prefix(
+                prompt_template, current_context, ("item1", "item2", "item1_index", "item2_index"), len(rows) * columns
+            )
 
-            for p_idx, p_item in enumerate(primary_list):
-                row_results = []
-                for s_idx, s_item in enumerate(secondary_list):
+            async def run_cell(cell_idx: int) -> str:
+                row_position, s_idx = divmod(cell_idx, columns) # Row-major over primary x secondary
+                p_idx = rows[row_position]
+                with tracing.span("cell", item1_index=p_idx, item2_index=s_idx):
                     # Define how items are exposed, e.g. item_list1_name, item_list2_name or item1, item2
                     item_context = {
                         **current_context,
-                        "item1": p_item,  # Or use a more specific name based on input_configs
-                        "item2": s_item,
+                        "item1": primary_list[p_idx],  # Or use a more specific name based on input_configs
+                        "item2": secondary_list[s_idx],
                         "item1_index": p_idx,
                         "item2_index": s_idx,
                     }
-                    item_prompt = render_prompt(prompt_template, item_context)
-                    item_llm_output = await call_claude_api(item_prompt, model=llm_model)
-                    row_results.append(item_llm_output)
-                matrix_results.append(row_results)
+                    with tracing.span("render_prompt"):
+                        item_prompt = render_prompt(prompt_template, item_context)
+                    item_llm_output, item_usage = await _call_llm(
+                        item_prompt, llm, usage_tracker, run_control, result, cache_prefix_chars=_prefix_chars(item_prompt, cache_prefix)
+                    )
+                result.item_usage[row_position][s_idx] = item_usage.to_dict()
+                return item_llm_output
+
+            def to_matrix(cells: List[Any]) -> List[List[Any]]:
+                return [cells[row * columns:(row + 1) * columns] for row in range(len(rows))]
+
+            try:
+                matrix_results = to_matrix(await _map_items(len(rows) * columns, run_cell, warm_first=bool(cache_prefix)))
+            except _ItemsFailed as e:
+                if isinstance(e.cause, (BudgetExceededError, RunCancelledError)):
+                    # Keep what was already paid for (unfinished cells are null)
+                    partial = to_matrix(e.results)
+                    result.matrix_outputs = {"values": partial, "partial": True, **sample_info}
+                    result.llm_output = json.dumps(partial)
+                raise e.cause from None
             
-            output_data[output_matrix_var_name] = matrix_results
-            llm_output = json.dumps(matrix_results)
-            matrix_outputs_db = {"values": matrix_results}
+            result.output_data[output_matrix_var_name] = matrix_results
+            result.llm_output = json.dumps(matrix_results)
+            result.matrix_outputs = {"values": matrix_results, **sample_info}
+
+        elif block.type == models.BlockTypeEnum.MAP_REDUCE:
+            input_name = block_config.get("input_variable_name")
+            reduce_template = block_config.get("reduce_prompt")
+            if not input_name or not reduce_template: raise ValueError("Map-Reduce block missing 'input_variable_name' or 'reduce_prompt'.")
+            source = current_context.get(input_name)
+            if source is None:
+                raise ValueError(f"Variable '{input_name}' for Map-Reduce block not found in context.")
+            output_var_name = block_config.get("output_variable_name") or f"block_{block.id}_output"
+
+            with tracing.span("chunk_text") as chunk_span:
+                chunks = chunking.split_into_chunks(
+                    chunking.source_text(source), _map_reduce_setting(block_config, "chunk_tokens"),
+                    _map_reduce_setting(block_config, "chunk_overlap_tokens"),
+                )
+                chunk_span.set(chunks=len(chunks))
+            if not chunks:
+                raise ValueError(f"Variable '{input_name}' for Map-Reduce block holds no text.")
+            result.item_usage = [None] * len(chunks)
+            result.reduce_usage = []
+            result.rendered_prompt = f"Executing Map-Reduce Block. Template: {prompt_template[:100]}... on '{input_name}' ({len(chunks)} chunks)."
+            map_context = {**current_context, "chunk_count": len(chunks)}
+            cache_prefix = _cache_prefix(prompt_template, map_context, ("chunk", "chunk_index"), len(chunks))
+
+            async def run_chunk(chunk_idx: int) -> str:
+                with tracing.span("chunk", chunk_index=chunk_idx):
+                    with tracing.span("render_prompt"):
+                        chunk_prompt = render_prompt(prompt_template, {**map_context, "chunk": chunks[chunk_idx], "chunk_index": chunk_idx})
+                    chunk_llm_output, chunk_usage = await _call_llm(
+                        chunk_prompt, llm, usage_tracker, run_control, result, cache_prefix_chars=_prefix_chars(chunk_prompt, cache_prefix)
+                    )
+                result.item_usage[chunk_idx] = chunk_usage.to_dict()
+                return chunk_llm_output
+
+            async def reduce_level(partials: List[str], level: int) -> List[str]:
+                """One level of the tree: each group of results becomes one (a lone result passes through)."""
+                level_context = {**current_context, "reduce_level": level}
+                overhead = estimate_tokens(render_prompt(reduce_template, {**level_context, "partials": []}))
+                fan_in = _map_reduce_setting(block_config, "reduce_fan_in")
+                groups = chunking.group_partials(partials, fan_in, context_window(llm.model) - llm.max_tokens - overhead)
+                if len(groups) == len(partials):
+                    raise PromptTooLargeError(
+                        f"Map-Reduce level {level}: results are too large to combine two at a time in {llm.model}'s context window."
+                    )
+                level_usage: List[Any] = [None] * len(groups)
+                result.reduce_usage.append(level_usage)
+                group_prefix = _cache_prefix(reduce_template, level_context, ("partials",), len(groups))
+
+                async def run_group(group_idx: int) -> str:
+                    group = groups[group_idx]
+                    if len(group) == 1:
+                        return partials[group[0]]
+                    with tracing.span("reduce_group", reduce_level=level, partials=len(group)):
+                        with tracing.span("render_prompt"):
+                            group_prompt = render_prompt(reduce_template, {**level_context, "partials": [partials[p] for p in group]})
+                        group_llm_output, group_usage = await _call_llm(
+                            group_prompt, llm, usage_tracker, run_control, result, cache_prefix_chars=_prefix_chars(group_prompt, group_prefix)
+                        )
+                    level_usage[group_idx] = group_usage.to_dict()
+                    return group_llm_output
+
+                return await _map_items(len(groups), run_group, warm_first=bool(group_prefix))
+
+            map_results: List[Any] | None = None
+            levels: List[List[Any]] = [] # Outputs of each reduce level; the last holds the final output
+            try:
+                map_results = await _map_items(len(chunks), run_chunk, warm_first=bool(cache_prefix))
+                partials = map_results
+                while len(partials) > 1:
+                    partials = await reduce_level(partials, len(levels) + 1)
+                    levels.append(partials)
+            except _ItemsFailed as e:
+                if isinstance(e.cause, (BudgetExceededError, RunCancelledError)):
+                    # Keep what was already paid for (unfinished chunks and groups are null)
+                    if map_results is None:
+                        map_results = e.results
+                    else:
+                        levels.append(e.results)
+                    result.list_outputs = {"values": map_results, "reduce_levels": levels, "partial": True}
+                raise e.cause from None
+
+            result.output_data[output_var_name] = partials[0]
+            result.llm_output = partials[0]
+            result.list_outputs = {"values": map_results, "reduce_levels": levels} # Chunk outputs, then each level's
 
         else:
             raise NotImplementedError(f"Block type '{block.type}' execution not implemented.")
 
+    except RunCancelledError as e:
+        logger.info(f"Block {block.id} ('{block.name}') stopped: {e}")
+        result.error_message = str(e)
+        result.cancelled = True
+    except BudgetExceededError as e:
+        logger.warning(f"Block {block.id} ('{block.name}') stopped: {e}")
+        result.error_message = str(e)
     except Exception as e:
         logger.error(f"Error executing block {block.id} ('{block.name}'): {e}", exc_info=True)
-        error_message = str(e)
+        result.error_message = str(e)
         # output_data will remain as it was before the error for this block
 
-    return output_data, rendered_prompt, llm_output, named_outputs_db, list_outputs_db, matrix_outputs_db, error_message
+    return result
+
+
+async def _execute_stage(
+    db: AsyncSession,
+    stage: Tuple[PlanBlock, ...],
+    current_context: Dict[str, Any],
+    plan: SequencePlan,
+    llm_model: str | None,
+    usage_tracker: RunUsageTracker,
+    run_control: RunControl,
+) -> List[BlockExecutionResult]:
+    """
+    Executes a stage from list_pipeline.next_stage: a single block, or a chain of list blocks run
+    concurrently, each reading the previous one's output as a StreamingList while it is produced.
+    """
+    if len(stage) == 1:
+        return [await _execute_single_block_logic(
+            db, stage[0], current_context, _llm_selection(stage[0], plan, llm_model), usage_tracker, run_control
+        )]
+    length = len(current_context[stage[0].config_json["input_list_variable_name"]])
+    streams = [StreamingList(length) for _ in stage[:-1]]
+
+    async def run_block(n: int) -> BlockExecutionResult:
+        block = stage[n]
+        context = current_context if n == 0 else {**current_context, block.config_json["input_list_variable_name"]: streams[n - 1]}
+        output_stream = streams[n] if n < len(streams) else None
+        block_result = await _execute_single_block_logic(
+            db, block, context, _llm_selection(block, plan, llm_model), usage_tracker, run_control, output_stream
+        )
+        if output_stream is not None: # Items it never produced fail downstream instead of waiting forever
+            output_stream.close(f"Upstream block {block.id} ('{block.name}') stopped: {block_result.error_message or 'item not produced'}")
+        return block_result
+
+    with tracing.span("pipeline", block_ids=[block.id for block in stage], items=length):
+        return list(await asyncio.gather(*(run_block(n) for n in range(len(stage)))))
 
 
 async def execute_sequence(
@@ -189,7 +769,32 @@ async def execute_sequence(
     sequence_id: int,
     user_id: int, # For context gathering
     input_overrides: Dict[str, Any] = None,
-    llm_model: str = "claude-3-opus-20240229" # Default model
+    llm_model: str | None = None, # Run default, below block and sequence settings (None = DEFAULT_LLM_MODEL)
+    interactive: bool = False, # A request is waiting on this run: its LLM calls get a scheduling boost
+) -> models.Run:
+    with metrics.ACTIVE_RUNS.track_inprogress(), \
+            tracing.span("run", run_id=run_id, sequence_id=sequence_id, user_id=user_id, model=llm_model, interactive=interactive) as run_span:
+        logger.info(f"Run {run_id} started (trace {run_span.trace_id})")
+        async with track_run(run_id, user_id) as run_control:
+            run_obj = await _execute_sequence(db, run_id, sequence_id, user_id, input_overrides, llm_model, run_control, interactive)
+        try:
+            await run_response.materialize(db, run_obj) # Serialized once so reads of the finished run skip validation
+        except Exception as e: # GET /runs/{id} materializes on first read instead
+            logger.warning(f"Could not materialize the response of run {run_id}: {e}")
+            await db.rollback()
+        run_span.set(status=run_obj.status.value, total_tokens=(run_obj.token_usage_json or {}).get("total_tokens"), cost=run_obj.cost)
+        return run_obj
+
+
+async def _execute_sequence(
+    db: AsyncSession,
+    run_id: int,
+    sequence_id: int,
+    user_id: int,
+    input_overrides: Dict[str, Any] = None,
+    llm_model: str | None = None,
+    run_control: RunControl = None,
+    interactive: bool = False,
 ) -> models.Run:
     """
     Executes a full sequence.
@@ -207,95 +812,180 @@ async def execute_sequence(
     run_obj = await crud_run.get(db, id=run_id)
     if not run_obj or run_obj.sequence_id != sequence_id or run_obj.user_id != user_id:
         raise ValueError("Run not found or access denied.")
+    if run_obj.status == models.RunStatusEnum.CANCELLED:
+        logger.info(f"Run {run_id} was cancelled before it started.")
+        return await crud_run.get_by_id_and_user(db, id=run_obj.id, user_id=user_id) or run_obj
+    if run_obj.cancel_requested_at is not None:
+        run_control.cancel()
+    if run_obj.deadline is not None:
+        run_control.set_deadline(run_obj.deadline)
+    run_control.sample_rate = run_obj.sample_rate or 1.0
 
     run_obj.status = models.RunStatusEnum.RUNNING
     run_obj.started_at = datetime.now(timezone.utc)
     run_obj.input_overrides_json = input_overrides # Log the overrides used
     db.add(run_obj)
+    await crud_materialized_run.remove_for_run(db, run_id=run_obj.id) # Stale if a queued run is executing again
     await db.commit()
     await db.refresh(run_obj)
 
-    current_context = await _gather_sequence_context(db, sequence_id, user_id, input_overrides)
-    
-    # Fetch blocks for the sequence, ordered
-    blocks = await crud_block.get_multi_by_sequence(db, sequence_id=sequence_id)
+    # Compiled plan (cached per sequence version): ordered blocks, templates, variables, validation
+    with tracing.span("load_plan") as plan_span:
+        plan = await get_sequence_plan(db, sequence_id)
+        plan_span.set(version=plan.version, blocks=len(plan.blocks), errors=len(plan.errors))
+    blocks = plan.blocks
+    if plan.errors:
+        # Fail before any LLM call is made rather than after earlier blocks have spent tokens
+        logger.error(f"Run {run_id} aborted: sequence {sequence_id} failed plan validation: {plan.errors}")
+        run_obj.status = models.RunStatusEnum.FAILED
+        run_obj.completed_at = datetime.now(timezone.utc)
+        run_obj.results_summary_json = {"error": "Sequence validation failed", "details": plan.errors}
+        db.add(run_obj)
+        await db.commit()
+        return await crud_run.get_by_id_and_user(db, id=run_obj.id, user_id=user_id) or run_obj
+
+    with tracing.span("gather_context") as context_span:
+        current_context = await _gather_sequence_context(db, plan, user_id, input_overrides)
+        context_span.set(variables=len(current_context))
+    with tracing.span("size_prompts") as sizing_span:
+        sizing = _preflight_prompt_sizes(blocks, plan, current_context, llm_model)
+        sizing_span.set(errors=len(sizing["errors"]), warnings=len(sizing["warnings"]))
+    for warning in sizing["warnings"]:
+        logger.warning(f"Run {run_id}: {warning}")
+    if sizing["errors"]:
+        # A prompt that can't fit its context window would fail at the API after earlier blocks were paid for
+        logger.error(f"Run {run_id} aborted: prompts too large for their models: {sizing['errors']}")
+        run_obj.status = models.RunStatusEnum.FAILED
+        run_obj.completed_at = datetime.now(timezone.utc)
+        run_obj.results_summary_json = {"error": "Prompt size check failed", "details": sizing["errors"]}
+        db.add(run_obj)
+        await db.commit()
+        return await crud_run.get_by_id_and_user(db, id=run_obj.id, user_id=user_id) or run_obj
+    list_lengths = {name: len(value) for name, value in current_context.items() if isinstance(value, list)}
+    expected_calls = estimate_llm_calls(plan, list_lengths, run_control.sample_rate)
+    run_control.scheduling_weight = run_weight(interactive=interactive, expected_calls=expected_calls, priority=run_obj.priority or 0)
     if not blocks:
         logger.warning(f"Sequence {sequence_id} has no blocks to execute for run {run_id}.")
         run_obj.status = models.RunStatusEnum.COMPLETED # Or FAILED if no blocks is an error
         run_obj.completed_at = datetime.now(timezone.utc)
         db.add(run_obj)
         await db.commit()
-        await db.refresh(run_obj)
-        return run_obj
+        return await crud_run.get_by_id_and_user(db, id=run_obj.id, user_id=user_id) or run_obj
 
     overall_success = True
+    was_cancelled = False
     final_outputs_summary = {}
+    usage_tracker = RunUsageTracker(
+        token_budget=run_obj.token_budget if run_obj.token_budget is not None else settings.DEFAULT_RUN_TOKEN_BUDGET,
+        cost_budget=run_obj.cost_budget if run_obj.cost_budget is not None else settings.DEFAULT_RUN_COST_BUDGET,
+    )
 
-    for block in blocks:
-        block_run_create_schema = BlockRunCreate(
-            run_id=run_obj.id,
-            block_id=block.id,
-            status=models.RunStatusEnum.RUNNING, # Set to running before execution
-            # Snapshots can be added here or after fetching block
-        )
-        # Pydantic V2
-        db_block_run = models.BlockRun(**block_run_create_schema.model_dump())
-        # Pydantic V1
-        # db_block_run = models.BlockRun(**block_run_create_schema.dict())
-        
-        db_block_run.block_name_snapshot = block.name
-        db_block_run.block_type_snapshot = block.type.value
-        db_block_run.started_at = datetime.now(timezone.utc) # More precise start time
-        
-        db.add(db_block_run)
-        await db.flush() # Get ID for db_block_run
+    position = 0
+    while position < len(blocks):
+        if run_control.cancelled:
+            was_cancelled = True
+            break
+        # One block, or a chain of list blocks pipelined item by item (see list_pipeline)
+        stage = next_stage(blocks, position, current_context, run_control.sample_rate)
+        position += len(stage)
+        stage_block_runs = []
+        for block in stage:
+            block_run_create_schema = BlockRunCreate(
+                run_id=run_obj.id,
+                block_id=block.id,
+                status=models.RunStatusEnum.RUNNING, # Set to running before execution
+                # Snapshots can be added here or after fetching block
+            )
+            # Pydantic V2
+            db_block_run = models.BlockRun(**block_run_create_schema.model_dump())
+            # Pydantic V1
+            # db_block_run = models.BlockRun(**block_run_create_schema.dict())
+            
+            db_block_run.block_name_snapshot = block.name
+            db_block_run.block_type_snapshot = block.type.value
+            db_block_run.started_at = datetime.now(timezone.utc) # More precise start time
+            
+            db.add(db_block_run)
+            stage_block_runs.append(db_block_run)
+        with tracing.span("db_flush", block_id=stage[0].id):
+            await db.flush() # Get ID for db_block_run
         # await db.refresh(db_block_run) # Refresh to load defaults if any
 
-        logger.info(f"Executing block ID {block.id} ('{block.name}') for run ID {run_obj.id}")
+        logger.info(f"Executing block ID(s) {[block.id for block in stage]} ('{stage[0].name}'{', pipelined' if len(stage) > 1 else ''}) for run ID {run_obj.id}")
         
-        (block_output_data, rendered_prompt, llm_raw_output,
-         named_outputs_db, list_outputs_db, matrix_outputs_db, error_message) = await _execute_single_block_logic(
-            db, block, current_context, llm_model
-        )
+        stage_results = await _execute_stage(db, stage, current_context, plan, llm_model, usage_tracker, run_control)
 
-        db_block_run.prompt_text = rendered_prompt
-        db_block_run.llm_output_text = llm_raw_output
-        db_block_run.named_outputs_json = named_outputs_db
-        db_block_run.list_outputs_json = list_outputs_db
-        db_block_run.matrix_outputs_json = matrix_outputs_db
-        db_block_run.completed_at = datetime.now(timezone.utc)
-
-        if error_message:
-            db_block_run.status = models.RunStatusEnum.FAILED
-            db_block_run.error_message = error_message
-            overall_success = False
-            logger.error(f"Block ID {block.id} failed for run ID {run_obj.id}: {error_message}")
-            # Decide: stop sequence on first error, or continue?
-            # For now, let's mark overall run as failed but continue processing other blocks if desired (though context might be broken)
-            # To stop on first error:
-            # run_obj.status = models.RunStatusEnum.FAILED
-            # run_obj.completed_at = datetime.now(timezone.utc)
-            # db.add(run_obj)
-            # await db.commit() # Commit this block_run failure and run failure
-            # await db.refresh(run_obj)
-            # return run_obj # Exit early
-        else:
-            db_block_run.status = models.RunStatusEnum.COMPLETED
-            current_context.update(block_output_data) # Make outputs available for next blocks
-            # Store this block's output in the summary for the run
-            final_outputs_summary[f"block_{block.id}_{block.name.replace(' ','_')}"] = block_output_data
-            logger.info(f"Block ID {block.id} completed successfully for run ID {run_obj.id}")
+        stop = False # Every block of the stage is recorded before acting on a stop
+        for block, db_block_run, block_result in zip(stage, stage_block_runs, stage_results):
+            block_output_data = block_result.output_data
+            error_message = block_result.error_message
+
+            db_block_run.prompt_text = block_result.rendered_prompt
+            db_block_run.llm_output_text = block_result.llm_output
+            db_block_run.named_outputs_json = block_result.named_outputs
+            db_block_run.list_outputs_json = block_result.list_outputs
+            db_block_run.matrix_outputs_json = block_result.matrix_outputs
+            db_block_run.token_usage_json = block_result.token_usage_json()
+            db_block_run.cost = round(block_result.usage.cost, 6)
+            db_block_run.completed_at = datetime.now(timezone.utc)
+
+            if block_result.cancelled:
+                # Partial list/matrix results are kept on the block run; nothing further is scheduled.
+                # A run stopped by its deadline failed; one stopped by a user was cancelled.
+                db_block_run.status = models.RunStatusEnum.FAILED if run_control.deadline_exceeded else models.RunStatusEnum.CANCELLED
+                db_block_run.error_message = error_message
+                was_cancelled = True
+                logger.info(f"Block ID {block.id} cancelled for run ID {run_obj.id}")
+                stop = True
+            elif error_message:
+                db_block_run.status = models.RunStatusEnum.FAILED
+                db_block_run.error_message = error_message
+                overall_success = False
+                logger.error(f"Block ID {block.id} failed for run ID {run_obj.id}: {error_message}")
+                if usage_tracker.exceeded:
+                    # Budget exhausted: don't schedule any further blocks (their LLM calls would be refused anyway)
+                    stop = True
+                # Decide: stop sequence on first error, or continue?
+                # For now, let's mark overall run as failed but continue processing other blocks if desired (though context might be broken)
+                # To stop on first error:
+                # run_obj.status = models.RunStatusEnum.FAILED
+                # run_obj.completed_at = datetime.now(timezone.utc)
+                # db.add(run_obj)
+                # await db.commit() # Commit this block_run failure and run failure
+                # await db.refresh(run_obj)
+                # return run_obj # Exit early
+            else:
+                db_block_run.status = models.RunStatusEnum.COMPLETED
+                current_context.update(block_output_data) # Make outputs available for next blocks
+                # Store this block's output in the summary for the run
+                final_outputs_summary[f"block_{block.id}_{block.name.replace(' ','_')}"] = block_output_data
+                logger.info(f"Block ID {block.id} completed successfully for run ID {run_obj.id}")
 
         # db.add(db_block_run) # Already added, SQLAlchemy tracks changes
-        await db.flush() # Ensure this block_run is processed before next iteration
+        with tracing.span("db_flush", block_id=stage[-1].id):
+            await db.flush() # Ensure this stage's block runs are processed before the next one
+        if stop:
+            break
 
-    run_obj.status = models.RunStatusEnum.COMPLETED if overall_success else models.RunStatusEnum.FAILED
+    if was_cancelled and run_control.deadline_exceeded:
+        run_obj.status = models.RunStatusEnum.FAILED
+        final_outputs_summary["error"] = "Deadline exceeded."
+    elif was_cancelled:
+        run_obj.status = models.RunStatusEnum.CANCELLED
+        final_outputs_summary["error"] = "Run cancelled."
+    else:
+        run_obj.status = models.RunStatusEnum.COMPLETED if overall_success else models.RunStatusEnum.FAILED
     run_obj.completed_at = datetime.now(timezone.utc)
+    if usage_tracker.exceeded:
+        final_outputs_summary["error"] = usage_tracker.exceeded_reason
     run_obj.results_summary_json = final_outputs_summary # Store all collected outputs
+    run_obj.token_usage_json = usage_tracker.total.to_dict()
+    run_obj.cost = round(usage_tracker.total.cost, 6)
     
     db.add(run_obj)
-    await db.commit()
-    await db.refresh(run_obj) # Refresh to get all relationships updated if needed
+    with tracing.span("db_commit"):
+        await db.commit()
+        await db.refresh(run_obj) # Refresh to get all relationships updated if needed
     
     # Eagerly load block_runs for the response
     run_obj_with_details = await crud_run.get_by_id_and_user(db, id=run_obj.id, user_id=user_id)
@@ -313,47 +1003,80 @@ async def preview_prompt_for_block(
     Generates a preview of the prompt for a specific block.
     This requires simulating the context as it would be just before that block executes.
     """
-    target_block = await crud_block.get(db, id=block_id)
-    if not target_block or target_block.sequence_id != sequence_id:
+    plan = await get_sequence_plan(db, sequence_id)
+    target_block = plan.get_block(block_id)
+    if not target_block:
         raise ValueError("Block not found or does not belong to the sequence.")
 
     # Check if user owns the sequence (indirectly via target_block.sequence.user_id)
     # This requires loading the sequence relationship for target_block or an extra query.
     # For simplicity, assuming ownership check is done at route level.
 
-    current_context = await _gather_sequence_context(db, sequence_id, user_id, input_overrides)
+    prior_blocks = plan.blocks_before(target_block)
+    current_context = await _gather_sequence_context(
+        db, plan, user_id, input_overrides, blocks=[*prior_blocks, target_block]
+    )
     
     # Simulate execution of blocks *before* the target_block to build up context
     # This is a simplified simulation; it doesn't actually call LLMs.
     # It just resolves variable names based on *expected* output names from configs.
-    
-    prior_blocks = await db.execute(
-        select(models.Block)
-        .filter(models.Block.sequence_id == sequence_id, models.Block.order < target_block.order)
-        .order_by(models.Block.order)
-    )
-    prior_blocks = prior_blocks.scalars().all()
-
     for prev_block in prior_blocks:
-        # Simulate output based on block type and config
-        # This is a placeholder for actual output simulation logic
-        # For a true preview, you'd need to know the *names* of variables each block produces.
-        block_config = prev_block.config_json
-        if prev_block.type == models.BlockTypeEnum.STANDARD:
-            output_var_name = block_config.get("output_variable_name", f"block_{prev_block.id}_output")
-            current_context[output_var_name] = f"[Output from {prev_block.name} (ID: {prev_block.id})]"
-        elif prev_block.type == models.BlockTypeEnum.DISCRETIZATION:
-            output_names = block_config.get("output_names", [])
-            for name in output_names:
-                current_context[name] = f"[Discretized output '{name}' from {prev_block.name}]"
-        elif prev_block.type == models.BlockTypeEnum.SINGLE_LIST:
-            output_list_var_name = block_config.get("output_list_variable_name") or f"output_list_{prev_block.id}"
-            current_context[output_list_var_name] = [f"[Sample item from list output of {prev_block.name}]"]
-        elif prev_block.type == models.BlockTypeEnum.MULTI_LIST:
-            output_matrix_var_name = block_config.get("output_matrix_variable_name") or f"output_matrix_{prev_block.id}"
-            current_context[output_matrix_var_name] = [[f"[Sample item from matrix output of {prev_block.name}]"]]
-        # Add more simulation logic as needed
+        current_context.update(_simulated_block_outputs(prev_block))
+
+    preview = _render_block_preview(target_block, current_context)
+    preview["plan_errors"] = plan.errors # Static validation of the whole sequence
+    preview["plan_warnings"] = plan.warnings
+    return preview
 
+
+async def preview_prompts_for_sequence(
+    db: AsyncSession,
+    sequence_id: int,
+    user_id: int,
+    block_ids: List[int] = None,
+    input_overrides: Dict[str, Any] = None,
+    include_context: bool = False # Context snippets repeat per block and can be large
+) -> Dict[str, Any]:
+    """
+    Previews many blocks (default: all) in one forward pass over the plan: context is gathered
+    once and each block's simulated outputs are layered on as the pass advances, so previewing
+    N blocks is O(N) rather than N independent previews.
+    """
+    plan = await get_sequence_plan(db, sequence_id)
+    if block_ids is None:
+        selected_ids = {block.id for block in plan.blocks}
+    else:
+        selected_ids = set(block_ids)
+        unknown_ids = selected_ids - {block.id for block in plan.blocks}
+        if unknown_ids:
+            raise ValueError(f"Blocks not found in sequence {sequence_id}: {sorted(unknown_ids)}")
+
+    # Only blocks up to the last selected one can influence the previews
+    last_index = max((i for i, block in enumerate(plan.blocks) if block.id in selected_ids), default=-1)
+    blocks_in_pass = plan.blocks[:last_index + 1]
+
+    current_context = await _gather_sequence_context(db, plan, user_id, input_overrides, blocks=blocks_in_pass)
+    sizing = _preflight_prompt_sizes(blocks_in_pass, plan, current_context, None)
+    previews = []
+    for block in blocks_in_pass:
+        if block.id in selected_ids:
+            previews.append(_render_block_preview(block, current_context, include_context=include_context))
+        current_context.update(_simulated_block_outputs(block))
+
+    return {
+        "sequence_id": sequence_id,
+        "plan_version": plan.version,
+        "plan_errors": plan.errors,
+        "plan_warnings": plan.warnings,
+        "prompt_sizes": [size for size in sizing["sizes"] if size["block_id"] in selected_ids],
+        "prompt_size_errors": sizing["errors"],
+        "prompt_size_warnings": sizing["warnings"],
+        "previews": previews,
+    }
+
+
+def _render_block_preview(target_block: PlanBlock, current_context: Dict[str, Any], include_context: bool = True) -> Dict[str, Any]:
+    """Renders one block's prompt against a (simulated) context and reports variables it can't resolve."""
     # Now render the prompt for the target block with the simulated context
     prompt_template = target_block.config_json.get("prompt", "")
     
@@ -372,7 +1095,15 @@ async def preview_prompt_for_block(
             placeholder_name = f"item{i+1}" # Or derive from conf.get('item_placeholder', f'item{i+1}')
             preview_context_for_render[placeholder_name] = f"[SAMPLE_FROM_{conf['name']}]"
             preview_context_for_render[f"{placeholder_name}_index"] = 0
+    elif target_block.type == models.BlockTypeEnum.MAP_REDUCE:
+        # The map prompt is previewed; the reduce prompt sees the map outputs as 'partials'
+        preview_context_for_render["chunk"] = f"[SAMPLE_CHUNK_OF_{target_block.config_json.get('input_variable_name')}]"
+        preview_context_for_render["chunk_index"] = 0
+        preview_context_for_render["chunk_count"] = 1
+        preview_context_for_render["partials"] = ["[SAMPLE_PARTIAL_RESULT]"]
+        preview_context_for_render["reduce_level"] = 1
 
+    undefined_variables = sorted(target_block.referenced_variables - preview_context_for_render.keys())
 
     try:
         rendered_prompt = render_prompt(prompt_template, preview_context_for_render)
@@ -382,14 +1113,24 @@ async def preview_prompt_for_block(
         rendered_prompt = f"Unexpected error rendering prompt preview: {e}. Template: {prompt_template}"
 
 
-    return {
+    preview = {
         "block_id": target_block.id,
         "block_name": target_block.name,
         "block_type": target_block.type.value,
         "prompt_template": prompt_template,
         "rendered_prompt": rendered_prompt,
-        "context_used_for_preview": { # Show a snippet of the context
+        "estimated_prompt_tokens": estimate_tokens(rendered_prompt), # With sample items and placeholder outputs
+        "undefined_variables": undefined_variables, # Referenced but not resolvable at this point of the sequence
+    }
+    if target_block.type == models.BlockTypeEnum.MAP_REDUCE:
+        reduce_template = target_block.config_json.get("reduce_prompt", "")
+        try:
+            preview["rendered_reduce_prompt"] = render_prompt(reduce_template, preview_context_for_render)
+        except Exception as e:
+            preview["rendered_reduce_prompt"] = f"Error rendering reduce prompt preview: {e}. Template: {reduce_template}"
+    if include_context:
+        preview["context_used_for_preview"] = { # Show a snippet of the context
             k: (str(v)[:100] + '...' if isinstance(v, str) and len(v) > 100 else v) 
             for k,v in preview_context_for_render.items()
         }
-    }
+    return preview
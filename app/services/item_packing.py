@@ -0,0 +1,125 @@
+# Item packing for SINGLE_LIST blocks (config `pack_items`).
+# Instead of one LLM call per item, the block's instructions are sent once together with a pack of
+# numbered items, and the model answers with a JSON array holding one output per item. Packs are
+# sized to the input token budget and to how many item outputs fit in the response. Items whose
+# output is missing or can't be parsed are re-run with ordinary per-item calls by the engine.
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from jinja2 import nodes
+
+from app.core.config import settings
+from app.services.prompt_utils import jinja_env, render_prompt
+from app.services.token_estimate import estimate_tokens
+
+ITEM_PLACEHOLDER = "[ITEM]"
+INDEX_PLACEHOLDER = "[ITEM INDEX]"
+_ITEMS_TAG = "<items>"
+_ITEM_OVERHEAD_TOKENS = 12 # <item> wrapper plus the item's share of the JSON response scaffolding
+
+PACKED_PROMPT = """Apply the instructions below separately to each of the items that follow. \
+In the instructions, {item} stands for the content of the item being processed and {index} for its index attribute.
+
+<instructions>
+{instructions}
+</instructions>
+
+{items_tag}
+{items}
+</items>
+
+Respond with only a JSON array holding one object per item, in item order: \
+[{{"item": <item number>, "output": "<your complete response for that item>"}}, ...]"""
+
+
+def item_text(item: Any) -> str:
+    return item if isinstance(item, str) else json.dumps(item, ensure_ascii=False, default=str)
+
+
+def packed_instructions(template: str, context: Dict[str, Any]) -> Optional[str]:
+    """
+    The block's prompt rendered once with placeholders for the item, or None if the template can't be
+    shared across items: it looks inside the item (`item.field`, `item[0]`) or branches on its value.
+    """
+    parsed = jinja_env.parse(template)
+    for node in parsed.find_all((nodes.Getattr, nodes.Getitem)):
+        if isinstance(node.node, nodes.Name) and node.node.name in ("item", "item_index"):
+            return None
+    instructions = render_prompt(template, {**context, "item": ITEM_PLACEHOLDER, "item_index": INDEX_PLACEHOLDER})
+    # Rendering with other placeholders must only swap them: otherwise the item's value changes the text
+    probe = render_prompt(template, {**context, "item": "[PROBE]", "item_index": "[PROBE INDEX]"})
+    if instructions.replace(ITEM_PLACEHOLDER, "[PROBE]").replace(INDEX_PLACEHOLDER, "[PROBE INDEX]") != probe:
+        return None
+    return instructions
+
+
+def _pack_capacity(max_items: int) -> int:
+    """Items per pack allowed by the configured maximum and by the response's token limit."""
+    return max(1, min(max_items, settings.LLM_PACK_MAX_TOKENS // max(1, settings.LLM_PACK_OUTPUT_TOKENS_PER_ITEM)))
+
+
+def plan_packs(texts: Sequence[str], instructions: str, max_items: int) -> List[List[int]]:
+    """Greedy, order-preserving split of item positions into packs that fit the token budgets."""
+    input_budget = settings.LLM_PACK_MAX_INPUT_TOKENS - estimate_tokens(instructions) - estimate_tokens(PACKED_PROMPT)
+    capacity = _pack_capacity(max_items)
+    packs: List[List[int]] = []
+    current: List[int] = []
+    used = 0
+    for position, text in enumerate(texts):
+        cost = estimate_tokens(text) + _ITEM_OVERHEAD_TOKENS
+        if current and (len(current) >= capacity or used + cost > input_budget):
+            packs.append(current)
+            current, used = [], 0
+        current.append(position)
+        used += cost
+    if current:
+        packs.append(current)
+    return packs
+
+
+def render_packed_prompt(instructions: str, items: Sequence[Tuple[int, str]]) -> str:
+    """`items` are (item_index, text) pairs; they are numbered 1..n in the prompt."""
+    rendered_items = "\n".join(
+        f'<item number="{number}" index="{item_index}">\n{text}\n</item>'
+        for number, (item_index, text) in enumerate(items, start=1)
+    )
+    return PACKED_PROMPT.format(
+        item=ITEM_PLACEHOLDER, index=INDEX_PLACEHOLDER, instructions=instructions, items_tag=_ITEMS_TAG, items=rendered_items
+    )
+
+
+def shared_prefix_chars(packed_prompt: str) -> int:
+    """Length of the part of a packed prompt that every pack of the block shares (up to the items)."""
+    return packed_prompt.index(_ITEMS_TAG) + len(_ITEMS_TAG)
+
+
+def parse_packed_response(text: str, count: int) -> List[Optional[str]]:
+    """Per-item outputs from a packed response; None for items that are missing, duplicated or malformed."""
+    outputs: List[Optional[str]] = [None] * count
+    start, end = text.find("["), text.rfind("]")
+    if start == -1 or end < start:
+        return outputs
+    try:
+        data = json.loads(text[start:end + 1])
+    except ValueError:
+        return outputs
+    if not isinstance(data, list):
+        return outputs
+    seen = set()
+    for entry in data:
+        if not isinstance(entry, dict):
+            continue
+        number, output = entry.get("item"), entry.get("output")
+        if not isinstance(number, int) or isinstance(number, bool) or not 1 <= number <= count or output is None:
+            continue
+        if number in seen: # Ambiguous: re-run the item on its own
+            outputs[number - 1] = None
+            continue
+        seen.add(number)
+        outputs[number - 1] = output if isinstance(output, str) else json.dumps(output, ensure_ascii=False)
+    return outputs
+
+
+def expected_pack_count(item_count: int, max_items: int) -> int:
+    """Calls a packed block is expected to make, assuming packs are limited by item count rather than tokens."""
+    return -(-item_count // _pack_capacity(max_items))
@@ -0,0 +1,208 @@
+# Streaming bulk import of global list items.
+# Uploads are parsed incrementally from the request body and written with batched
+# multi-row INSERTs inside a single transaction, so a 20k-row list is one request
+# and one commit instead of 20k of each.
+import codecs
+import csv
+import enum
+import json
+import logging
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.crud import crud_global_list
+
+logger = logging.getLogger(__name__)
+
+class ListImportFormat(str, enum.Enum):
+    TEXT = "text"     # One item per line, blank lines skipped
+    NDJSON = "ndjson" # One JSON value per line: a string, or an object with a "value" key
+    CSV = "csv"       # One item per row, taken from the selected column
+
+class ListImportMode(str, enum.Enum):
+    APPEND = "append"   # Keep existing items, new items are ordered after them
+    REPLACE = "replace" # Delete existing items first (same transaction)
+
+class ListImportError(ValueError):
+    """Raised for malformed upload content. Carries the 1-based line number when known."""
+    def __init__(self, message: str, line_number: Optional[int] = None):
+        self.line_number = line_number
+        super().__init__(f"Line {line_number}: {message}" if line_number else message)
+
+
+def format_from_content_type(content_type: Optional[str]) -> ListImportFormat:
+    """Best-effort format detection when the caller doesn't pass one explicitly."""
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type in ("text/csv", "application/csv"):
+        return ListImportFormat.CSV
+    if media_type in ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/json-seq"):
+        return ListImportFormat.NDJSON
+    return ListImportFormat.TEXT
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decodes a byte stream incrementally and yields complete lines without their terminators."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    try:
+        async for chunk in chunks:
+            pending += decoder.decode(chunk)
+            *lines, pending = pending.split("\n")
+            for line in lines:
+                yield line.rstrip("\r")
+        pending += decoder.decode(b"", final=True)
+    except UnicodeDecodeError as e:
+        raise ListImportError(f"Upload is not valid UTF-8: {e}")
+    if pending:
+        yield pending.rstrip("\r")
+
+
+def _value_from_ndjson(line: str, line_number: int) -> Optional[str]:
+    try:
+        data = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise ListImportError(f"Invalid JSON: {e.msg}", line_number)
+    if isinstance(data, dict):
+        if "value" not in data:
+            raise ListImportError("JSON object is missing a 'value' key", line_number)
+        data = data["value"]
+    if data is None:
+        return None
+    return data if isinstance(data, str) else json.dumps(data)
+
+
+class _NeedMoreInput(Exception):
+    """The CSV record being parsed continues past the lines read so far."""
+
+
+def _lines_then_pause(lines: List[str]) -> Iterator[str]:
+    yield from lines
+    raise _NeedMoreInput
+
+
+def _parse_csv_record(lines: List[str], line_number: int) -> Optional[List[str]]:
+    """
+    Parses the record starting at lines[0] with the csv module itself (lines keep their terminators, so
+    quoted newlines survive); None if a quoted field is still open at the end of the last line.
+    """
+    try:
+        return next(csv.reader(_lines_then_pause(lines), strict=True))
+    except _NeedMoreInput:
+        return None
+    except csv.Error as e:
+        raise ListImportError(f"Invalid CSV: {e}", line_number)
+
+
+async def iter_item_values(
+    chunks: AsyncIterator[bytes],
+    fmt: ListImportFormat,
+    csv_column: Optional[str] = None,
+    csv_has_header: bool = False,
+) -> AsyncIterator[str]:
+    """
+    Yields item values parsed incrementally from an uploaded byte stream.
+    For CSV, `csv_column` is a header name (requires csv_has_header) or a 0-based index; defaults to the first column.
+    """
+    column_index: Optional[int] = None
+    if fmt == ListImportFormat.CSV and csv_column is not None and not csv_has_header:
+        if not csv_column.isdigit():
+            raise ListImportError("csv_column must be a 0-based index unless csv_has_header is set.")
+        column_index = int(csv_column)
+
+    line_number = 0
+    csv_lines: List[str] = [] # Physical lines of the CSV record being read (several for quoted multi-line fields)
+    csv_record_start = 0
+    header_pending = fmt == ListImportFormat.CSV and csv_has_header
+
+    async for line in iter_lines(chunks):
+        line_number += 1
+
+        if fmt == ListImportFormat.TEXT:
+            if line.strip():
+                yield line
+            continue
+
+        if fmt == ListImportFormat.NDJSON:
+            if line.strip():
+                value = _value_from_ndjson(line, line_number)
+                if value is not None:
+                    yield value
+            continue
+
+        # CSV: the csv module decides whether the record goes on (an open quoted field) or is complete
+        if not csv_lines:
+            csv_record_start = line_number
+        csv_lines.append(line + "\n")
+        fields = _parse_csv_record(csv_lines, csv_record_start)
+        if fields is None:
+            continue
+        record_lines, csv_lines = csv_lines, []
+        if not "".join(record_lines).strip(): # Blank line
+            continue
+        if header_pending:
+            header_pending = False
+            if csv_column is None:
+                column_index = 0
+            elif csv_column in fields:
+                column_index = fields.index(csv_column)
+            elif csv_column.isdigit():
+                column_index = int(csv_column)
+            else:
+                raise ListImportError(f"Column '{csv_column}' not found in CSV header", csv_record_start)
+            continue
+        idx = column_index or 0
+        if idx >= len(fields):
+            raise ListImportError(f"Row has no column {idx}", csv_record_start)
+        yield fields[idx]
+
+    if csv_lines:
+        raise ListImportError("Unterminated quoted CSV field", csv_record_start)
+
+
+async def import_list_items(
+    db: AsyncSession,
+    *,
+    global_list_id: int,
+    chunks: AsyncIterator[bytes],
+    fmt: ListImportFormat,
+    mode: ListImportMode = ListImportMode.APPEND,
+    csv_column: Optional[str] = None,
+    csv_has_header: bool = False,
+    batch_size: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Streams parsed values into the list in batched INSERTs and commits once at the end.
+    Any parse or DB error rolls the whole import back, so a failed upload leaves the list untouched.
+    """
+    batch_size = batch_size or settings.GLOBAL_LIST_IMPORT_BATCH_SIZE
+    imported = 0
+    try:
+        if mode == ListImportMode.REPLACE:
+            await crud_global_list.remove_all_items(db, global_list_id=global_list_id)
+            next_order = 0
+        else:
+            max_order = await crud_global_list.get_max_item_order(db, global_list_id=global_list_id)
+            next_order = 0 if max_order is None else max_order + 1
+
+        batch: List[str] = []
+        async for value in iter_item_values(chunks, fmt, csv_column=csv_column, csv_has_header=csv_has_header):
+            batch.append(value)
+            if len(batch) >= batch_size:
+                await crud_global_list.bulk_insert_items(db, global_list_id=global_list_id, values=batch, start_order=next_order)
+                next_order += len(batch)
+                imported += len(batch)
+                batch = []
+        if batch:
+            await crud_global_list.bulk_insert_items(db, global_list_id=global_list_id, values=batch, start_order=next_order)
+            imported += len(batch)
+
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    total = await crud_global_list.count_items(db, global_list_id=global_list_id)
+    logger.info(f"Imported {imported} items into global list {global_list_id} (mode={mode.value}, format={fmt.value}).")
+    return {"global_list_id": global_list_id, "mode": mode, "format": fmt, "imported_count": imported, "total_count": total}
@@ -0,0 +1,86 @@
+# Pipelined execution of chained SINGLE_LIST blocks.
+# When a list block iterates the output list of the block right before it, the two don't need to meet
+# at the block boundary: item i of the downstream block only needs item i of the upstream output. Such
+# a chain runs as one stage, with every upstream block publishing its items into a StreamingList that
+# its downstream block reads item by item, so a 3-block per-item chain overlaps instead of waiting
+# for the slowest item of each block in turn.
+import asyncio
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.db import models
+from app.services.prompt_utils import get_template_variables
+from app.services.sequence_plan import PlanBlock
+
+
+class UpstreamItemError(Exception):
+    """Raised to a downstream block for an item its upstream block stopped without producing."""
+
+
+class StreamingList:
+    """A list variable whose items become available one by one while the block producing it still runs."""
+
+    def __init__(self, length: int):
+        loop = asyncio.get_running_loop()
+        self._items: List[asyncio.Future] = [loop.create_future() for _ in range(length)]
+        self._stopped: Optional[str] = None # Why the producer stopped before producing every item
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def set(self, index: int, value: Any) -> None:
+        if not self._items[index].done():
+            self._items[index].set_result(value)
+
+    def close(self, reason: str) -> None:
+        """
+        Fails every item not produced yet: the producing block has finished or an item of it failed.
+        Readers then stop starting new items, as the block would never have run sequentially.
+        """
+        for future in self._items:
+            if not future.done():
+                self._stopped = self._stopped or reason
+                future.set_exception(UpstreamItemError(reason))
+                future.exception() # Readers that never ask for it mustn't log it as unretrieved
+
+    async def get(self, index: int) -> Any:
+        if self._stopped is not None:
+            raise UpstreamItemError(self._stopped)
+        # Shielded: a reader being cancelled must not cancel the item for other readers
+        return await asyncio.shield(self._items[index])
+
+
+def _streams_into(upstream_blocks: Sequence[PlanBlock], block: PlanBlock) -> bool:
+    """Whether `block` can consume the output of the last of `upstream_blocks` item by item."""
+    upstream = upstream_blocks[-1]
+    if block.type != models.BlockTypeEnum.SINGLE_LIST or upstream.type != models.BlockTypeEnum.SINGLE_LIST:
+        return False
+    if block.config_json.get("pack_items") or upstream.config_json.get("pack_items"): # Packs need whole lists
+        return False
+    streamed = upstream.produced_variables[0]
+    if block.config_json.get("input_list_variable_name") != streamed:
+        return False
+    # Outputs of the stage only exist item by item while it runs: the block may read them only as {{item}}
+    stage_outputs = {name for b in upstream_blocks for name in b.produced_variables}
+    return not (block.referenced_variables - {streamed}) & stage_outputs \
+        and streamed not in get_template_variables(block.config_json.get("prompt") or "")
+
+
+def next_stage(blocks: Sequence[PlanBlock], start: int, context: Dict[str, Any], sample_rate: float) -> Tuple[PlanBlock, ...]:
+    """
+    The blocks to execute together from blocks[start]: just that block, or the longest chain of list
+    blocks each iterating the previous one's output. Sampled runs aren't pipelined: sampling re-indexes lists.
+    """
+    stage = [blocks[start]]
+    first = blocks[start]
+    if (
+        not settings.RUN_PIPELINE_LIST_BLOCKS or sample_rate < 1
+        or first.type != models.BlockTypeEnum.SINGLE_LIST
+        or not isinstance(context.get(first.config_json.get("input_list_variable_name")), list)
+    ):
+        return tuple(stage)
+    for block in blocks[start + 1:]:
+        if not _streams_into(stage, block):
+            break
+        stage.append(block)
+    return tuple(stage)
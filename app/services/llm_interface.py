@@ -1,10 +1,39 @@
 import httpx
+import time
+from dataclasses import dataclass
 from app.core.config import settings
+from app.core import metrics
 import logging
 
 logger = logging.getLogger(__name__)
 
-async def call_claude_api(prompt: str, model: str = "claude-3-opus-20240229", max_tokens: int = 2048) -> str:
+class LLMOverloadedError(Exception):
+    """The API refused the call for capacity reasons (rate limited or overloaded); another model may succeed."""
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+OVERLOAD_STATUS_CODES = (429, 503, 529)
+
+
+@dataclass
+class LLMResponse:
+    text: str
+    model: str # Model that actually served the request, as reported by the API
+    input_tokens: int = 0
+    output_tokens: int = 0 # input_tokens excludes the cache_* tokens below
+    cache_creation_input_tokens: int = 0 # Prompt prefix written to the provider's prompt cache
+    cache_read_input_tokens: int = 0 # Prompt prefix served from the cache
+    stop_reason: str | None = None
+
+async def call_claude_api(
+    prompt: str,
+    model: str = settings.DEFAULT_LLM_MODEL,
+    max_tokens: int = settings.DEFAULT_LLM_MAX_TOKENS,
+    block_type: str = "unknown", # Metrics label only
+    cache_prefix_chars: int = 0, # Leading characters of `prompt` to mark for provider prompt caching (0 = none)
+) -> LLMResponse:
     if not settings.CLAUDE_API_KEY:
         logger.error("CLAUDE_API_KEY is not configured.")
         raise ValueError("CLAUDE_API_KEY is not configured in the environment.")
@@ -14,10 +43,18 @@ async def call_claude_api(prompt: str, model: str = "claude-3-opus-20240229", ma
         "anthropic-version": "2023-06-01", # Check for latest recommended version
         "content-type": "application/json"
     }
+    if 0 < cache_prefix_chars < len(prompt):
+        # Cache breakpoint after the shared prefix; the suffix (the item) is billed as ordinary input
+        content = [
+            {"type": "text", "text": prompt[:cache_prefix_chars], "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": prompt[cache_prefix_chars:]},
+        ]
+    else:
+        content = prompt
     payload = {
         "model": model,
         "max_tokens": max_tokens,
-        "messages": [{"role": "user", "content": prompt}]
+        "messages": [{"role": "user", "content": content}]
         # Add system prompt support if needed:
         # "system": "Your system prompt here",
     }
@@ -26,9 +63,11 @@ async def call_claude_api(prompt: str, model: str = "claude-3-opus-20240229", ma
     # logger.debug(f"Prompt: {prompt[:500]}...") # Log a snippet of the prompt
 
     async with httpx.AsyncClient() as client:
+        metrics.LLM_CALLS_IN_FLIGHT.inc()
+        start = time.perf_counter()
         try:
             response = await client.post(
-                "https://api.anthropic.com/v1/messages", 
+                settings.CLAUDE_API_URL,
                 json=payload, 
                 headers=headers, 
                 timeout=90.0 # Increased timeout for potentially long LLM responses
@@ -39,19 +78,41 @@ async def call_claude_api(prompt: str, model: str = "claude-3-opus-20240229", ma
             # Expected response structure: {"content": [{"type": "text", "text": "..."}]}
             if response_data.get("content") and isinstance(response_data["content"], list) and len(response_data["content"]) > 0:
                 if response_data["content"][0].get("type") == "text":
-                    return response_data["content"][0]["text"]
+                    usage = response_data.get("usage") or {}
+                    llm_response = LLMResponse(
+                        text=response_data["content"][0]["text"],
+                        model=response_data.get("model") or model,
+                        input_tokens=usage.get("input_tokens") or 0,
+                        output_tokens=usage.get("output_tokens") or 0,
+                        cache_creation_input_tokens=usage.get("cache_creation_input_tokens") or 0,
+                        cache_read_input_tokens=usage.get("cache_read_input_tokens") or 0,
+                        stop_reason=response_data.get("stop_reason"),
+                    )
+                    metrics.LLM_CALL_LATENCY.labels(model=model, block_type=block_type).observe(time.perf_counter() - start)
+                    metrics.LLM_TOKENS.labels(model=model, direction="input").inc(llm_response.input_tokens)
+                    metrics.LLM_TOKENS.labels(model=model, direction="output").inc(llm_response.output_tokens)
+                    metrics.LLM_TOKENS.labels(model=model, direction="cache_write").inc(llm_response.cache_creation_input_tokens)
+                    metrics.LLM_TOKENS.labels(model=model, direction="cache_read").inc(llm_response.cache_read_input_tokens)
+                    return llm_response
             
             logger.error(f"Unexpected Claude API response format: {response_data}")
+            metrics.LLM_ERRORS.labels(model=model, error="bad_response").inc()
             raise Exception("Unexpected Claude API response format.")
 
         except httpx.HTTPStatusError as e:
+            metrics.LLM_ERRORS.labels(model=model, error=f"http_{e.response.status_code}").inc()
             error_details = e.response.text
             logger.error(f"Claude API request failed with status {e.response.status_code}: {error_details}")
             # You might want to parse the error response from Claude for more specific details
+            if e.response.status_code in OVERLOAD_STATUS_CODES:
+                raise LLMOverloadedError(f"LLM API overloaded: {e.response.status_code} - {error_details}", e.response.status_code)
             raise Exception(f"LLM API request failed: {e.response.status_code} - {error_details}")
         except httpx.RequestError as e: # Handles network errors, timeouts etc.
+            metrics.LLM_ERRORS.labels(model=model, error=type(e).__name__).inc()
             logger.error(f"Claude API request error: {e}")
             raise Exception(f"LLM API request error: {e}")
         except Exception as e:
             logger.error(f"An unexpected error occurred calling Claude API: {e}")
             raise Exception(f"An unexpected error occurred calling LLM API: {e}")
+        finally:
+            metrics.LLM_CALLS_IN_FLIGHT.dec()
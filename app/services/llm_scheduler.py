@@ -0,0 +1,219 @@
+# Fair scheduling of LLM calls.
+# All engine LLM calls take a slot from one process-wide scheduler before calling the API.
+# Slots are granted by weighted fair queuing (start-time fair queuing on virtual time) at two
+# levels: across users, then across the runs of the chosen user. A user flooding the queue with
+# matrix cells therefore gets one share, not every slot, and a small run queued behind it is
+# served at the next free slot. Requests carry a weight from the run's priority, with a boost for
+# interactive and short runs, so their calls advance virtual time more slowly and are picked more often.
+# With LLM_TOKENS_PER_MINUTE set, a call is also only started while the tokens reserved over the last
+# minute (estimated prompt + max_tokens, corrected to actual usage once the call returns) leave room for it.
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+import logging
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core import metrics
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _RunQueue:
+    vtime: float = 0.0
+    waiters: Deque[Tuple[asyncio.Future, float, int]] = field(default_factory=deque) # (future, weight, tokens)
+
+
+@dataclass
+class _UserQueue:
+    vtime: float = 0.0
+    run_clock: float = 0.0 # Virtual time of the last run dispatched for this user
+    in_flight: int = 0
+    runs: Dict[int, _RunQueue] = field(default_factory=dict)
+
+    @property
+    def backlogged(self) -> bool:
+        return any(run.waiters for run in self.runs.values())
+
+
+class _Reservation:
+    """Tokens counted against the per-minute budget until `expires_at` (loop time)."""
+    __slots__ = ("expires_at", "tokens")
+
+    def __init__(self, expires_at: float, tokens: int):
+        self.expires_at = expires_at
+        self.tokens = tokens
+
+
+class SlotGrant:
+    """Yielded by LLMScheduler.slot(); report the call's actual token usage through it."""
+
+    def __init__(self, scheduler: "LLMScheduler", reservation: Optional[_Reservation]):
+        self._scheduler = scheduler
+        self._reservation = reservation
+
+    def record_usage(self, tokens: int) -> None:
+        if self._reservation is not None:
+            self._scheduler._window_tokens += tokens - self._reservation.tokens
+            self._reservation.tokens = tokens
+
+
+class LLMScheduler:
+    def __init__(self, max_concurrency: int, per_user_max_concurrency: int = 0, tokens_per_minute: int = 0):
+        self.max_concurrency = max_concurrency
+        self.per_user_max_concurrency = per_user_max_concurrency # 0 = only the global limit applies
+        self.tokens_per_minute = tokens_per_minute # 0 = no token budget
+        self._in_flight = 0
+        self._clock = 0.0 # Virtual time of the last user dispatched
+        self._users: Dict[int, _UserQueue] = {}
+        self._window: Deque[_Reservation] = deque() # Reservations of the last minute, oldest first
+        self._window_tokens = 0
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def reset(self) -> None:
+        """Forgets all fairness and token-budget history. Only valid while no call is waiting or in flight."""
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+        self.__init__(self.max_concurrency, self.per_user_max_concurrency, self.tokens_per_minute)
+
+    def _enqueue(self, user_id: int, run_id: int, weight: float, tokens: int) -> asyncio.Future:
+        user = self._users.get(user_id)
+        if user is None:
+            user = self._users[user_id] = _UserQueue(vtime=self._clock, run_clock=0.0)
+        elif not user.backlogged:
+            user.vtime = max(user.vtime, self._clock) # Idle users can't bank credit
+        run = user.runs.get(run_id)
+        if run is None:
+            run = user.runs[run_id] = _RunQueue(vtime=user.run_clock)
+        elif not run.waiters:
+            run.vtime = max(run.vtime, user.run_clock)
+        future = asyncio.get_running_loop().create_future()
+        run.waiters.append((future, weight, tokens))
+        metrics.LLM_CALLS_QUEUED.inc()
+        return future
+
+    def _user_eligible(self, user: _UserQueue) -> bool:
+        if self.per_user_max_concurrency and user.in_flight >= self.per_user_max_concurrency:
+            return False
+        return user.backlogged
+
+    def _reserve(self, tokens: int) -> Optional[_Reservation]:
+        """Reserves `tokens` of the per-minute budget, or returns None (and arranges a retry) if they don't fit yet."""
+        now = asyncio.get_running_loop().time()
+        while self._window and self._window[0].expires_at <= now:
+            self._window_tokens -= self._window.popleft().tokens
+        # A call larger than the whole budget still runs once nothing else is counted
+        if self._window and self._window_tokens + tokens > self.tokens_per_minute:
+            if self._wakeup is None:
+                self._wakeup = asyncio.get_running_loop().call_at(self._window[0].expires_at, self._wake)
+            return None
+        reservation = _Reservation(now + 60.0, tokens)
+        self._window.append(reservation)
+        self._window_tokens += tokens
+        return reservation
+
+    def _wake(self) -> None:
+        self._wakeup = None
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self._in_flight < self.max_concurrency:
+            candidates = [(user.vtime, user_id) for user_id, user in self._users.items() if self._user_eligible(user)]
+            if not candidates:
+                return
+            _, user_id = min(candidates)
+            user = self._users[user_id]
+            run_vtime, run_id = min((run.vtime, run_id) for run_id, run in user.runs.items() if run.waiters)
+            run = user.runs[run_id]
+            future, weight, tokens = run.waiters[0]
+            if future.done(): # Waiter was cancelled while queued
+                run.waiters.popleft()
+                metrics.LLM_CALLS_QUEUED.dec()
+                continue
+            reservation = None
+            if self.tokens_per_minute:
+                reservation = self._reserve(tokens)
+                if reservation is None:
+                    return # The fair choice waits for budget; nothing jumps ahead of it
+            run.waiters.popleft()
+            metrics.LLM_CALLS_QUEUED.dec()
+            future.set_result(reservation)
+            cost = 1.0 / weight
+            self._clock = max(self._clock, user.vtime)
+            user.run_clock = max(user.run_clock, run_vtime)
+            user.vtime += cost
+            run.vtime += cost
+            user.in_flight += 1
+            self._in_flight += 1
+
+    def _release(self, user_id: int, run_id: int) -> None:
+        self._in_flight -= 1
+        user = self._users[user_id]
+        user.in_flight -= 1
+        run = user.runs.get(run_id)
+        if run is not None and not run.waiters:
+            del user.runs[run_id]
+        if not user.runs and not user.in_flight:
+            del self._users[user_id]
+        self._dispatch()
+
+    def _abandon(self, user_id: int, run_id: int, future: asyncio.Future) -> None:
+        user = self._users.get(user_id)
+        run = user.runs.get(run_id) if user else None
+        if run is None:
+            return
+        for waiter in run.waiters:
+            if waiter[0] is future:
+                run.waiters.remove(waiter)
+                metrics.LLM_CALLS_QUEUED.dec()
+                break
+        if not run.waiters:
+            del user.runs[run_id]
+        if not user.runs and not user.in_flight:
+            del self._users[user_id]
+
+    @asynccontextmanager
+    async def slot(self, *, user_id: int, run_id: int, weight: float = 1.0, tokens: int = 0) -> AsyncIterator[SlotGrant]:
+        """
+        Waits for a fair share of LLM concurrency (and `tokens` of the per-minute budget, an estimate of
+        prompt + max_tokens). Cancelling a waiting caller leaves the queue cleanly.
+        """
+        future = self._enqueue(user_id, run_id, weight, tokens)
+        self._dispatch()
+        try:
+            reservation = await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                SlotGrant(self, future.result()).record_usage(0) # Granted just as we were cancelled: nothing was sent
+                self._release(user_id, run_id)
+            else:
+                future.cancel()
+                self._abandon(user_id, run_id, future)
+            raise
+        try:
+            yield SlotGrant(self, reservation)
+        finally:
+            self._release(user_id, run_id)
+
+
+def run_weight(*, interactive: bool, expected_calls: Optional[int], priority: int = 0) -> float:
+    """Scheduling weight of a run's LLM calls: scaled by priority and boosted for interactive and short runs."""
+    weight = 2 ** (priority / settings.LLM_PRIORITY_DOUBLING)
+    if interactive:
+        weight *= settings.LLM_INTERACTIVE_WEIGHT
+    if expected_calls is not None and expected_calls <= settings.LLM_SHORT_RUN_MAX_CALLS:
+        weight *= settings.LLM_SHORT_RUN_WEIGHT
+    return weight
+
+
+llm_scheduler = LLMScheduler(
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    per_user_max_concurrency=settings.LLM_PER_USER_MAX_CONCURRENCY,
+    tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE,
+)
@@ -1,8 +1,13 @@
-from jinja2 import Environment, select_autoescape, meta, UndefinedError
+from jinja2 import Environment, Template, select_autoescape, meta, UndefinedError
+from functools import lru_cache
 import json
-from typing import Dict, Any, List, Set
+import os
+import time
+from typing import Dict, Any, Iterable, List, Set
 import logging
 
+from app.core import metrics
+
 logger = logging.getLogger(__name__)
 
 # Initialize Jinja2 environment
@@ -23,10 +28,31 @@ def get_template_variables(template_string: str) -> Set[str]:
         logger.error(f"Error parsing template to find variables: {e}")
         return set()
 
+def get_block_referenced_variables(config: Dict[str, Any]) -> Set[str]:
+    """
+    Names a block reads from the execution context: variables used in its prompt templates
+    plus any input list or text names from its configuration.
+    """
+    referenced = set(get_template_variables(config.get("prompt") or ""))
+    referenced |= get_template_variables(config.get("reduce_prompt") or "")
+    for key in ("input_list_variable_name", "input_variable_name"):
+        if config.get(key):
+            referenced.add(config[key])
+    for list_conf in config.get("input_lists_config") or []:
+        if isinstance(list_conf, dict) and list_conf.get("name"):
+            referenced.add(list_conf["name"])
+    return referenced
+
+@lru_cache(maxsize=1024)
+def compile_prompt(template_string: str) -> Template:
+    """Compiles a prompt template once; identical template strings share the compiled Template."""
+    return jinja_env.from_string(template_string)
+
 def render_prompt(template_string: str, context: Dict[str, Any]) -> str:
     """Renders a prompt template with the given context."""
+    start = time.perf_counter()
     try:
-        template = jinja_env.from_string(template_string)
+        template = compile_prompt(template_string)
         return template.render(context)
     except UndefinedError as e:
         logger.warning(f"Undefined variable in prompt template: {e.message}. Template: '{template_string[:100]}...' Context keys: {list(context.keys())}")
@@ -35,6 +61,19 @@ def render_prompt(template_string: str, context: Dict[str, Any]) -> str:
     except Exception as e:
         logger.error(f"Error rendering prompt template: {e}")
         raise
+    finally:
+        metrics.TEMPLATE_RENDER_SECONDS.observe(time.perf_counter() - start)
+
+def static_prefix(template_string: str, context: Dict[str, Any], loop_variables: Iterable[str]) -> str:
+    """
+    The leading text the template renders identically for every value of `loop_variables` (e.g. the
+    instructions before the first {{item}}): the common prefix of two renders with different probe values.
+    """
+    loop_variables = list(loop_variables)
+    # Probes differ in their first character, so the common prefix ends exactly where a loop variable is used
+    first = render_prompt(template_string, {**context, **{name: f"<<{name}>>" for name in loop_variables}})
+    second = render_prompt(template_string, {**context, **{name: f"[[{name}]]" for name in loop_variables}})
+    return os.path.commonprefix([first, second])
 
 def discretize_output(llm_output: str, output_names: List[str]) -> Dict[str, str]:
     """
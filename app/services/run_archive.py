@@ -0,0 +1,134 @@
+# Cold storage for run history.
+# Finished runs past the retention settings are moved out of the database: each archive pass appends
+# their RunRead bodies to a new append-only NDJSON file in RUN_ARCHIVE_DIR, one compressed frame per
+# run (zstd, or gzip when the optional zstandard package is missing), and leaves only a stub Run row
+# holding the frame's file, offset and length. Concatenated frames are still one valid .zst/.gz
+# stream, and a single run is read back with one seek and one small decompression. Files are
+# fsynced before the database commit: a crash in between leaves unreferenced frames, never a stub
+# pointing at nothing.
+import asyncio
+import gzip
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from app.core import serialization
+from app.core.config import settings
+from app.crud.crud_run import run as crud_run
+from app.db import models
+from app.db.session import AsyncSessionLocal
+from app.schemas.run import RunRead
+from app.services.run_response import TERMINAL_STATUSES, body_etag
+
+try:
+    import zstandard
+except ImportError: # pragma: no cover - optional dependency
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+ZSTD_SUFFIX = ".ndjson.zst"
+GZIP_SUFFIX = ".ndjson.gz"
+_ZSTD_LEVEL = 10 # Written once, read rarely: favour ratio over speed
+
+
+class RunArchiveError(Exception):
+    """Raised when an archived run can't be read back (file missing, or zstandard not installed)."""
+
+
+def _compress(data: bytes) -> bytes:
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=_ZSTD_LEVEL).compress(data)
+    return gzip.compress(data, mtime=0)
+
+
+def _decompress(frame: bytes, file_name: str) -> bytes:
+    if file_name.endswith(GZIP_SUFFIX):
+        return gzip.decompress(frame)
+    if zstandard is None:
+        raise RunArchiveError(f"Reading {file_name} needs the zstandard package.")
+    return zstandard.ZstdDecompressor().decompress(frame)
+
+
+def _write_frames(handle: BinaryIO, frames: List[bytes]) -> List[Tuple[int, int]]:
+    """Appends frames and makes them durable; returns the (offset, length) of each."""
+    positions = []
+    for frame in frames:
+        positions.append((handle.tell(), len(frame)))
+        handle.write(frame)
+    handle.flush()
+    os.fsync(handle.fileno())
+    return positions
+
+
+def _read_frame(file_name: str, offset: int, length: int) -> bytes:
+    try:
+        with open(os.path.join(settings.RUN_ARCHIVE_DIR, file_name), "rb") as handle:
+            handle.seek(offset)
+            frame = handle.read(length)
+    except OSError as e:
+        raise RunArchiveError(f"Archive file {file_name} is unavailable: {e}") from e
+    if len(frame) != length:
+        raise RunArchiveError(f"Archive file {file_name} is truncated.")
+    return _decompress(frame, file_name).rstrip(b"\n")
+
+
+async def read_run(run: models.Run) -> bytes:
+    """The RunRead body of an archived run."""
+    return await asyncio.to_thread(_read_frame, run.archive_path, run.archive_offset, run.archive_length)
+
+
+async def archive_runs(
+    older_than_days: Optional[float] = None, keep_last: Optional[int] = None, batch_size: Optional[int] = None
+) -> Dict[str, int]:
+    """
+    One archive pass (settings supply unset arguments). Writes a new file if anything is archived and
+    returns {"runs": archived, "bytes": compressed size}.
+    """
+    older_than_days = settings.RUN_ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    keep_last = settings.RUN_ARCHIVE_KEEP_LAST if keep_last is None else keep_last
+    batch_size = batch_size or settings.RUN_ARCHIVE_BATCH_SIZE
+    now = datetime.now(timezone.utc)
+    completed_before = now - timedelta(days=older_than_days) if older_than_days > 0 else None
+    totals = {"runs": 0, "bytes": 0}
+    if completed_before is None and keep_last <= 0:
+        return totals
+
+    handle: Optional[BinaryIO] = None
+    file_name = ""
+    try:
+        async with AsyncSessionLocal() as db:
+            while True:
+                ids = await crud_run.get_ids_to_archive(
+                    db, statuses=TERMINAL_STATUSES, completed_before=completed_before, keep_last=keep_last, limit=batch_size
+                )
+                if not ids:
+                    break
+                runs = await crud_run.get_many_with_block_runs(db, ids=ids)
+                bodies = [
+                    serialization.model_bytes(RunRead.model_validate(run).model_copy(update={"archived_at": now}))
+                    for run in runs
+                ]
+                frames = [_compress(body + b"\n") for body in bodies]
+                if handle is None:
+                    os.makedirs(settings.RUN_ARCHIVE_DIR, exist_ok=True)
+                    suffix = ZSTD_SUFFIX if zstandard is not None else GZIP_SUFFIX
+                    file_name = f"runs-{now.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}{suffix}"
+                    handle = open(os.path.join(settings.RUN_ARCHIVE_DIR, file_name), "ab")
+                positions = await asyncio.to_thread(_write_frames, handle, frames)
+
+                for run, body, (offset, length) in zip(runs, bodies, positions):
+                    await crud_run.mark_archived(
+                        db, run_id=run.id, archived_at=now, path=file_name, offset=offset, length=length, etag=body_etag(body)
+                    )
+                await db.commit()
+                db.expunge_all() # Archived block runs carry large JSON columns: don't keep them in the identity map
+                totals["runs"] += len(runs)
+                totals["bytes"] += sum(length for _, length in positions)
+                logger.info(f"Archived {totals['runs']} run(s) to {file_name} so far.")
+    finally:
+        if handle is not None:
+            handle.close()
+    return totals
@@ -0,0 +1,118 @@
+# Cancellation of executing runs.
+# Each executing run registers a RunControl in this process. POST /runs/{id}/cancel records
+# Run.cancel_requested_at and signals the local RunControl directly; runs executing in another
+# worker process pick the request up by polling that column. Cancelling stops new LLM calls from
+# starting and cancels the ones in flight, so their connections (and any concurrency slot they
+# hold) are released immediately instead of when the model finishes.
+import asyncio
+from contextlib import asynccontextmanager
+import logging
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Dict, Optional, Set, TypeVar
+
+from app.core.config import settings
+from app.crud.crud_run import run as crud_run
+from app.services.run_estimate import seconds_until
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class RunCancelledError(Exception):
+    """Raised inside the engine once its run has been cancelled."""
+
+
+class RunControl:
+    def __init__(self, run_id: int, user_id: int):
+        self.run_id = run_id
+        self.user_id = user_id
+        self.scheduling_weight = 1.0 # Set by the engine once it knows the run's size (see llm_scheduler.run_weight)
+        self.sample_rate = 1.0 # Fraction of list items (matrix rows) to execute, < 1 when degraded to meet a deadline
+        self.cancel_reason: Optional[str] = None
+        self.deadline_exceeded = False
+        self._cancelled = asyncio.Event()
+        self._in_flight: Set[asyncio.Task] = set()
+        self._deadline_timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self, reason: Optional[str] = None) -> None:
+        if self.cancelled:
+            return
+        self.cancel_reason = reason or f"Run {self.run_id} was cancelled."
+        logger.info(f"Cancelling run {self.run_id} ({len(self._in_flight)} LLM call(s) in flight): {self.cancel_reason}")
+        self._cancelled.set()
+        for task in list(self._in_flight):
+            task.cancel()
+
+    def raise_if_cancelled(self) -> None:
+        if self.cancelled:
+            raise RunCancelledError(self.cancel_reason)
+
+    def set_deadline(self, deadline: datetime) -> None:
+        """Stops the run like a cancellation once `deadline` passes (immediately if it already has)."""
+        def expire() -> None:
+            self.deadline_exceeded = not self.cancelled
+            self.cancel("Deadline exceeded.")
+        self._deadline_timer = asyncio.get_running_loop().call_later(max(0.0, seconds_until(deadline)), expire)
+
+    async def run_cancellable(self, awaitable: Awaitable[T]) -> T:
+        """Runs one unit of work (an LLM call) as a task that cancel() can abort mid-flight."""
+        self.raise_if_cancelled()
+        task = asyncio.ensure_future(awaitable)
+        self._in_flight.add(task)
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if self.cancelled:
+                raise RunCancelledError(self.cancel_reason)
+            raise
+        finally:
+            self._in_flight.discard(task)
+
+
+_active_runs: Dict[int, RunControl] = {}
+
+
+def request_cancel(run_id: int) -> bool:
+    """Signals a run executing in this process. Returns False if it isn't executing here."""
+    control = _active_runs.get(run_id)
+    if control is None:
+        return False
+    control.cancel()
+    return True
+
+
+async def _poll_cancel_requested(control: RunControl) -> None:
+    # Imported here: the session module builds the engine at import time
+    from app.db.session import AsyncSessionLocal
+
+    while not control.cancelled:
+        await asyncio.sleep(settings.RUN_CANCEL_POLL_SECONDS)
+        try:
+            async with AsyncSessionLocal() as db:
+                if await crud_run.is_cancel_requested(db, id=control.run_id):
+                    control.cancel()
+        except Exception as e: # A failed poll must not take the run down
+            logger.warning(f"Cancellation poll for run {control.run_id} failed: {e}")
+
+
+@asynccontextmanager
+async def track_run(run_id: int, user_id: int) -> AsyncIterator[RunControl]:
+    """Registers the run as cancellable for the duration of its execution."""
+    control = RunControl(run_id, user_id)
+    _active_runs[run_id] = control
+    poller: Optional[asyncio.Task] = None
+    if settings.RUN_CANCEL_POLL_SECONDS > 0:
+        poller = asyncio.create_task(_poll_cancel_requested(control))
+    try:
+        yield control
+    finally:
+        if poller is not None:
+            poller.cancel()
+        if control._deadline_timer is not None:
+            control._deadline_timer.cancel()
+        _active_runs.pop(run_id, None)
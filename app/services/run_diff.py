@@ -0,0 +1,129 @@
+# Run-to-run comparison for GET /runs/{a}/diff/{b}.
+# Block runs are aligned by block_id, list items by index and matrix cells by (row, column); only
+# what differs is sent, each changed text as a unified diff computed here instead of shipping both
+# full RunRead payloads to the browser. The result is NDJSON: a "block" record for every block whose
+# outputs changed, followed by its changed list items / matrix cells in batches, then an "end" record
+# with the counts. diff_runs is a plain generator so the response streams from a worker thread while
+# difflib works through a large matrix.
+import difflib
+import json
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.core import serialization
+from app.db import models
+from app.services import run_archive
+
+_COMPARED_FIELDS = ("status", "error_message", "prompt_text", "llm_output_text")
+_OUTPUT_FIELDS = _COMPARED_FIELDS + ("block_id", "block_name_snapshot", "named_outputs_json", "list_outputs_json", "matrix_outputs_json")
+_ENTRIES_PER_RECORD = 500 # Changed list items / matrix cells per NDJSON line
+
+
+async def block_outputs(run: models.Run) -> Dict[int, Dict[str, Any]]:
+    """
+    Outputs of a run (loaded with its block runs) by block_id, as plain values so they outlive the session.
+    A block that ran more than once keeps its last block run. Raises RunArchiveError for an unreadable archive.
+    """
+    if run.archived_at is not None:
+        block_runs = serialization.loads(await run_archive.read_run(run))["block_runs"]
+    else:
+        block_runs = [{name: getattr(br, name) for name in _OUTPUT_FIELDS} for br in run.block_runs]
+    outputs = {}
+    for block_run in block_runs:
+        status = block_run.get("status")
+        outputs[block_run["block_id"]] = {
+            **{name: block_run.get(name) for name in _OUTPUT_FIELDS},
+            "status": status.value if isinstance(status, models.RunStatusEnum) else status,
+        }
+    return outputs
+
+
+def _as_text(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False, indent=1, sort_keys=True, default=str)
+
+
+def text_diff(a: Any, b: Any) -> str:
+    """Unified diff (one line of context) between two output values; non-text values are compared as JSON."""
+    return "\n".join(difflib.unified_diff(
+        _as_text(a).splitlines(), _as_text(b).splitlines(), fromfile="a", tofile="b", n=1, lineterm="",
+    ))
+
+
+def _change(a: Any, b: Any, missing_a: bool = False, missing_b: bool = False) -> Dict[str, Any]:
+    change: Dict[str, Any] = {"diff": text_diff(a, b)}
+    if missing_a or missing_b:
+        change["only_in"] = "b" if missing_a else "a"
+    return change
+
+
+def _values(outputs: Optional[Dict[str, Any]], field: str) -> List[Any]:
+    values = ((outputs or {}).get(field) or {}).get("values")
+    return values if isinstance(values, list) else []
+
+
+def _list_changes(a: List[Any], b: List[Any]) -> Iterator[Dict[str, Any]]:
+    for index in range(max(len(a), len(b))):
+        missing_a, missing_b = index >= len(a), index >= len(b)
+        item_a = None if missing_a else a[index]
+        item_b = None if missing_b else b[index]
+        if missing_a or missing_b or item_a != item_b:
+            yield {"index": index, **_change(item_a, item_b, missing_a, missing_b)}
+
+
+def _matrix_changes(a: List[Any], b: List[Any]) -> Iterator[Dict[str, Any]]:
+    for row in range(max(len(a), len(b))):
+        row_a = a[row] if row < len(a) and isinstance(a[row], list) else []
+        row_b = b[row] if row < len(b) and isinstance(b[row], list) else []
+        if row_a == row_b:
+            continue
+        for change in _list_changes(row_a, row_b):
+            yield {"row": row, "column": change.pop("index"), **change}
+
+
+def _batched(record: Dict[str, Any], key: str, entries: Iterator[Dict[str, Any]], counts: Dict[str, int]) -> Iterator[bytes]:
+    batch: List[Dict[str, Any]] = []
+    for entry in entries:
+        batch.append(entry)
+        counts[key] += 1
+        if len(batch) >= _ENTRIES_PER_RECORD:
+            yield serialization.dumps({**record, key: batch}) + b"\n"
+            batch = []
+    if batch:
+        yield serialization.dumps({**record, key: batch}) + b"\n"
+
+
+def diff_runs(run_a: int, run_b: int, outputs_a: Dict[int, Dict[str, Any]], outputs_b: Dict[int, Dict[str, Any]]) -> Iterator[bytes]:
+    """NDJSON lines of the differences from run_a to run_b, blocks in run_a's order then blocks only run_b has."""
+    counts = {"blocks_compared": 0, "blocks_changed": 0, "items": 0, "cells": 0}
+    yield serialization.dumps({"record": "header", "run_a": run_a, "run_b": run_b}) + b"\n"
+    for block_id in list(outputs_a) + [block_id for block_id in outputs_b if block_id not in outputs_a]:
+        a, b = outputs_a.get(block_id), outputs_b.get(block_id)
+        counts["blocks_compared"] += 1
+        changes = {
+            field: _change((a or {}).get(field), (b or {}).get(field))
+            for field in _COMPARED_FIELDS if (a or {}).get(field) != (b or {}).get(field)
+        }
+        named_a, named_b = (a or {}).get("named_outputs_json") or {}, (b or {}).get("named_outputs_json") or {}
+        named_changes = {
+            name: _change(named_a.get(name), named_b.get(name), name not in named_a, name not in named_b)
+            for name in list(named_a) + [name for name in named_b if name not in named_a]
+            if named_a.get(name) != named_b.get(name) or (name in named_a) != (name in named_b)
+        }
+        list_a, list_b = _values(a, "list_outputs_json"), _values(b, "list_outputs_json")
+        matrix_a, matrix_b = _values(a, "matrix_outputs_json"), _values(b, "matrix_outputs_json")
+        if a is not None and b is not None and not changes and not named_changes and list_a == list_b and matrix_a == matrix_b:
+            continue
+
+        counts["blocks_changed"] += 1
+        block = {"record": "block", "block_id": block_id, "block_name": (b or a).get("block_name_snapshot")}
+        if a is None or b is None:
+            block["only_in"] = "b" if a is None else "a"
+        yield serialization.dumps({**block, "fields": changes, "named_outputs": named_changes}) + b"\n"
+        if list_a != list_b:
+            yield from _batched({"record": "list_items", "block_id": block_id}, "items", _list_changes(list_a, list_b), counts)
+        if matrix_a != matrix_b:
+            yield from _batched({"record": "matrix_cells", "block_id": block_id}, "cells", _matrix_changes(matrix_a, matrix_b), counts)
+    yield serialization.dumps({"record": "end", "counts": counts}) + b"\n"
@@ -0,0 +1,133 @@
+# Up-front size and duration estimates for runs, used for deadline admission and sampling.
+# Duration is modelled as sequential blocks, each taking ceil(calls / RUN_ITEM_CONCURRENCY)
+# "waves" of LLM_ESTIMATED_CALL_SECONDS. It deliberately ignores queueing behind other runs.
+from datetime import datetime, timezone
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.crud import crud_global_list
+from app.db import models
+from app.services.item_packing import expected_pack_count
+from app.services.sequence_plan import PlanBlock, SequencePlan
+
+
+def seconds_until(deadline: datetime) -> float:
+    if deadline.tzinfo is None: # Naive timestamps (e.g. from SQLite) are stored as UTC
+        deadline = deadline.replace(tzinfo=timezone.utc)
+    return (deadline - datetime.now(timezone.utc)).total_seconds()
+
+
+def block_input_lists(block: PlanBlock) -> List[str]:
+    """Names of the lists a list/matrix block iterates over (primary first)."""
+    config = block.config_json
+    if block.type == models.BlockTypeEnum.SINGLE_LIST:
+        return [config.get("input_list_variable_name")]
+    if block.type == models.BlockTypeEnum.MULTI_LIST:
+        return [c.get("name") for c in (config.get("input_lists_config") or [])[:2]]
+    return []
+
+
+def sample_indices(count: int, sample_rate: float) -> List[int]:
+    """Evenly spaced indices covering `sample_rate` of `count` items (at least one)."""
+    if sample_rate >= 1 or count == 0:
+        return list(range(count))
+    sampled = max(1, math.ceil(count * sample_rate))
+    return [i * count // sampled for i in range(sampled)]
+
+
+def _block_calls(block: PlanBlock, list_lengths: Dict[str, int], sample_rate: float) -> Optional[int]:
+    if block.type == models.BlockTypeEnum.MAP_REDUCE:
+        return None # Chunk and reduce calls depend on the length of the text
+    if block.type not in (models.BlockTypeEnum.SINGLE_LIST, models.BlockTypeEnum.MULTI_LIST):
+        return 1
+    lengths = [list_lengths.get(name) for name in block_input_lists(block)]
+    if not lengths or any(length is None for length in lengths):
+        return None
+    # Sampling thins the list (or the matrix's primary rows); secondary columns are always complete
+    calls = len(sample_indices(lengths[0], sample_rate))
+    for length in lengths[1:]:
+        calls *= length
+    if block.type == models.BlockTypeEnum.SINGLE_LIST and block.config_json.get("pack_items"):
+        calls = expected_pack_count(calls, block.config_json.get("pack_max_items") or 20)
+    return calls
+
+
+def _plan_block_calls(plan: SequencePlan, list_lengths: Dict[str, int], sample_rate: float) -> List[Tuple[PlanBlock, Optional[int]]]:
+    """
+    Each block with its LLM calls (None if unknown), in execution order. Lists and matrices produced by
+    list blocks get the length of their (sampled) primary input, so blocks reading them are sized too.
+    """
+    lengths = dict(list_lengths)
+    calls = []
+    for block in plan.blocks:
+        calls.append((block, _block_calls(block, lengths, sample_rate)))
+        inputs = block_input_lists(block)
+        primary = lengths.get(inputs[0]) if inputs else None
+        for name, kind in block.output_variables:
+            if kind in ("list_output", "matrix_output") and primary is not None:
+                lengths[name] = len(sample_indices(primary, sample_rate)) # A matrix iterates as its rows
+            else:
+                lengths.pop(name, None) # Overwritten by an output of unknown length
+    return calls
+
+
+def unestimated_blocks(plan: SequencePlan, list_lengths: Dict[str, int]) -> List[PlanBlock]:
+    """Blocks whose LLM calls can't be known before the run (map-reduce blocks, lists of unknown length)."""
+    return [block for block, calls in _plan_block_calls(plan, list_lengths, 1.0) if calls is None]
+
+
+def estimate_llm_calls(plan: SequencePlan, list_lengths: Dict[str, int], sample_rate: float = 1.0) -> Optional[int]:
+    """LLM calls the run will make; None if a list's length (or a map-reduce block's chunk count) isn't known up front."""
+    total = 0
+    for _, calls in _plan_block_calls(plan, list_lengths, sample_rate):
+        if calls is None:
+            return None
+        total += calls
+    return total
+
+
+def estimate_seconds(plan: SequencePlan, list_lengths: Dict[str, int], sample_rate: float = 1.0) -> Optional[float]:
+    waves = 0
+    concurrency = max(1, settings.RUN_ITEM_CONCURRENCY)
+    for block, calls in _plan_block_calls(plan, list_lengths, sample_rate):
+        if calls is None:
+            return None
+        waves += math.ceil(calls / concurrency) if block_input_lists(block) else calls
+    return waves * settings.LLM_ESTIMATED_CALL_SECONDS
+
+
+def sample_rate_for_deadline(plan: SequencePlan, list_lengths: Dict[str, int], available_seconds: float) -> Optional[float]:
+    """Largest sample rate whose estimate fits in `available_seconds`, or None if even one item per list doesn't."""
+    if (estimate_seconds(plan, list_lengths, 0.0) or 0) > available_seconds:
+        return None
+    low, high = 0.0, 1.0
+    for _ in range(20): # Estimate is monotonic in the rate; 20 halvings is well below one item
+        mid = (low + high) / 2
+        if estimate_seconds(plan, list_lengths, mid) <= available_seconds:
+            low = mid
+        else:
+            high = mid
+    return max(low, 1e-6)
+
+
+async def get_input_list_lengths(
+    db: AsyncSession, plan: SequencePlan, user_id: int, input_overrides: Optional[Dict[str, Any]] = None
+) -> Dict[str, int]:
+    """
+    Lengths of the lists iterated by list/matrix blocks, from overrides, list-valued variables or global lists.
+    Lists produced by earlier blocks are left out: the estimates derive them from the producing block's input.
+    """
+    names = {name for block in plan.blocks for name in block_input_lists(block) if name}
+    lengths: Dict[str, int] = {}
+    for var in plan.variables:
+        value = (var.value_json or {}).get("value", (var.value_json or {}).get("default"))
+        if var.name in names and isinstance(value, list):
+            lengths[var.name] = len(value)
+    lengths.update(await crud_global_list.count_items_by_names(db, user_id=user_id, names=names - set(plan.produced_variables)))
+    for name, value in (input_overrides or {}).items():
+        if name in names and isinstance(value, list):
+            lengths[name] = len(value)
+    return lengths
@@ -0,0 +1,33 @@
+# Materialized responses for finished runs.
+# A run in a terminal status never changes, but its RunRead response (every BlockRun with its
+# multi-MB JSON columns) is expensive to validate and encode. It is therefore serialized once,
+# when the run finishes (or on first read for runs finished elsewhere), and GET /runs/{id} serves
+# the stored bytes with a strong ETag derived from them.
+import hashlib
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import serialization
+from app.crud.crud_materialized_run import materialized_run as crud_materialized_run
+from app.db import models
+from app.schemas.run import RunRead
+
+TERMINAL_STATUSES = (models.RunStatusEnum.COMPLETED, models.RunStatusEnum.FAILED, models.RunStatusEnum.CANCELLED)
+
+
+def render_run(run: models.Run) -> bytes:
+    """RunRead body for a run loaded with its block runs."""
+    return serialization.model_bytes(RunRead.model_validate(run))
+
+
+def body_etag(body: bytes) -> str:
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+async def materialize(db: AsyncSession, run: models.Run) -> Optional[models.MaterializedRun]:
+    """Stores the serialized response of a finished run (loaded with its block runs); None if it isn't finished."""
+    if run.status not in TERMINAL_STATUSES:
+        return None
+    body = render_run(run)
+    return await crud_materialized_run.store(db, run_id=run.id, etag=body_etag(body), body=body)
@@ -0,0 +1,236 @@
+# Compiled execution plans.
+# A SequencePlan is everything about a sequence that doesn't depend on runtime inputs:
+# ordered blocks, compiled prompt templates, the variables each block reads and produces,
+# the sequence's own variables and static validation errors. Plans are cached in-process
+# keyed by (sequence_id, Sequence.version); the version is a random stamp rewritten in the same
+# transaction as any block or variable write, so a stale plan can never be served for a newer
+# version, nor a deleted sequence's plan for a new sequence that reuses its id.
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import logging
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from jinja2 import Template, TemplateSyntaxError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core import metrics
+from app.crud import crud_block, crud_sequence, crud_variable
+from app.db import models
+from app.services.prompt_utils import compile_prompt, get_block_referenced_variables
+from app.services.token_estimate import context_window, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Names bound per item/cell by list and matrix blocks, and per chunk/group by map-reduce blocks;
+# never resolved from the sequence context
+LOOP_VARIABLES = frozenset({
+    "item", "item_index", "item1", "item2", "item1_index", "item2_index",
+    "chunk", "chunk_index", "chunk_count", "partials", "reduce_level",
+})
+
+
+def block_output_variables(block_id: int, block_type: models.BlockTypeEnum, config: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """
+    (variable_name, kind) pairs a block contributes to the context, kind being one of
+    "block_output", "list_output" or "matrix_output". Single source of truth for output naming.
+    """
+    if block_type == models.BlockTypeEnum.STANDARD:
+        return [(config.get("output_variable_name", f"block_{block_id}_output"), "block_output")]
+    if block_type == models.BlockTypeEnum.DISCRETIZATION:
+        return [(name, "block_output") for name in config.get("output_names", [])]
+    if block_type == models.BlockTypeEnum.SINGLE_LIST:
+        return [(config.get("output_list_variable_name") or f"output_list_{block_id}", "list_output")]
+    if block_type == models.BlockTypeEnum.MULTI_LIST:
+        return [(config.get("output_matrix_variable_name") or f"output_matrix_{block_id}", "matrix_output")]
+    if block_type == models.BlockTypeEnum.MAP_REDUCE:
+        return [(config.get("output_variable_name") or f"block_{block_id}_output", "block_output")]
+    return []
+
+
+@dataclass(frozen=True)
+class PlanBlock:
+    # Attribute names mirror models.Block so engine code can take either
+    id: int
+    name: str
+    type: models.BlockTypeEnum
+    order: int
+    config_json: Dict[str, Any]
+    template: Optional[Template]
+    referenced_variables: FrozenSet[str]
+    output_variables: Tuple[Tuple[str, str], ...]
+
+    @property
+    def produced_variables(self) -> Tuple[str, ...]:
+        return tuple(name for name, _ in self.output_variables)
+
+
+@dataclass(frozen=True)
+class PlanVariable:
+    name: str
+    type: models.VariableTypeEnum
+    value_json: Optional[Dict[str, Any]]
+    description: Optional[str]
+
+
+@dataclass
+class SequencePlan:
+    sequence_id: int
+    version: str
+    blocks: Tuple[PlanBlock, ...]
+    variables: Tuple[PlanVariable, ...]
+    # Names read by any block that neither a sequence variable nor an earlier block provides.
+    # They must come from global lists or runtime input overrides.
+    external_variables: FrozenSet[str] = frozenset()
+    llm_config: Dict[str, Any] = field(default_factory=dict) # Sequence-level LLM defaults (Sequence.llm_config_json)
+    errors: List[str] = field(default_factory=list)   # Block can't run as configured: fail before any LLM call
+    warnings: List[str] = field(default_factory=list) # Suspicious but possibly satisfied at runtime
+    invalid_blocks: FrozenSet[int] = frozenset() # Ids of the blocks the errors are about
+
+    @property
+    def referenced_variables(self) -> FrozenSet[str]:
+        names = set()
+        for block in self.blocks:
+            names |= block.referenced_variables
+        return frozenset(names)
+
+    @property
+    def produced_variables(self) -> Dict[str, int]:
+        """Output variable name -> id of the (last) block producing it."""
+        return {name: block.id for block in self.blocks for name in block.produced_variables}
+
+    def get_block(self, block_id: int) -> Optional[PlanBlock]:
+        return next((block for block in self.blocks if block.id == block_id), None)
+
+    def blocks_before(self, block: PlanBlock) -> Tuple[PlanBlock, ...]:
+        return tuple(b for b in self.blocks if b.order < block.order)
+
+
+def _required_config_errors(block_type: models.BlockTypeEnum, config: Dict[str, Any]) -> List[str]:
+    errors = []
+    if block_type == models.BlockTypeEnum.DISCRETIZATION and not config.get("output_names"):
+        errors.append("missing 'output_names' in config")
+    elif block_type == models.BlockTypeEnum.SINGLE_LIST and not config.get("input_list_variable_name"):
+        errors.append("missing 'input_list_variable_name'")
+    elif block_type == models.BlockTypeEnum.MULTI_LIST and len(config.get("input_lists_config") or []) < 2:
+        errors.append("requires at least two input lists in 'input_lists_config'")
+    elif block_type == models.BlockTypeEnum.MAP_REDUCE:
+        errors.extend(f"missing '{key}'" for key in ("input_variable_name", "reduce_prompt") if not config.get(key))
+    return errors
+
+
+def compile_plan(
+    sequence_id: int, version: str, blocks: List[models.Block], variables: List[models.Variable],
+    llm_config: Optional[Dict[str, Any]] = None,
+) -> SequencePlan:
+    """Builds a plan from ORM rows. Pure: no DB access, so the result can be cached across sessions."""
+    plan_variables = tuple(
+        PlanVariable(name=v.name, type=v.type, value_json=v.value_json, description=v.description) for v in variables
+    )
+    errors: List[str] = []
+    warnings: List[str] = []
+    invalid_blocks = set()
+    plan_blocks: List[PlanBlock] = []
+
+    for block in sorted(blocks, key=lambda b: (b.order, b.id)):
+        config = dict(block.config_json or {})
+        label = f"Block {block.id} ('{block.name}')"
+        errors_before = len(errors)
+        template = None
+        try:
+            template = compile_prompt(config.get("prompt") or "")
+        except TemplateSyntaxError as e:
+            errors.append(f"{label}: prompt template syntax error on line {e.lineno}: {e.message}")
+        if config.get("reduce_prompt"):
+            try:
+                compile_prompt(config["reduce_prompt"])
+            except TemplateSyntaxError as e:
+                errors.append(f"{label}: reduce prompt template syntax error on line {e.lineno}: {e.message}")
+        errors.extend(f"{label}: {msg}" for msg in _required_config_errors(block.type, config))
+        # The template's own text must leave room in the context window, whatever its variables hold
+        model = config.get("model") or (llm_config or {}).get("model") or settings.DEFAULT_LLM_MODEL
+        template_tokens = max(estimate_tokens(config.get(key) or "") for key in ("prompt", "reduce_prompt"))
+        if template_tokens + settings.LLM_MIN_OUTPUT_TOKENS > context_window(model):
+            errors.append(f"{label}: prompt template alone is ~{template_tokens} tokens; {model} has a {context_window(model)}-token context window")
+        if len(errors) > errors_before:
+            invalid_blocks.add(block.id)
+        plan_blocks.append(PlanBlock(
+            id=block.id,
+            name=block.name,
+            type=block.type,
+            order=block.order,
+            config_json=config,
+            template=template,
+            referenced_variables=frozenset(get_block_referenced_variables(config)),
+            output_variables=tuple(block_output_variables(block.id, block.type, config)),
+        ))
+
+    # Dataflow check in execution order
+    available = {v.name for v in plan_variables}
+    all_produced = {name: b for b in plan_blocks for name in b.produced_variables}
+    external = set()
+    seen_outputs: Dict[str, PlanBlock] = {}
+    for block in plan_blocks:
+        for name in sorted(block.referenced_variables - available - LOOP_VARIABLES):
+            producer = all_produced.get(name)
+            if producer is not None and producer.order >= block.order and producer.id != block.id:
+                warnings.append(f"Block {block.id} ('{block.name}') uses '{name}' before block {producer.id} ('{producer.name}') produces it.")
+            external.add(name)
+        for name in block.produced_variables:
+            if name in seen_outputs:
+                warnings.append(f"Output '{name}' of block {block.id} overwrites output of block {seen_outputs[name].id}.")
+            seen_outputs[name] = block
+            available.add(name)
+
+    return SequencePlan(
+        sequence_id=sequence_id,
+        version=version,
+        blocks=tuple(plan_blocks),
+        variables=plan_variables,
+        external_variables=frozenset(external),
+        llm_config=dict(llm_config or {}),
+        errors=errors,
+        warnings=warnings,
+        invalid_blocks=frozenset(invalid_blocks),
+    )
+
+
+_plan_cache: "OrderedDict[Tuple[int, str], SequencePlan]" = OrderedDict()
+
+
+async def get_sequence_plan(db: AsyncSession, sequence_id: int) -> SequencePlan:
+    """
+    Returns the compiled plan for the sequence's current version. A cache hit costs one
+    single-column query (the version stamp); a miss also loads blocks and variables.
+    """
+    version = await crud_sequence.get_version(db, id=sequence_id)
+    if version is None:
+        raise ValueError(f"Sequence {sequence_id} not found.")
+
+    key = (sequence_id, version)
+    plan = _plan_cache.get(key)
+    metrics.record_cache_lookup("sequence_plan", hit=plan is not None)
+    if plan is not None:
+        _plan_cache.move_to_end(key)
+        return plan
+
+    blocks = await crud_block.get_multi_by_sequence(db, sequence_id=sequence_id)
+    variables = await crud_variable.get_multi_by_sequence(db, sequence_id=sequence_id, limit=None)
+    llm_config = await crud_sequence.get_llm_config(db, id=sequence_id)
+    plan = compile_plan(sequence_id, version, blocks, variables, llm_config)
+    if plan.errors:
+        logger.info(f"Plan for sequence {sequence_id} ({version}) has {len(plan.errors)} validation error(s).")
+
+    # Older versions of this sequence can never be requested again
+    for stale_key in [k for k in _plan_cache if k[0] == sequence_id]:
+        del _plan_cache[stale_key]
+    _plan_cache[key] = plan
+    while len(_plan_cache) > settings.SEQUENCE_PLAN_CACHE_SIZE:
+        _plan_cache.popitem(last=False)
+    return plan
+
+
+def evict_sequence(sequence_id: int) -> None:
+    """Drops the cached plans of a deleted sequence."""
+    for key in [k for k in _plan_cache if k[0] == sequence_id]:
+        del _plan_cache[key]
@@ -0,0 +1,318 @@
+# Server-side sequence export and import.
+# An export is NDJSON, one record per line, streamed straight from the database: a header, the
+# sequence, its variables and blocks, the global lists its blocks reference (items in batches),
+# optionally its finished runs with their block runs, and an "end" record with the counts. An
+# import reads the same stream incrementally and recreates everything for the importing user in
+# one transaction with batched inserts: a malformed or truncated file leaves nothing behind.
+import enum
+import logging
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import serialization
+from app.core.config import settings
+from app.crud import crud_global_list, crud_run
+from app.crud.crud_user import user as crud_user
+from app.db import models
+from app.db.session import AsyncSessionLocal
+from app.schemas.block import BlockBase
+from app.schemas.sequence import SequenceBase
+from app.schemas.variable import VariableCreate
+from app.services.list_import import iter_lines
+from app.services import run_archive
+from app.services.run_response import TERMINAL_STATUSES
+from app.services.sequence_plan import LOOP_VARIABLES, get_sequence_plan
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMAT = "mpsg-sequence"
+EXPORT_VERSION = 1
+
+_RUN_FIELDS = (
+    "status", "started_at", "completed_at", "input_overrides_json", "results_summary_json", "token_budget",
+    "cost_budget", "token_usage_json", "cost", "priority", "sample_rate",
+)
+_BLOCK_RUN_FIELDS = (
+    "block_name_snapshot", "block_type_snapshot", "status", "prompt_text", "llm_output_text", "named_outputs_json",
+    "list_outputs_json", "matrix_outputs_json", "error_message", "started_at", "completed_at", "token_usage_json", "cost",
+)
+_DATETIME_FIELDS = ("started_at", "completed_at")
+
+
+class GlobalListImportMode(str, enum.Enum):
+    SKIP = "skip"       # A list the user already has (same name) is used as-is; the exported items are ignored
+    REPLACE = "replace" # Its items are replaced by the exported ones
+
+
+class SequenceTransferError(ValueError):
+    """Raised for malformed import content. Carries the 1-based line number when known."""
+    def __init__(self, message: str, line_number: Optional[int] = None):
+        self.line_number = line_number
+        super().__init__(f"Line {line_number}: {message}" if line_number else message)
+
+
+def _line(record: Dict[str, Any]) -> bytes:
+    return serialization.dumps(record) + b"\n"
+
+
+async def export_sequence(sequence: models.Sequence, user_id: int, include_runs: bool = False) -> AsyncIterator[bytes]:
+    """
+    Yields the export of a sequence loaded with its blocks and variables. Uses its own session:
+    the body is streamed after the request's dependencies have finished.
+    """
+    counts = {"variables": 0, "blocks": 0, "global_lists": 0, "global_list_items": 0, "runs": 0, "block_runs": 0}
+    yield _line({"record": "header", "format": EXPORT_FORMAT, "version": EXPORT_VERSION, "exported_at": datetime.now(timezone.utc)})
+    yield _line({
+        "record": "sequence", "name": sequence.name, "description": sequence.description, "llm_config_json": sequence.llm_config_json,
+    })
+    for variable in sequence.variables:
+        counts["variables"] += 1
+        yield _line({
+            "record": "variable", "name": variable.name, "type": variable.type,
+            "value_json": variable.value_json, "description": variable.description,
+        })
+    for block in sorted(sequence.blocks, key=lambda b: (b.order, b.id)):
+        counts["blocks"] += 1
+        yield _line({
+            "record": "block", "id": block.id, "name": block.name, "type": block.type, "order": block.order, "config_json": block.config_json,
+        })
+
+    async with AsyncSessionLocal() as db:
+        # Global lists are user-wide: only those the blocks read go along
+        plan = await get_sequence_plan(db, sequence.id)
+        list_names = plan.referenced_variables - {v.name for v in plan.variables} - set(plan.produced_variables) - LOOP_VARIABLES
+        for global_list in await crud_global_list.get_by_names(db, user_id=user_id, names=list_names):
+            counts["global_lists"] += 1
+            yield _line({"record": "global_list", "name": global_list.name, "description": global_list.description})
+            cursor = None
+            while True:
+                items, cursor = await crud_global_list.get_items_page(
+                    db, global_list_id=global_list.id, cursor=cursor, limit=settings.GLOBAL_LIST_IMPORT_BATCH_SIZE
+                )
+                if items:
+                    counts["global_list_items"] += len(items)
+                    yield _line({"record": "global_list_items", "list": global_list.name, "values": [item.value for item in items]})
+                if cursor is None:
+                    break
+
+        if include_runs:
+            cursor = None
+            while True:
+                runs, cursor = await crud_run.get_page_by_sequence_and_user(db, sequence_id=sequence.id, user_id=user_id, cursor=cursor)
+                for run in runs:
+                    if run.status not in TERMINAL_STATUSES: # Still executing: its rows are about to change
+                        continue
+                    if run.archived_at is not None: # Only a stub is left in the DB: export the archived body
+                        archived = serialization.loads(await run_archive.read_run(run))
+                        run_fields = {name: archived.get(name) for name in _RUN_FIELDS}
+                        block_runs = [{name: br.get(name) for name in ("block_id",) + _BLOCK_RUN_FIELDS} for br in archived["block_runs"]]
+                    else:
+                        run_fields = {name: getattr(run, name) for name in _RUN_FIELDS}
+                        block_runs = [{name: getattr(br, name) for name in ("block_id",) + _BLOCK_RUN_FIELDS} for br in run.block_runs]
+                    counts["runs"] += 1
+                    yield _line({"record": "run", "id": run.id, **run_fields})
+                    for block_run in block_runs:
+                        counts["block_runs"] += 1
+                        yield _line({"record": "block_run", "run_id": run.id, **block_run})
+                db.expunge_all() # Pages of runs carry large JSON columns: don't keep them in the identity map
+                if cursor is None:
+                    break
+
+    yield _line({"record": "end", "counts": counts})
+
+
+def _fields(record: Dict[str, Any], names: tuple, line_number: int) -> Dict[str, Any]:
+    values = {name: record.get(name) for name in names}
+    try:
+        values["status"] = models.RunStatusEnum(values["status"])
+    except ValueError:
+        raise SequenceTransferError(f"Invalid status '{values['status']}'", line_number)
+    for name in _DATETIME_FIELDS:
+        if isinstance(values.get(name), str):
+            try:
+                values[name] = datetime.fromisoformat(values[name])
+            except ValueError:
+                raise SequenceTransferError(f"Invalid '{name}' timestamp", line_number)
+    return values
+
+
+def _validated(schema: type, line_number: int, **fields: Any) -> Any:
+    try:
+        return schema(**fields)
+    except ValidationError as e:
+        error = e.errors()[0]
+        raise SequenceTransferError(f"Invalid {'.'.join(map(str, error.get('loc', ())))}: {error.get('msg')}", line_number)
+
+
+async def _iter_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple]:
+    """(line_number, record) for every non-blank line of the upload."""
+    line_number = 0
+    try:
+        async for line in iter_lines(chunks):
+            line_number += 1
+            if not line.strip():
+                continue
+            try:
+                record = serialization.loads(line)
+            except ValueError as e:
+                raise SequenceTransferError(f"Invalid JSON: {e}", line_number)
+            if not isinstance(record, dict) or not isinstance(record.get("record"), str):
+                raise SequenceTransferError("Expected an object with a 'record' type", line_number)
+            yield line_number, record
+    except SequenceTransferError:
+        raise
+    except ValueError as e: # Undecodable upload
+        raise SequenceTransferError(str(e))
+
+
+async def import_sequence(
+    db: AsyncSession,
+    *,
+    user_id: int,
+    chunks: AsyncIterator[bytes],
+    name: Optional[str] = None,
+    global_lists: GlobalListImportMode = GlobalListImportMode.SKIP,
+) -> Dict[str, Any]:
+    """
+    Recreates an exported sequence for `user_id` and commits once at the end. Any malformed record,
+    a missing "end" record or a DB error rolls the whole import back.
+    """
+    batch_size = settings.GLOBAL_LIST_IMPORT_BATCH_SIZE
+    counts = {"variables": 0, "blocks": 0, "global_lists": 0, "global_list_items": 0, "runs": 0, "block_runs": 0}
+    skipped_block_runs = 0
+    sequence: Optional[models.Sequence] = None
+    blocks: Dict[int, models.Block] = {} # Exported block id -> new block
+    runs: Dict[int, models.Run] = {}     # Exported run id -> new run
+    lists: Dict[str, Optional[models.GlobalList]] = {} # Exported list name -> list receiving its items (None: skipped)
+    list_orders: Dict[str, int] = {}
+    pending_block_runs: List[Dict[str, Any]] = []
+    variable_names = set()
+    header_seen = end_seen = lists_changed = False
+
+    async def flush_block_runs() -> None:
+        if not pending_block_runs:
+            return
+        await db.flush() # Assigns ids to the blocks and runs the rows point to
+        for row in pending_block_runs:
+            row["run_id"], row["block_id"] = runs[row.pop("_run")].id, blocks[row.pop("_block")].id
+        await db.execute(insert(models.BlockRun), pending_block_runs)
+        pending_block_runs.clear()
+
+    try:
+        async for line_number, record in _iter_records(chunks):
+            kind = record["record"]
+            if end_seen:
+                raise SequenceTransferError("Content after the 'end' record", line_number)
+            if not header_seen:
+                if kind != "header" or record.get("format") != EXPORT_FORMAT:
+                    raise SequenceTransferError(f"Not a {EXPORT_FORMAT} export", line_number)
+                if record.get("version") != EXPORT_VERSION:
+                    raise SequenceTransferError(f"Unsupported export version {record.get('version')}", line_number)
+                header_seen = True
+                continue
+            if kind == "sequence":
+                if sequence is not None:
+                    raise SequenceTransferError("More than one 'sequence' record", line_number)
+                data = _validated(SequenceBase, line_number, **{k: record.get(k) for k in ("name", "description", "llm_config_json")})
+                sequence = models.Sequence(
+                    name=name or data.name, description=data.description, user_id=user_id,
+                    llm_config_json=data.llm_config_json.model_dump(exclude_none=True) if data.llm_config_json else None,
+                )
+                db.add(sequence)
+                await db.flush() # Id for the rows below
+                continue
+            if sequence is None and kind != "end":
+                raise SequenceTransferError(f"'{kind}' record before the 'sequence' record", line_number)
+
+            if kind == "variable":
+                data = _validated(
+                    VariableCreate, line_number, sequence_id=sequence.id,
+                    **{k: record.get(k) for k in ("name", "description", "type", "value_json")},
+                )
+                if data.name in variable_names:
+                    raise SequenceTransferError(f"Duplicate variable '{data.name}'", line_number)
+                variable_names.add(data.name)
+                db.add(models.Variable(**data.model_dump()))
+                counts["variables"] += 1
+            elif kind == "block":
+                data = _validated(BlockBase, line_number, **{k: record[k] for k in ("name", "type", "order", "config_json") if k in record})
+                blocks[record.get("id")] = models.Block(**data.model_dump(), sequence_id=sequence.id)
+                db.add(blocks[record.get("id")])
+                counts["blocks"] += 1
+            elif kind == "global_list":
+                list_name = record.get("name")
+                if not isinstance(list_name, str) or not list_name:
+                    raise SequenceTransferError("Global list without a name", line_number)
+                matches = await crud_global_list.get_by_names(db, user_id=user_id, names=[list_name])
+                existing = matches[0] if matches else None
+                if existing is None:
+                    target = models.GlobalList(name=list_name, description=record.get("description"), user_id=user_id)
+                    db.add(target)
+                    await db.flush()
+                    list_orders[list_name] = 0
+                elif global_lists == GlobalListImportMode.REPLACE:
+                    target = existing
+                    await crud_global_list.remove_all_items(db, global_list_id=existing.id)
+                    list_orders[list_name] = 0
+                else:
+                    target = None
+                lists[list_name] = target
+                if target is not None:
+                    lists_changed = True
+                    counts["global_lists"] += 1
+            elif kind == "global_list_items":
+                list_name = record.get("list")
+                if list_name not in lists:
+                    raise SequenceTransferError(f"Items for unknown global list '{list_name}'", line_number)
+                values = record.get("values")
+                if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+                    raise SequenceTransferError("'values' must be a list of strings", line_number)
+                if lists[list_name] is not None:
+                    for start in range(0, len(values), batch_size):
+                        batch = values[start:start + batch_size]
+                        await crud_global_list.bulk_insert_items(
+                            db, global_list_id=lists[list_name].id, values=batch, start_order=list_orders[list_name]
+                        )
+                        list_orders[list_name] += len(batch)
+                    counts["global_list_items"] += len(values)
+            elif kind == "run":
+                runs[record.get("id")] = models.Run(
+                    sequence_id=sequence.id, user_id=user_id, **_fields(record, _RUN_FIELDS, line_number)
+                )
+                db.add(runs[record.get("id")])
+                counts["runs"] += 1
+            elif kind == "block_run":
+                if record.get("run_id") not in runs:
+                    raise SequenceTransferError(f"Block run for unknown run {record.get('run_id')}", line_number)
+                if record.get("block_id") not in blocks: # Its block was deleted before the export
+                    skipped_block_runs += 1
+                    continue
+                pending_block_runs.append({
+                    "_run": record["run_id"], "_block": record["block_id"], **_fields(record, _BLOCK_RUN_FIELDS, line_number),
+                })
+                counts["block_runs"] += 1
+                if len(pending_block_runs) >= batch_size:
+                    await flush_block_runs()
+            elif kind == "end":
+                end_seen = True
+            else:
+                raise SequenceTransferError(f"Unknown record type '{kind}'", line_number)
+
+        if not end_seen:
+            raise SequenceTransferError("Export is truncated: no 'end' record")
+        if sequence is None:
+            raise SequenceTransferError("Export has no 'sequence' record")
+        await flush_block_runs()
+        if lists_changed:
+            await crud_user.bump_global_lists_version(db, user_id=user_id)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    logger.info(f"Imported sequence {sequence.id} for user {user_id}: {counts}.")
+    return {"sequence_id": sequence.id, "name": sequence.name, "counts": counts, "skipped_block_runs": skipped_block_runs}
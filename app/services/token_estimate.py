@@ -0,0 +1,45 @@
+# Offline token estimates for prompt sizing.
+# The provider's tokenizer isn't available locally, so prompts are sized with a pre-tokenizer
+# heuristic: words cost one token per ~5 letters, digit runs one per 3 digits, and every symbol,
+# non-ASCII character and line break one each. The result is scaled by TOKEN_ESTIMATE_SAFETY_FACTOR,
+# so it errs on the large side for English text, code and JSON alike.
+import math
+import re
+from typing import Optional
+
+from app.core.config import settings
+
+
+class PromptTooLargeError(ValueError):
+    """Raised instead of sending a prompt that leaves no room for a response in the model's context window."""
+
+
+_PIECES = re.compile(r"[A-Za-z]+|\d+|\n\s*|[^\x00-\x7f]|[^\sA-Za-z\d]")
+
+
+def estimate_tokens(text: str) -> int:
+    tokens = 0
+    for piece in _PIECES.findall(text):
+        first = piece[0]
+        if first.isascii() and first.isalpha():
+            tokens += math.ceil(len(piece) / 5)
+        elif first.isdigit():
+            tokens += math.ceil(len(piece) / 3)
+        else:
+            tokens += 1
+    return math.ceil(tokens * settings.TOKEN_ESTIMATE_SAFETY_FACTOR)
+
+
+def context_window(model: str) -> int:
+    return settings.LLM_CONTEXT_WINDOWS.get(model, settings.DEFAULT_LLM_CONTEXT_WINDOW)
+
+
+def fit_max_tokens(prompt_tokens: int, model: str, requested: int) -> Optional[int]:
+    """
+    The response limit to request so prompt + response fit the model's context window:
+    `requested`, lowered if necessary, or None if fewer than LLM_MIN_OUTPUT_TOKENS would remain.
+    """
+    available = context_window(model) - prompt_tokens
+    if available < min(requested, settings.LLM_MIN_OUTPUT_TOKENS):
+        return None
+    return min(requested, available)
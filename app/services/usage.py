@@ -0,0 +1,120 @@
+# Token usage and cost accounting for LLM calls.
+# Usage is recorded per call and rolled up per item/cell, per block and per run. A run-level
+# tracker enforces the optional token/cost budget: once it is exhausted no new LLM call is
+# started (calls already in flight are allowed to finish and are still counted).
+from dataclasses import dataclass
+import logging
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.services.llm_interface import LLMResponse
+
+logger = logging.getLogger(__name__)
+
+
+class BudgetExceededError(Exception):
+    """Raised instead of starting an LLM call once the run's token or cost budget is used up."""
+
+
+def price_for(model: str, input_tokens: int, output_tokens: int, cache_write_tokens: int = 0, cache_read_tokens: int = 0) -> Optional[float]:
+    """
+    USD cost of a call from the configured price table, or None if the model isn't priced.
+    Prompt-cache writes and reads default to the provider's 1.25x and 0.1x of the input price.
+    """
+    prices = settings.LLM_PRICING.get(model)
+    if prices is None:
+        return None
+    input_price = prices.get("input_per_mtok", 0.0)
+    return (
+        input_tokens * input_price
+        + output_tokens * prices.get("output_per_mtok", 0.0)
+        + cache_write_tokens * prices.get("cache_write_per_mtok", input_price * 1.25)
+        + cache_read_tokens * prices.get("cache_read_per_mtok", input_price * 0.1)
+    ) / 1_000_000
+
+
+@dataclass
+class TokenUsage:
+    input_tokens: int = 0
+    output_tokens: int = 0
+    calls: int = 0
+    cost: float = 0.0
+    unpriced_calls: int = 0 # Calls to models missing from the price table (cost not counted)
+    cache_write_tokens: int = 0 # Input tokens written to the prompt cache (not included in input_tokens)
+    cache_read_tokens: int = 0 # Input tokens read from the prompt cache (not included in input_tokens)
+
+    @property
+    def total_tokens(self) -> int:
+        return self.input_tokens + self.output_tokens + self.cache_write_tokens + self.cache_read_tokens
+
+    def add(self, other: "TokenUsage") -> None:
+        self.input_tokens += other.input_tokens
+        self.output_tokens += other.output_tokens
+        self.calls += other.calls
+        self.cost += other.cost
+        self.unpriced_calls += other.unpriced_calls
+        self.cache_write_tokens += other.cache_write_tokens
+        self.cache_read_tokens += other.cache_read_tokens
+
+    @classmethod
+    def from_response(cls, response: LLMResponse) -> "TokenUsage":
+        cost = price_for(
+            response.model, response.input_tokens, response.output_tokens,
+            response.cache_creation_input_tokens, response.cache_read_input_tokens,
+        )
+        return cls(
+            input_tokens=response.input_tokens,
+            output_tokens=response.output_tokens,
+            calls=1,
+            cost=cost or 0.0,
+            unpriced_calls=0 if cost is not None else 1,
+            cache_write_tokens=response.cache_creation_input_tokens,
+            cache_read_tokens=response.cache_read_input_tokens,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "total_tokens": self.total_tokens,
+            "calls": self.calls,
+            "cost": round(self.cost, 6),
+        }
+        if self.unpriced_calls:
+            data["unpriced_calls"] = self.unpriced_calls
+        if self.cache_write_tokens or self.cache_read_tokens:
+            data["cache_write_tokens"] = self.cache_write_tokens
+            data["cache_read_tokens"] = self.cache_read_tokens
+        return data
+
+
+class RunUsageTracker:
+    """Accumulates a run's usage and enforces its budget."""
+
+    def __init__(self, token_budget: Optional[int] = None, cost_budget: Optional[float] = None):
+        self.token_budget = token_budget
+        self.cost_budget = cost_budget
+        self.total = TokenUsage()
+        self.exceeded_reason: Optional[str] = None
+
+    @property
+    def exceeded(self) -> bool:
+        return self.exceeded_reason is not None
+
+    def check_budget(self) -> None:
+        """Call before starting an LLM call."""
+        if self.exceeded_reason is None:
+            if self.token_budget is not None and self.total.total_tokens >= self.token_budget:
+                self.exceeded_reason = f"Token budget exceeded: {self.total.total_tokens} of {self.token_budget} tokens used."
+            elif self.cost_budget is not None and self.total.cost >= self.cost_budget:
+                self.exceeded_reason = f"Cost budget exceeded: ${self.total.cost:.4f} of ${self.cost_budget:.4f} spent."
+            if self.exceeded_reason:
+                logger.warning(self.exceeded_reason)
+        if self.exceeded_reason:
+            raise BudgetExceededError(self.exceeded_reason)
+
+    def record(self, response: LLMResponse) -> TokenUsage:
+        """Adds one call's usage to the run total and returns it for per-item/per-block roll-ups."""
+        usage = TokenUsage.from_response(response)
+        self.total.add(usage)
+        return usage
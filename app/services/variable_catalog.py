@@ -0,0 +1,100 @@
+# Variable catalog for the prompt editor's autocomplete.
+# The catalog is a pure function of the sequence version (variables + blocks) and the owner's
+# global_lists_version (list names/descriptions), so those two stamps form its ETag and cache key.
+# An unchanged catalog is answered from the version stamps alone, without rebuilding it.
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core import metrics
+from app.crud import crud_global_list
+from app.db import models
+from app.schemas.variable import AvailableVariable
+from app.services.sequence_plan import get_sequence_plan
+
+
+def catalog_etag(sequence_id: int, sequence_version: str, user_id: int, global_lists_version: int) -> str:
+    return f'"catalog-{sequence_id}.{sequence_version}-{user_id}.{global_lists_version}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """RFC 7232 weak comparison against an If-None-Match header value."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+async def build_catalog(db: AsyncSession, *, sequence_id: int, user_id: int) -> List[Dict[str, Any]]:
+    available_vars: List[AvailableVariable] = []
+
+    # Sequence variables and block outputs come from the compiled plan (cached per sequence version)
+    plan = await get_sequence_plan(db, sequence_id)
+
+    # 1. User-defined Global and Input variables for this sequence
+    for var in plan.variables:
+        available_vars.append(AvailableVariable(
+            name=var.name,
+            type=var.type.value, # 'global' or 'input'
+            source=f"Sequence Defined ({var.type.value.capitalize()})",
+            description=var.description
+        ))
+
+    # 2. User's Global Lists: names only, items are never loaded
+    for list_name, list_description in await crud_global_list.get_names_by_owner(db, user_id=user_id):
+        available_vars.append(AvailableVariable(
+            name=list_name,
+            type="global_list",
+            source="User Global List",
+            description=list_description
+        ))
+
+    # 3. Outputs from Blocks within this sequence
+    # These are conceptual variables derived from block configurations.
+    # The actual values are only available after a run.
+    for block in plan.blocks:
+        for var_name, kind in block.output_variables:
+            if block.type == models.BlockTypeEnum.DISCRETIZATION:
+                source, description = f"Block: {block.name} (Discretized)", f"Discretized output '{var_name}' from '{block.name}'"
+            elif kind == "list_output":
+                source, description = f"Block: {block.name}", f"List output of '{block.name}'"
+            elif kind == "matrix_output":
+                source, description = f"Block: {block.name}", f"Matrix output of '{block.name}'"
+            else:
+                source, description = f"Block: {block.name}", f"Output of '{block.name}'"
+            available_vars.append(AvailableVariable(name=var_name, type=kind, source=source, description=description))
+
+    # Remove duplicates by name, keeping the first encountered (variables, then lists, then block outputs)
+    final_vars_dict: Dict[str, AvailableVariable] = {}
+    for avar in available_vars:
+        if avar.name not in final_vars_dict:
+            final_vars_dict[avar.name] = avar
+    return [avar.model_dump() for avar in final_vars_dict.values()]
+
+
+_catalog_cache: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+
+
+async def get_catalog(db: AsyncSession, *, sequence_id: int, user_id: int, etag: str) -> List[Dict[str, Any]]:
+    """Catalog for the given ETag (computed by the caller from the current version stamps), built at most once."""
+    catalog = _catalog_cache.get(etag)
+    metrics.record_cache_lookup("variable_catalog", hit=catalog is not None)
+    if catalog is not None:
+        _catalog_cache.move_to_end(etag)
+        return catalog
+    catalog = await build_catalog(db, sequence_id=sequence_id, user_id=user_id)
+    _catalog_cache[etag] = catalog
+    while len(_catalog_cache) > settings.VARIABLE_CATALOG_CACHE_SIZE:
+        _catalog_cache.popitem(last=False)
+    return catalog
+
+
+def evict_sequence(sequence_id: int) -> None:
+    """Drops the cached catalogs of a deleted sequence."""
+    prefix = f'"catalog-{sequence_id}.'
+    for etag in [e for e in _catalog_cache if e.startswith(prefix)]:
+        del _catalog_cache[etag]
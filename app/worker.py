@@ -0,0 +1,149 @@
+# Standalone run worker: executes runs claimed from the durable run queue (RUN_EXECUTION_MODE=queue).
+# Any number of workers can run next to any number of API nodes, all sharing DATABASE_URL:
+#
+#   python -m app.worker [--concurrency N]
+#
+# Each claimed run holds a lease that a heartbeat renews while it executes. If the worker dies the
+# lease expires and another worker re-runs it from the start. On SIGTERM/SIGINT the worker stops
+# claiming and lets its current runs finish.
+# With SQLite, a run's open write transaction can block heartbeats; use a single worker there.
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+import uuid
+from typing import Set
+
+from app.core.config import settings
+from app.core import tracing
+from app.crud.crud_run import run as crud_run
+from app.crud.crud_run_queue import run_queue as crud_run_queue
+from app.db.session import AsyncSessionLocal
+from app.models.run import QueuedRun
+from app.services import execution_engine
+
+logger = logging.getLogger("app.worker")
+
+
+class RunWorker:
+    def __init__(self, concurrency: int):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.concurrency = concurrency
+        self._stopping = asyncio.Event()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def stop(self) -> None:
+        if not self._stopping.is_set():
+            logger.info(f"Worker {self.worker_id} stopping; waiting for {len(self._tasks)} run(s) to finish.")
+            self._stopping.set()
+
+    async def _heartbeat(self, entry_id: int, execution: asyncio.Task) -> None:
+        while not execution.done():
+            await asyncio.sleep(settings.RUN_QUEUE_HEARTBEAT_SECONDS)
+            try:
+                async with AsyncSessionLocal() as db:
+                    renewed = await crud_run_queue.renew_lease(
+                        db, id=entry_id, worker_id=self.worker_id, lease_seconds=settings.RUN_QUEUE_LEASE_SECONDS
+                    )
+            except Exception as e: # Transient DB trouble: the lease has slack, try again next beat
+                logger.warning(f"Heartbeat for queue entry {entry_id} failed: {e}")
+                continue
+            if not renewed:
+                # Another worker owns the run now; stop without writing anything
+                logger.error(f"Lost lease on queue entry {entry_id}; abandoning its run.")
+                execution.cancel()
+                return
+
+    async def _process(self, entry: QueuedRun) -> None:
+        async with AsyncSessionLocal() as db:
+            run = await crud_run.get(db, id=entry.run_id)
+            if run is None:
+                await crud_run_queue.complete(db, id=entry.id, worker_id=self.worker_id)
+                return
+            if entry.attempts > settings.RUN_QUEUE_MAX_ATTEMPTS:
+                logger.error(f"Run {run.id} failed after {entry.attempts - 1} attempts whose workers died.")
+                await crud_run.mark_failed(db, id=run.id, error="Run abandoned", details=f"Worker lost {entry.attempts - 1} times.")
+                await crud_run_queue.complete(db, id=entry.id, worker_id=self.worker_id)
+                return
+
+            execution = asyncio.create_task(execution_engine.execute_sequence(
+                db=db,
+                run_id=run.id,
+                sequence_id=run.sequence_id,
+                user_id=run.user_id,
+                input_overrides=run.input_overrides_json,
+            ))
+            heartbeat = asyncio.create_task(self._heartbeat(entry.id, execution))
+            try:
+                await execution
+            except asyncio.CancelledError:
+                await db.rollback()
+                return # Lease lost: the new owner finishes the run and its queue entry
+            except Exception as e:
+                logger.error(f"Run {run.id} failed in worker {self.worker_id}: {e}", exc_info=True)
+                await db.rollback()
+                await crud_run.mark_failed(db, id=run.id, error="Execution failed catastrophically", details=str(e))
+            finally:
+                heartbeat.cancel()
+            await crud_run_queue.complete(db, id=entry.id, worker_id=self.worker_id)
+
+    async def _claim(self) -> QueuedRun | None:
+        async with AsyncSessionLocal() as db:
+            return await crud_run_queue.claim(db, worker_id=self.worker_id, lease_seconds=settings.RUN_QUEUE_LEASE_SECONDS)
+
+    async def _release(self, entry: QueuedRun) -> None:
+        try:
+            async with AsyncSessionLocal() as db:
+                await crud_run_queue.release(db, id=entry.id, worker_id=self.worker_id)
+            logger.info(f"Worker {self.worker_id} released run {entry.run_id} unstarted.")
+        except Exception as e: # The lease expires on its own; the run is only delayed
+            logger.warning(f"Releasing queue entry {entry.id} failed: {e}")
+
+    async def run(self) -> None:
+        logger.info(f"Worker {self.worker_id} started (concurrency {self.concurrency}).")
+        while not self._stopping.is_set():
+            entry = None
+            if len(self._tasks) < self.concurrency:
+                try:
+                    entry = await self._claim()
+                except Exception as e:
+                    logger.warning(f"Claiming from the run queue failed: {e}")
+            if entry is not None and self._stopping.is_set(): # SIGTERM arrived mid-claim: hand the run to another worker
+                await self._release(entry)
+                break
+            if entry is not None:
+                logger.info(f"Worker {self.worker_id} claimed run {entry.run_id} (attempt {entry.attempts}).")
+                task = asyncio.create_task(self._process(entry))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+                continue # Queue may hold more work: claim again without waiting
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=settings.RUN_QUEUE_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        logger.info(f"Worker {self.worker_id} stopped.")
+
+
+async def main(concurrency: int) -> None:
+    worker = RunWorker(concurrency)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.stop)
+    await worker.run()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Execute runs from the durable run queue")
+    parser.add_argument("--concurrency", type=int, default=settings.WORKER_CONCURRENCY, help="Runs executed at once")
+    args = parser.parse_args()
+
+    tracing.install_log_context()
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(levelname)s:%(name)s:[trace=%(trace_id)s span=%(span_id)s] %(message)s",
+    )
+    asyncio.run(main(args.concurrency))
@@ -0,0 +1 @@
+# Performance benchmarks for the execution engine (see run_engine_bench.py).
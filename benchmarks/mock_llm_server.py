@@ -0,0 +1,167 @@
+# Mock of the Anthropic messages API for benchmarks.
+# Answers POST /v1/messages after a simulated latency, with optional injected 5xx errors and
+# 429 rate limits, and tracks request concurrency (GET /stats, POST /stats/reset).
+#
+# Standalone:  python -m benchmarks.mock_llm_server --port 8089 --latency-ms 800 --distribution lognormal
+# then start the backend with CLAUDE_API_URL=http://127.0.0.1:8089/v1/messages
+import argparse
+import asyncio
+from dataclasses import asdict, dataclass
+import math
+import random
+from typing import Any, Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+@dataclass
+class MockLLMConfig:
+    latency_ms: float = 50.0          # Mean latency of a successful call
+    distribution: str = "fixed"       # "fixed", "uniform" (±jitter) or "lognormal" (sigma = jitter)
+    jitter: float = 0.5
+    error_rate: float = 0.0           # Fraction of calls answered with a 529 overloaded error
+    rate_limit_rate: float = 0.0      # Fraction of calls answered with a 429
+    retry_after_s: float = 1.0        # retry-after header sent with 429s
+    output_tokens: int = 64
+    seed: Optional[int] = None
+
+    def sample_latency_s(self, rng: random.Random) -> float:
+        mean = self.latency_ms / 1000
+        if self.distribution == "uniform":
+            return max(0.0, rng.uniform(mean * (1 - self.jitter), mean * (1 + self.jitter)))
+        if self.distribution == "lognormal":
+            # Parameterised so the distribution's mean equals latency_ms
+            sigma = self.jitter
+            return rng.lognormvariate(math.log(mean) - sigma ** 2 / 2, sigma) if mean > 0 else 0.0
+        return mean
+
+
+class MockLLMStats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.requests = 0
+        self.successes = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "successes": self.successes,
+            "errors": self.errors,
+            "rate_limited": self.rate_limited,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+        }
+
+
+def create_app(config: MockLLMConfig) -> FastAPI:
+    app = FastAPI(title="Mock LLM API")
+    rng = random.Random(config.seed)
+    stats = MockLLMStats()
+    cached_prefixes = set() # Prompt prefixes "written to the cache" by earlier requests
+    app.state.config = config
+    app.state.stats = stats
+
+    @app.post("/v1/messages")
+    async def messages(request: Request):
+        payload = await request.json()
+        stats.requests += 1
+        stats.in_flight += 1
+        stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+        try:
+            roll = rng.random()
+            if roll < config.rate_limit_rate:
+                stats.rate_limited += 1
+                return JSONResponse(
+                    status_code=429,
+                    headers={"retry-after": str(config.retry_after_s)},
+                    content={"type": "error", "error": {"type": "rate_limit_error", "message": "Mock rate limit."}},
+                )
+            await asyncio.sleep(config.sample_latency_s(rng))
+            if roll < config.rate_limit_rate + config.error_rate:
+                stats.errors += 1
+                return JSONResponse(
+                    status_code=529,
+                    content={"type": "error", "error": {"type": "overloaded_error", "message": "Mock overload."}},
+                )
+
+            # Content is a string or text blocks; a block with cache_control ends a cacheable prefix
+            prompt, cached_chars, written_chars = "", 0, 0
+            for message in payload.get("messages", []):
+                content = message.get("content")
+                for part in ([{"type": "text", "text": content}] if isinstance(content, str) else content or []):
+                    prompt += part.get("text", "")
+                    if part.get("cache_control"):
+                        if prompt in cached_prefixes:
+                            cached_chars = len(prompt)
+                        else:
+                            cached_prefixes.add(prompt)
+                            written_chars = len(prompt)
+            uncached_chars = len(prompt) - cached_chars - written_chars
+            stats.successes += 1
+            return {
+                "id": f"msg_mock_{stats.requests}",
+                "type": "message",
+                "role": "assistant",
+                "model": payload.get("model", "mock"),
+                "content": [{"type": "text", "text": f"mock answer #{stats.requests} ({len(prompt)} prompt chars)"}],
+                "stop_reason": "end_turn",
+                "usage": {
+                    "input_tokens": max(1, uncached_chars // 4),
+                    "output_tokens": config.output_tokens,
+                    "cache_creation_input_tokens": written_chars // 4,
+                    "cache_read_input_tokens": cached_chars // 4,
+                },
+            }
+        finally:
+            stats.in_flight -= 1
+
+    @app.get("/stats")
+    async def get_stats():
+        return {**stats.to_dict(), "config": asdict(config)}
+
+    @app.post("/stats/reset")
+    async def reset_stats():
+        stats.reset()
+        return stats.to_dict()
+
+    return app
+
+
+def add_config_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency-ms", type=float, default=MockLLMConfig.latency_ms)
+    parser.add_argument("--distribution", choices=["fixed", "uniform", "lognormal"], default=MockLLMConfig.distribution)
+    parser.add_argument("--jitter", type=float, default=MockLLMConfig.jitter)
+    parser.add_argument("--error-rate", type=float, default=MockLLMConfig.error_rate)
+    parser.add_argument("--rate-limit-rate", type=float, default=MockLLMConfig.rate_limit_rate)
+    parser.add_argument("--output-tokens", type=int, default=MockLLMConfig.output_tokens)
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def config_from_args(args: argparse.Namespace) -> MockLLMConfig:
+    return MockLLMConfig(
+        latency_ms=args.latency_ms,
+        distribution=args.distribution,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        output_tokens=args.output_tokens,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Mock Anthropic messages API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(config_from_args(args)), host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,87 @@
+# Regression check for prompt previews of sequences that fail plan validation.
+# Seeds a fresh SQLite database with a sequence whose MULTI_LIST block has an empty
+# input_lists_config (accepted by PATCH /blocks, which doesn't re-validate config_json), followed
+# by a block reading its output, and previews every block. The preview must report the plan error
+# instead of raising; the process exits with status 1 otherwise.
+#
+#   python -m benchmarks.preview_check
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+from typing import Any, Dict, List
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db import models
+from app.db.base import Base
+from app.services.execution_engine import preview_prompts_for_sequence
+
+logger = logging.getLogger("benchmarks")
+
+
+async def seed_incomplete_multi_list(db: AsyncSession, user_id: int) -> int:
+    """A MULTI_LIST block without input lists, then a STANDARD block using its matrix."""
+    sequence = models.Sequence(name="incomplete_multi_list", description="Preview check sequence", user_id=user_id)
+    db.add(sequence)
+    await db.flush()
+    db.add_all([
+        models.Block(
+            name="Per cell",
+            type=models.BlockTypeEnum.MULTI_LIST,
+            sequence_id=sequence.id,
+            order=0,
+            config_json={
+                "prompt": "Compare {{ item1 }} with {{ item2 }}",
+                "input_lists_config": [],
+                "output_matrix_variable_name": "comparisons",
+            },
+        ),
+        models.Block(
+            name="Summary",
+            type=models.BlockTypeEnum.STANDARD,
+            sequence_id=sequence.id,
+            order=1,
+            config_json={"prompt": "Summarise: {{ comparisons }}", "output_variable_name": "summary"},
+        ),
+    ])
+    await db.flush()
+    return sequence.id
+
+
+async def main() -> List[str]:
+    """Returns the problems found (empty when the check passes)."""
+    with tempfile.TemporaryDirectory(prefix="mpsg-preview-") as workdir:
+        db_engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(workdir, 'preview.db')}")
+        async with db_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_factory = sessionmaker(bind=db_engine, class_=AsyncSession, expire_on_commit=False)
+        try:
+            async with session_factory() as db:
+                user = models.User(email="preview-check@example.com", hashed_password="x")
+                db.add(user)
+                await db.flush()
+                sequence_id = await seed_incomplete_multi_list(db, user.id)
+                await db.commit()
+                result: Dict[str, Any] = await preview_prompts_for_sequence(db, sequence_id, user.id)
+        finally:
+            await db_engine.dispose()
+
+    problems = []
+    if not any("input_lists_config" in error for error in result["plan_errors"]):
+        problems.append(f"Plan errors don't report the missing input lists: {result['plan_errors']}")
+    if len(result["previews"]) != 2:
+        problems.append(f"Expected previews of both blocks, got {len(result['previews'])}.")
+    return problems
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    problems = asyncio.run(main())
+    for problem in problems:
+        logger.error(problem)
+    if problems:
+        sys.exit(1)
+    print("Preview of an incomplete MULTI_LIST block reports its plan error.")
@@ -0,0 +1,190 @@
+# Execution-engine benchmark.
+# For each scenario: seeds a fresh SQLite database, points the LLM client at an in-process mock
+# messages API, runs execute_sequence once and records wall time, LLM call count and peak
+# concurrency, DB statement count and peak RSS. Results are written as one JSON document so
+# runs can be diffed or tracked over time.
+#
+#   python -m benchmarks.run_engine_bench --output bench.json
+#   python -m benchmarks.run_engine_bench --scenario single_list --scale 0.1 --latency-ms 20
+#
+# ru_maxrss is a process-wide high-water mark: run one scenario per process (--scenario) when
+# comparing peak RSS between scenarios. The process exits with status 1 if a scenario didn't make
+# the LLM calls it should (it benchmarked the wrong work).
+import argparse
+import asyncio
+from datetime import datetime, timezone
+import json
+import logging
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, Optional
+
+import uvicorn
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.db import models
+from app.db.base import Base
+from app.services import sequence_plan, variable_catalog
+from app.services.execution_engine import execute_sequence
+from app.services.llm_scheduler import llm_scheduler
+from benchmarks.mock_llm_server import add_config_arguments, config_from_args, create_app
+from benchmarks.scenarios import Scenario, build_scenarios
+
+logger = logging.getLogger("benchmarks")
+
+BENCH_MODEL = "claude-3-haiku-20240307"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024 # bytes on macOS, KiB on Linux
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _reset_process_state() -> None:
+    """
+    Every scenario seeds a fresh database, so ids (and hence cache keys) repeat between scenarios:
+    in-process caches and scheduler history must not carry over.
+    """
+    sequence_plan._plan_cache.clear()
+    variable_catalog._catalog_cache.clear()
+    llm_scheduler.reset()
+
+
+async def run_scenario(scenario: Scenario, mock_stats, workdir: str) -> Dict[str, Any]:
+    _reset_process_state()
+    db_engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(workdir, scenario.name)}.db")
+    query_count = 0
+
+    @event.listens_for(db_engine.sync_engine, "before_cursor_execute")
+    def _count_query(*_):
+        nonlocal query_count
+        query_count += 1
+
+    async with db_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = sessionmaker(bind=db_engine, class_=AsyncSession, expire_on_commit=False)
+
+    try:
+        async with session_factory() as db:
+            user = models.User(email=f"bench-{scenario.name}@example.com", hashed_password="x")
+            db.add(user)
+            await db.flush()
+            sequence_id = await scenario.seed(db, user.id)
+            run = models.Run(sequence_id=sequence_id, user_id=user.id, status=models.RunStatusEnum.PENDING)
+            db.add(run)
+            await db.commit()
+            user_id, run_id = user.id, run.id
+
+        mock_stats.reset()
+        seed_queries, query_count = query_count, 0
+        rss_before = _peak_rss_mb()
+        async with session_factory() as db:
+            start = time.perf_counter()
+            run = await execute_sequence(db, run_id=run_id, sequence_id=sequence_id, user_id=user_id, llm_model=BENCH_MODEL)
+            wall_time = time.perf_counter() - start
+            status = run.status.value
+            summary_error = (run.results_summary_json or {}).get("error")
+    finally:
+        await db_engine.dispose()
+
+    llm_calls = mock_stats.requests
+    return {
+        "scenario": scenario.name,
+        "run_status": status,
+        "run_error": summary_error,
+        "wall_time_s": round(wall_time, 4),
+        "llm_calls": llm_calls,
+        "expected_llm_calls": scenario.expected_llm_calls,
+        "llm_calls_match": llm_calls == scenario.expected_llm_calls,
+        "llm_calls_per_s": round(llm_calls / wall_time, 2) if wall_time else None,
+        "llm_peak_concurrency": mock_stats.peak_in_flight,
+        "llm_errors": mock_stats.errors,
+        "llm_rate_limited": mock_stats.rate_limited,
+        "db_queries": query_count,
+        "db_queries_seed": seed_queries,
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "peak_rss_before_run_mb": round(rss_before, 1),
+    }
+
+
+async def main(args: argparse.Namespace) -> Dict[str, Any]:
+    mock_config = config_from_args(args)
+    mock_app = create_app(mock_config)
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(mock_app, host="127.0.0.1", port=port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    settings.CLAUDE_API_URL = f"http://127.0.0.1:{port}/v1/messages"
+    settings.CLAUDE_API_KEY = settings.CLAUDE_API_KEY or "benchmark"
+
+    scenarios = build_scenarios(args.scale)
+    selected = args.scenario or list(scenarios)
+    results = []
+    try:
+        with tempfile.TemporaryDirectory(prefix="mpsg-bench-") as workdir:
+            for name in selected:
+                logger.warning(f"Running scenario '{name}' ...")
+                results.append(await run_scenario(scenarios[name], mock_app.state.stats, workdir))
+    finally:
+        server.should_exit = True
+        await server_task
+
+    return {
+        "benchmark": "execution_engine",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": args.scale,
+        "model": BENCH_MODEL,
+        "mock_llm_config": vars(mock_config),
+        "results": results,
+        "passed": all(result["llm_calls_match"] for result in results),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark execute_sequence against a mock LLM API")
+    parser.add_argument("--scenario", action="append", choices=list(build_scenarios()), help="Repeatable; default: all")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier for scenario sizes")
+    parser.add_argument("--output", help="Write JSON results here instead of stdout")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    report = asyncio.run(main(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    for result in report["results"]:
+        if not result["llm_calls_match"]:
+            logger.error(f"Scenario '{result['scenario']}' made {result['llm_calls']} LLM calls, expected {result['expected_llm_calls']}.")
+    if not report["passed"]:
+        sys.exit(1)
@@ -0,0 +1,108 @@
+# Seeded sequence shapes for the engine benchmark.
+# Each scenario inserts one sequence (plus any global lists it reads) for the given user and
+# returns the sequence id. Sizes are parameters so CI can run scaled-down versions.
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import models
+
+
+async def _create_sequence(db: AsyncSession, user_id: int, name: str) -> models.Sequence:
+    sequence = models.Sequence(name=name, description="Benchmark sequence", user_id=user_id)
+    db.add(sequence)
+    await db.flush()
+    return sequence
+
+
+async def _create_global_list(db: AsyncSession, user_id: int, name: str, size: int) -> models.GlobalList:
+    global_list = models.GlobalList(name=name, description=f"{size} benchmark items", user_id=user_id)
+    db.add(global_list)
+    await db.flush()
+    if size:
+        await db.execute(
+            insert(models.GlobalListItem),
+            [{"global_list_id": global_list.id, "value": f"{name} item {i}", "order": i} for i in range(size)],
+        )
+    return global_list
+
+
+async def seed_standard_chain(db: AsyncSession, user_id: int, length: int = 50) -> int:
+    """`length` STANDARD blocks, each prompting with the previous block's output."""
+    sequence = await _create_sequence(db, user_id, f"standard_chain_{length}")
+    db.add(models.Variable(
+        name="topic", type=models.VariableTypeEnum.GLOBAL, sequence_id=sequence.id, value_json={"value": "benchmarks"}
+    ))
+    blocks: List[models.Block] = []
+    for i in range(length):
+        previous = f"{{{{ step_{i - 1} }}}}" if i else "{{ topic }}"
+        blocks.append(models.Block(
+            name=f"Step {i}",
+            type=models.BlockTypeEnum.STANDARD,
+            sequence_id=sequence.id,
+            order=i,
+            config_json={"prompt": f"Refine this (step {i}): {previous}", "output_variable_name": f"step_{i}"},
+        ))
+    db.add_all(blocks)
+    await db.flush()
+    return sequence.id
+
+
+async def seed_single_list(db: AsyncSession, user_id: int, items: int = 1000) -> int:
+    """One SINGLE_LIST block over a global list of `items` items."""
+    sequence = await _create_sequence(db, user_id, f"single_list_{items}")
+    await _create_global_list(db, user_id, f"bench_items_{items}", items)
+    db.add(models.Block(
+        name="Per item",
+        type=models.BlockTypeEnum.SINGLE_LIST,
+        sequence_id=sequence.id,
+        order=0,
+        config_json={
+            "prompt": "Summarise item {{ item_index }}: {{ item }}",
+            "input_list_variable_name": f"bench_items_{items}",
+            "output_list_variable_name": "summaries",
+        },
+    ))
+    await db.flush()
+    return sequence.id
+
+
+async def seed_multi_list(db: AsyncSession, user_id: int, rows: int = 100, columns: int = 100) -> int:
+    """One MULTI_LIST block over two global lists (rows x columns cells)."""
+    sequence = await _create_sequence(db, user_id, f"multi_list_{rows}x{columns}")
+    await _create_global_list(db, user_id, f"bench_rows_{rows}", rows)
+    await _create_global_list(db, user_id, f"bench_columns_{columns}", columns)
+    db.add(models.Block(
+        name="Per cell",
+        type=models.BlockTypeEnum.MULTI_LIST,
+        sequence_id=sequence.id,
+        order=0,
+        config_json={
+            "prompt": "Compare {{ item1 }} with {{ item2 }}",
+            "input_lists_config": [{"name": f"bench_rows_{rows}"}, {"name": f"bench_columns_{columns}"}],
+            "output_matrix_variable_name": "comparisons",
+        },
+    ))
+    await db.flush()
+    return sequence.id
+
+
+@dataclass
+class Scenario:
+    name: str
+    seed: Callable[[AsyncSession, int], Awaitable[int]]
+    expected_llm_calls: int
+
+
+def build_scenarios(scale: float = 1.0) -> Dict[str, Scenario]:
+    """Scenario table; `scale` shrinks (or grows) every dimension for quick runs."""
+    chain = max(1, int(50 * scale))
+    items = max(1, int(1000 * scale))
+    side = max(1, int(100 * scale))
+    return {
+        "standard_chain": Scenario("standard_chain", lambda db, uid: seed_standard_chain(db, uid, chain), chain),
+        "single_list": Scenario("single_list", lambda db, uid: seed_single_list(db, uid, items), items),
+        "multi_list": Scenario("multi_list", lambda db, uid: seed_multi_list(db, uid, side, side), side * side),
+    }
@@ -56,6 +56,18 @@ export function useBlocks(sequenceId: string) {
     }
   }
 
+  // Persists a new block order in one request instead of one PUT per block
+  const reorderBlocks = async (orderedIds: string[]) => {
+    try {
+      const updatedBlocks = await apiClient.batchUpdateBlocks(sequenceId, { order: orderedIds.map(Number) })
+      setBlocks(updatedBlocks)
+      return updatedBlocks
+    } catch (err) {
+      setError(err instanceof Error ? err.message : "Failed to reorder blocks")
+      throw err
+    }
+  }
+
   const executeBlock = async (id: string, context?: any) => {
     try {
       const result = await apiClient.executeBlock(id, context)
@@ -77,6 +89,7 @@ export function useBlocks(sequenceId: string) {
     createBlock,
     updateBlock,
     deleteBlock,
+    reorderBlocks,
     executeBlock,
     refetch: fetchBlocks,
   }
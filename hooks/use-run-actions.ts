@@ -121,10 +121,21 @@ export function useRunActions() {
   []
 )
 
+  // Cancel a pending/running run. Doesn't touch `loading`: that tracks the run being cancelled.
+  const cancelRun = useCallback(async (runId: string): Promise<Run | undefined> => {
+    setError(null)
+    try {
+      return await apiClient.cancelRun(runId)
+    } catch (err: any) {
+      setError(err.message || "Failed to cancel run")
+    }
+  }, [])
+
   return {
     loading,
     error,
     runSequence,
+    cancelRun,
     runBlock,
     rerunFromBlock,
     editBlockOutput,
@@ -9,6 +9,8 @@ import type {
   UpdateBlockData,
   AvailableVariable,
   BlockRun,
+  SequenceImportResult,
+  RunDiffRecord,
 } from "@/types"
 
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_BASE_URL || "http://localhost:8000/api/v1"
@@ -39,6 +41,19 @@ class ApiClient {
     }
   }
 
+  // Authenticated GET of a non-JSON body (e.g. an NDJSON export)
+  private async requestBlob(endpoint: string): Promise<Blob> {
+    const token = typeof window !== "undefined" ? localStorage.getItem("access_token") : null
+    const response = await fetch(`${API_BASE_URL}${endpoint}`, {
+      headers: token ? { Authorization: `Bearer ${token}` } : {},
+    })
+    if (!response.ok) {
+      const errorData = await response.json().catch(() => ({ detail: response.statusText }))
+      throw new Error(errorData.detail || `API Error: ${response.status}`)
+    }
+    return response.blob()
+  }
+
   // --- Auth ---
   async login(data: { email: string; password: string }) {
     const formData = new URLSearchParams()
@@ -73,6 +88,18 @@ class ApiClient {
   async deleteSequence(id: string) {
     return this.request<null>(`/sequences/${id}`, { method: "DELETE" })
   }
+  async exportSequence(id: string, includeRuns = false) {
+    return this.requestBlob(`/sequences/${id}/export?include_runs=${includeRuns}`)
+  }
+  async importSequence(data: Blob | string, options: { name?: string; globalLists?: "skip" | "replace" } = {}) {
+    const params = new URLSearchParams({ global_lists: options.globalLists ?? "skip" })
+    if (options.name) params.set("name", options.name)
+    return this.request<SequenceImportResult>(`/sequences/import?${params}`, {
+      method: "POST",
+      headers: { "Content-Type": "application/x-ndjson" },
+      body: data,
+    })
+  }
 
   // --- Blocks ---
   async getBlocksBySequence(sequenceId: string) {
@@ -87,6 +114,10 @@ class ApiClient {
   async deleteBlock(id: string) {
     return this.request<null>(`/blocks/${id}`, { method: "DELETE" })
   }
+  // Applies creates/updates/deletes/reorder for one sequence in a single transaction
+  async batchUpdateBlocks(sequenceId: string, data: { creates?: any[]; updates?: any[]; deletes?: number[]; order?: (number | string)[] }) {
+    return this.request<Block[]>(`/blocks/in_sequence/${sequenceId}/batch`, { method: "POST", body: JSON.stringify(data) })
+  }
 
   // --- Variables ---
   async getVariablesBySequence(sequenceId: string) {
@@ -142,6 +173,14 @@ class ApiClient {
   async getRunDetails(runId: string) {
     return this.request<Run>(`/runs/${runId}`)
   }
+  async cancelRun(runId: string) {
+    return this.request<Run>(`/runs/${runId}/cancel`, { method: "POST" })
+  }
+  // Only the outputs that differ, one NDJSON record per line
+  async diffRuns(runId: string, otherRunId: string): Promise<RunDiffRecord[]> {
+    const body = await (await this.requestBlob(`/runs/${runId}/diff/${otherRunId}`)).text()
+    return body.split("\n").filter((line) => line.trim()).map((line) => JSON.parse(line))
+  }
 
   // --- Single Block Execution ---
   async runSingleBlock(blockId: string, inputOverrides: Record<string, any> = {}) {
@@ -16,9 +16,43 @@ export interface Sequence {
   chunk_size?: number
   preserve_sentences?: boolean
   loop_enabled?: boolean
+  llm_config_json?: LLMSettings | null // Defaults for blocks that don't set their own
 }
 
-export type BlockType = "standard" | "discretization" | "single_list" | "multi_list"
+export interface SequenceImportResult {
+  sequence_id: number
+  name: string
+  counts: Record<string, number> // variables, blocks, global_lists, global_list_items, runs, block_runs
+  skipped_block_runs: number
+}
+
+// GET /runs/{a}/diff/{b}: each changed value carries a unified diff from run a to run b
+export interface RunValueChange {
+  diff: string
+  only_in?: "a" | "b"
+}
+
+export type RunDiffRecord =
+  | { record: "header"; run_a: number; run_b: number }
+  | {
+      record: "block"
+      block_id: number
+      block_name: string | null
+      only_in?: "a" | "b"
+      fields: Record<string, RunValueChange> // status, error_message, prompt_text, llm_output_text
+      named_outputs: Record<string, RunValueChange>
+    }
+  | { record: "list_items"; block_id: number; items: (RunValueChange & { index: number })[] }
+  | { record: "matrix_cells"; block_id: number; cells: (RunValueChange & { row: number; column: number })[] }
+  | { record: "end"; counts: Record<string, number> } // blocks_compared, blocks_changed, items, cells
+
+export interface LLMSettings {
+  model?: string
+  max_tokens?: number
+  fallback_models?: string[] // Tried in order when the model is overloaded or slow
+}
+
+export type BlockType = "standard" | "discretization" | "single_list" | "multi_list" | "map_reduce"
 
 // --- Block Configs ---
 export interface BlockConfigStandard {
@@ -32,6 +66,8 @@ export interface BlockConfigDiscretization {
 export interface BlockConfigSingleList {
   input_list_variable_name: string
   output_list_variable_name: string
+  pack_items?: boolean // Several items per LLM call
+  pack_max_items?: number
   store_in_global_list?: boolean
   global_list_name?: string
 }
@@ -49,7 +85,18 @@ export interface BlockConfigMultiList {
   global_list_name?: string
 }
 
-export type BlockConfig = BlockConfigStandard | BlockConfigDiscretization | BlockConfigSingleList | BlockConfigMultiList
+// prompt is applied to each chunk ({{chunk}}, {{chunk_index}}, {{chunk_count}}); reduce_prompt
+// combines groups of results ({{partials}}, {{reduce_level}}) until one output remains
+export interface BlockConfigMapReduce {
+  input_variable_name: string
+  reduce_prompt: string
+  output_variable_name?: string
+  chunk_tokens?: number
+  chunk_overlap_tokens?: number
+  reduce_fan_in?: number
+}
+
+export type BlockConfig = BlockConfigStandard | BlockConfigDiscretization | BlockConfigSingleList | BlockConfigMultiList | BlockConfigMapReduce
 
 // --- Block ---
 export interface Block {
@@ -138,6 +185,7 @@ export interface Run {
   updated_at: string
   current_block_index?: number
   error_message?: string
+  archived_at?: string | null // Archived runs list without block runs; fetch them by id for the full run
 }
 
 export interface BlockResponse {